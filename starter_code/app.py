@@ -2,564 +2,72 @@
 # Imports
 #----------------------------------------------------------------------------#
 
-from datetime import date
-import json
-import dateutil.parser
-import babel
-from flask import Flask, render_template, request, Response, flash, redirect, url_for
-from flask_moment import Moment
-from flask_migrate import Migrate
-from flask_sqlalchemy import SQLAlchemy
-import logging
-from logging import Formatter, FileHandler
-from flask_wtf import Form
-from sqlalchemy.orm import backref
-from sqlalchemy.sql.operators import notbetween_op
-from werkzeug import datastructures
-from forms import *
-from collections import defaultdict
-#----------------------------------------------------------------------------#
-# App Config.
-#----------------------------------------------------------------------------#
-
-app = Flask(__name__)
-moment = Moment(app)
-app.config.from_object('config')
-db = SQLAlchemy(app)
-
-migrate = Migrate(app, db)
+from concurrent.futures import ThreadPoolExecutor
+import os
+from flask import Flask
+import icons
+from commands import register_commands
+from extensions import (assets, compression, data_cache, db, image_cache, log_pipeline, metrics, moment, pool_monitor,
+  post_commit, query_audit, query_stats, request_profiler, slow_requests, template_cache)
+from filters import format_datetime
+from views import register_blueprints
 
-# TODO: connect to a local postgresql database
-
-#----------------------------------------------------------------------------#
-# Models.
 #----------------------------------------------------------------------------#
-
-class Venue(db.Model):
-    __tablename__ = 'Venue'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    address = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    website_link = db.Column(db.String(120))
-    seeking_talent = db.Column(db.Boolean, default=False)
-    seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='venue')
-
-    def __repr__(self) -> str:
-        return f'<Venue {self.id} {self.name}>'
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-class Artist(db.Model):
-    __tablename__ = 'Artist'
-
-    id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String)
-    city = db.Column(db.String(120))
-    state = db.Column(db.String(120))
-    phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
-    image_link = db.Column(db.String(500))
-    facebook_link = db.Column(db.String(120))
-    website_link = db.Column(db.String(120))
-    seeking_venue = db.Column(db.Boolean, default=False)
-    seeking_description = db.Column(db.String(500))
-    shows = db.relationship('Show', backref='artist')
-
-    def __repr__(self) -> str:
-        return f'<Artist {self.id} {self.name}>'
-
-
-    # TODO: implement any missing fields, as a database migration using Flask-Migrate
-
-# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
-class Show(db.Model):
-    __tablename__ = 'shows'
-
-    id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    start_time = db.Column(db.DateTime, default=datetime.now(), nullable=False)
-
-    def __repr__(self):
-        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
-
-#----------------------------------------------------------------------------#
-# Filters.
-#----------------------------------------------------------------------------#
-
-def format_datetime(value, format='medium'):
-  date = dateutil.parser.parse(value)
-  if format == 'full':
-      format="EEEE MMMM, d, y 'at' h:mma"
-  elif format == 'medium':
-      format="EE MM, dd, y h:mma"
-  return babel.dates.format_datetime(date, format, locale='en')
-
-app.jinja_env.filters['datetime'] = format_datetime
-
-#----------------------------------------------------------------------------#
-# Controllers.
+# App Config.
 #----------------------------------------------------------------------------#
 
-@app.route('/')
-def index():
-  return render_template('pages/home.html')
-
-
-#  Venues
-#  ----------------------------------------------------------------
-
-@app.route('/venues')
-def venues():
-  # TODO: replace with real venues data.
-  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
-  venue_list = Venue.query.all()
-  data = []
-  ans_dict = defaultdict(list) # a dictionary with default value as empty list
-  now = datetime.now()
-
-  for venue in venue_list:
-    venue_shows = Show.query.filter_by(venue_id=venue.id).all()
-    upcoming_count = 0
-    for show in venue_shows:
-      if show.start_time > now:
-        upcoming_count+=1
-    ans_dict[(venue.city,venue.state)].append({"id":venue.id,"name":venue.name,"num_upcoming_shows": upcoming_count})
-
-  for val in ans_dict:
-    data.append({
-      "city":val[0],
-      "state":val[1],
-      "venues": ans_dict[val]
-    })
-
-  return render_template('pages/venues.html', areas=data);
-
-@app.route('/venues/search', methods=['POST'])
-def search_venues():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for Hop should return "The Musical Hop".
-  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
-
-  search_term = request.form.get('search_term', "").strip()
-  venue_list = Venue.query.filter(Venue.name.ilike('%'+ search_term + '%')).all() # filtering all the venues where the search_term is present
-  count = 0
-  search_result = []
-  now = datetime.now() # to get the present date
-  for venue in venue_list:
-    count+=1
-    show_list = Show.query.filter_by(venue_id = venue.id).all()
-    num_upcoming_shows=0
-    for show in show_list:
-      if show.start_time > now:
-        num_upcoming_shows+=1
-    search_result.append({
-      "id":venue.id,
-      'name':venue.name,
-      "num_upcoming_shows": num_upcoming_shows
-    })
-
-  response = {
-    "count":count,
-    "data":search_result
-  }
-
-  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/venues/<int:venue_id>')
-def show_venue(venue_id):
-  # shows the venue page with the given venue_id
-  # TODO: replace with real venue data from the venues table, using venue_id
-  venue_list = Venue.query.all()
-  data = []
-  now = datetime.now()
-  past_shows_count = 0
-  upcoming_shows_count = 0
-  for venue in venue_list:
-    show_list = Show.query.filter_by(venue_id=venue.id).all()
-    past_shows = []
-    upcoming_shows = []
-
-    for show in show_list:
-      
-      if show.start_time < now:
-        past_shows_count+=1
-        past_shows.append({
-          "artist_id":show.artist_id,
-          "artist_name":Artist.query.filter_by(id=show.artist_id).first().name,
-          "artist_image_link":Artist.query.filter_by(id=show.artist_id).first().image_link,
-          "start_time":format_datetime(str(show.start_time))
-        })
-      elif show.start_time>now:
-        upcoming_shows_count+=1
-        upcoming_shows.append({
-          "artist_id":show.artist_id,
-          "artist_name":Artist.query.filter_by(id=show.artist_id).first().name,
-          "artist_image_link":Artist.query.filter_by(id=show.artist_id).first().image_link,
-          "start_time":format_datetime(str(show.start_time))
-        })
-    genres = [genre for genre in venue.genres]
-    data.append({
-    "id": venue.id,
-    "name": venue.name,
-    "genres": genres,
-    "address": venue.address,
-    "city": venue.city,
-    "state": venue.state,
-    "phone": venue.phone,
-    "website": venue.website_link,
-    "facebook_link": venue.facebook_link,
-    "seeking_talent": venue.seeking_talent,
-    "seeking_description":venue.seeking_description,
-    "image_link": venue.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": past_shows_count,
-    "upcoming_shows_count": upcoming_shows_count,
-  })
-
-  data = list(filter(lambda d: d['id'] == venue_id, data))[0]
-  return render_template('pages/show_venue.html', venue=data)
-
-#  Create Venue
-#  ----------------------------------------------------------------
-
-@app.route('/venues/create', methods=['GET'])
-def create_venue_form():
-  form = VenueForm()
-  return render_template('forms/new_venue.html', form=form)
-
-@app.route('/venues/create', methods=['POST'])
-def create_venue_submission():
-  # TODO: insert form data as a new Venue record in the db, instead
-  # TODO: modify data to be the data object returned from db insertion
-  try:
-    venue = Venue(name=request.form.get('name'),
-    city=request.form.get('city'),
-    state=request.form.get('state'),
-    address=request.form.get('address'),
-    phone=request.form.get('phone'),
-    genres=request.form.getlist('genres'),
-    image_link=request.form.get('image_link'),
-    facebook_link=request.form.get('facebook_link'),
-    website_link=request.form.get('website_link'),
-    seeking_talent= True if request.form.get('seeking_talent')=="Y" else False,
-    seeking_description=request.form.get('seeking_description'))
-    db.session.add(venue)
-    db.session.commit()
-    flash('Venue ' + request.form['name'] + ' was successfully listed!')
-  # on successful db insert, flash success
-  except Exception as e:
-    print(e)
-    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
-    db.session.rollback()
-  # TODO: on unsuccessful db insert, flash an error instead.
-  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-  finally:
-    db.session.close()
-  return render_template('pages/home.html')
-
-@app.route('/venues/<venue_id>', methods=['DELETE'])
-def delete_venue(venue_id):
-  # TODO: Complete this endpoint for taking a venue_id, and using
-  # SQLAlchemy ORM to delete a record. Handle cases where the session commit could fail.
-
-  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
-  # clicking that button delete it from the db then redirect the user to the homepage
-  return None
-
-#  Artists
-#  ----------------------------------------------------------------
-@app.route('/artists')
-def artists():
-  # TODO: replace with real data returned from querying the database
-  artist_list = Artist.query.all()
-  data=[{"id":artist.id,"name":artist.name} for artist in artist_list]
-  return render_template('pages/artists.html', artists=data)
-
-@app.route('/artists/search', methods=['POST'])
-def search_artists():
-  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
-  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
-  # search for "band" should return "The Wild Sax Band".
-  search_term = request.form.get('search_term', "").strip()
-  artist_list = Artist.query.filter(Artist.name.ilike('%'+ search_term + '%')).all()
-  count = 0
-  search_result = []
-  now = datetime.now()
-  for artist in artist_list:
-    count+=1
-    show_list = Show.query.filter_by(artist_id = artist.id).all()
-    num_upcoming_shows=0
-    for show in show_list:
-      if show.start_time > now:
-        num_upcoming_shows+=1
-    search_result.append({
-      "id":artist.id,
-      'name':artist.name,
-      "num_upcoming_shows": num_upcoming_shows
-    })
-
-  response = {
-    "count":count,
-    "data":search_result
-  }
-  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
-
-@app.route('/artists/<int:artist_id>')
-def show_artist(artist_id):
-  # shows the artist page with the given artist_id
-  # TODO: replace with real artist data from the artist table, using artist_id
-  artist_list = Artist.query.all()
-  data = []
-  now = datetime.now()
-  past_shows_count = 0
-  upcoming_shows_count = 0
-  for artist in artist_list:
-    show_list = Show.query.filter_by(artist_id=artist.id).all()
-    past_shows = []
-    upcoming_shows = []
-
-    for show in show_list:
-      
-      if show.start_time < now:
-        past_shows_count+=1
-        past_shows.append({
-          "venue_id":show.artist_id,
-          "venue_name":Venue.query.filter_by(id=show.artist_id).first().name,
-          "venue_image_link":Venue.query.filter_by(id=show.artist_id).first().image_link,
-          "start_time":format_datetime(str(show.start_time))
-        })
-      elif show.start_time>now:
-        upcoming_shows_count+=1
-        upcoming_shows.append({
-          "venue_id":show.artist_id,
-          "venue_name":Venue.query.filter_by(id=show.artist_id).first().name,
-          "venue_image_link":Venue.query.filter_by(id=show.artist_id).first().image_link,
-          "start_time":format_datetime(str(show.start_time))
-        })
-    genres = [genre for genre in artist.genres]
-    data.append({
-    "id": artist.id,
-    "name": artist.name,
-    "genres": genres,
-    "city": artist.city,
-    "state": artist.state,
-    "phone": artist.phone,
-    "website": artist.website_link,
-    "facebook_link": artist.facebook_link,
-    "seeking_venue": artist.seeking_venue,
-    "seeking_description":artist.seeking_description,
-    "image_link": artist.image_link,
-    "past_shows": past_shows,
-    "upcoming_shows": upcoming_shows,
-    "past_shows_count": past_shows_count,
-    "upcoming_shows_count": upcoming_shows_count,
-  })
-  
-  data = list(filter(lambda d: d['id'] == artist_id, data))[0]
-  return render_template('pages/show_artist.html', artist=data)
-
-#  Update
-#  ----------------------------------------------------------------
-@app.route('/artists/<int:artist_id>/edit', methods=['GET'])
-def edit_artist(artist_id):
-  form = ArtistForm()
-  artist = Artist.query.filter(Artist.id == artist_id).first()
-  # TODO: populate form with fields from artist with ID <artist_id>
-  return render_template('forms/edit_artist.html', form=form, artist=artist)
-
-@app.route('/artists/<int:artist_id>/edit', methods=['POST'])
-def edit_artist_submission(artist_id):
-  # TODO: take values from the form submitted, and update existing
-  # artist record with ID <artist_id> using the new attributes
-  try:
-    form = ArtistForm()
-
-    artist = Artist.query.get(artist_id)
-
-    artist.name = form.name.data
-    artist.genres = form.genres.data
-    artist.city = form.city.data
-    artist.state = form.state.data
-    artist.phone = form.phone.data 
-    artist.website_link = form.website_link.data
-    artist.facebook_link = form.facebook_link.data
-    artist.seeking_venue = form.seeking_venue.data
-    artist.seeking_description = form.seeking_description.data
-    artist.image_link = form.image_link.data
-    db.session.commit()
-    flash('The Artist ' + request.form['name'] + ' has been successfully updated!')
-  except:
-    db.session.rollback()
-    flash('An Erro occured during update')
-  finally:
-    db.session.close()
-
-  return redirect(url_for('show_artist', artist_id=artist_id))
-
-@app.route('/venues/<int:venue_id>/edit', methods=['GET'])
-def edit_venue(venue_id):
-  form = VenueForm()
-  venue = Venue.query.get(venue_id)
-  # TODO: populate form with values from venue with ID <venue_id>
-  return render_template('forms/edit_venue.html', form=form, venue=venue)
-
-@app.route('/venues/<int:venue_id>/edit', methods=['POST'])
-def edit_venue_submission(venue_id):
-  # TODO: take values from the form submitted, and update existing
-  # venue record with ID <venue_id> using the new attributes
-  try:
-    form = VenueForm()
-
-    venue = Venue.query.get(venue_id)
-
-    venue.name = form.name.data
-    venue.genres = form.genres.data
-    venue.address = form.address.data
-    venue.city = form.city.data
-    venue.state = form.state.data
-    venue.phone = form.phone.data
-    venue.website_link = form.website_link.data
-    venue.facebook_link = form.facebook_link.data
-    venue.seeking_talent = form.seeking_talent.data
-    venue.seeking_descrition = form.seeking_description.data
-    venue.image_link = form.image_link.data
-
-    db.session.commit()
-    flash('The Venue '+ request.form['name'] + ' has been successfully updated!')
-  except Exception as e:
-    print(e)
-    db.session.rollback()
-    flash("An Error occured while editing venue")
-  finally:
-    db.session.close()
-  return redirect(url_for('show_venue', venue_id=venue_id))
-
-#  Create Artist
-#  ----------------------------------------------------------------
-
-@app.route('/artists/create', methods=['GET'])
-def create_artist_form():
-  form = ArtistForm()
-  return render_template('forms/new_artist.html', form=form)
-
-@app.route('/artists/create', methods=['POST'])
-def create_artist_submission():
-  # called upon submitting the new artist listing form
-  # TODO: insert form data as a new Venue record in the db, instead
-  # TODO: modify data to be the data object returned from db insertion
-  try:
-    artist = Artist(name=request.form.get('name'),
-    city=request.form.get('city'),
-    state=request.form.get('state'),
-    phone=request.form.get('phone'),
-    genres=request.form.getlist('genres'),
-    facebook_link=request.form.get('facebook_link'),
-    image_link=request.form.get('image_link'),
-    website_link=request.form.get('website_link'),
-    seeking_venue= True if request.form.get('seeking_venue')=="Y" else False,
-    seeking_description=request.form.get('seeking_description'))
-    db.session.add(artist)
-    db.session.commit()
-    flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  # on successful db insert, flash success
-  except Exception as e:
-    print(e)
-    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
-    db.session.rollback()
-  # TODO: on unsuccessful db insert, flash an error instead.
-  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-  finally:
-    db.session.close()
-  return render_template('pages/home.html')
-
-  # on successful db insert, flash success
-  # flash('Artist ' + request.form['name'] + ' was successfully listed!')
-  # # TODO: on unsuccessful db insert, flash an error instead.
-  # # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
-  # return render_template('pages/home.html')
-
-
-#  Shows
-#  ----------------------------------------------------------------
-
-@app.route('/shows')
-def shows():
-  # displays list of shows at /shows
-  # TODO: replace with real venues data.
-  shows_list = Show.query.all()
-  data = []
-  for show in shows_list:
-    temp_data_dict = {
-      "venue_id" : show.venue_id,
-      "venue_name":Venue.query.get(show.venue_id).name,
-      "artist_id": show.artist_id,
-      "artist_name" : Artist.query.get(show.artist_id).name,
-      "artist_image_link": Artist.query.get(show.artist_id).image_link,
-      "start_time": format_datetime(str(show.start_time))
-    }
-    data.append(temp_data_dict)
- 
-  return render_template('pages/shows.html', shows=data)
-
-@app.route('/shows/create')
-def create_shows():
-  # renders form. do not touch.
-  form = ShowForm()
-  return render_template('forms/new_show.html', form=form)
-
-@app.route('/shows/create', methods=['POST'])
-def create_show_submission():
-  # called to create new shows in the db, upon submitting new show listing form
-  # TODO: insert form data as a new Show record in the db, instead
-  try:
-    show = Show(artist_id = request.form.get('artist_id'),
-    venue_id = request.form.get('venue_id'),
-    start_time = request.form.get('start_time'))
-    db.session.add(show)
-    db.session.commit()
-    flash('Show was successfully listed!')
-  except Exception as e:
-    print(e)
-    flash('An error occurred. Show could not be listed.')
-  finally:
-    db.session.close()
-  # on successful db insert, flash success
-  # flash('Show was successfully listed!')
-  # TODO: on unsuccessful db insert, flash an error instead.
-  # e.g., flash('An error occurred. Show could not be listed.')
-  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
-  return render_template('pages/home.html')
-
-@app.errorhandler(404)
-def not_found_error(error):
-    return render_template('errors/404.html'), 404
-
-@app.errorhandler(500)
-def server_error(error):
-    return render_template('errors/500.html'), 500
-
-
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
+# Models live in models.py, controllers in the views/ blueprints and the CLI
+# commands in commands.py. Modules only a few requests or commands need
+# (migrations, dateutil, Pillow, babel's locale data) are imported where they
+# are used, so workers and short CLI runs do not pay for them up front;
+# scripts/check_import_time.py keeps an eye on that.
+
+def create_app(config='config'):
+  app = Flask(__name__)
+  moment.init_app(app)
+  app.config.from_object(config)
+  # first, so the request id and start time are set before anything else runs
+  log_pipeline.init_app(app)
+  metrics.init_app(app)
+  request_profiler.init_app(app)
+  slow_requests.init_app(app)
+  template_cache.init_app(app)
+  pool_monitor.init_app(app)
+  query_stats.init_app(app)
+  query_audit.init_app(app)
+  compression.init_app(app)
+  assets.init_app(app)
+  # icons are <svg><use> references into a sprite holding only the glyphs the
+  # templates use, built from the bundled Font Awesome font
+  assets.add_generated('icons.svg', lambda: icons.sprite(app))
+  app.jinja_env.globals['icon'] = icons.icon_macro(lambda: assets.url('icons.svg'))
+  db.init_app(app)
+
+  # `flask db` is the only user of Flask-Migrate, and importing it pulls in
+  # all of alembic; the flask command line has loaded it by now anyway
+  if os.environ.get('FLASK_RUN_FROM_CLI') == 'true':
+    from flask_migrate import Migrate
+    Migrate(app, db)
+
+  image_cache.init_app(app)
+  post_commit.init_app(app, db)
+  data_cache.init_app(app)
+
+  app.jinja_env.filters['datetime'] = format_datetime
+  # drop the newline after block tags and the indentation before them, so the
+  # {% for %}/{% if %} scaffolding does not end up in the page
+  app.jinja_env.trim_blocks = True
+  app.jinja_env.lstrip_blocks = True
+
+  # runs the detail page reads concurrently (ASYNC_DETAIL_VIEWS); threads are
+  # only started on first use, i.e. inside the serving process
+  app.extensions['detail_executor'] = ThreadPoolExecutor(
+    max_workers=app.config['DETAIL_QUERY_WORKERS'], thread_name_prefix='detail-query')
+
+  register_blueprints(app)
+  register_commands(app)
+
+  return app
 
 #----------------------------------------------------------------------------#
 # Launch.
@@ -567,11 +75,11 @@ if not app.debug:
 
 # Default port:
 if __name__ == '__main__':
-    app.run()
+    create_app().run()
 
 # Or specify port manually:
 '''
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port)
+    create_app().run(host='0.0.0.0', port=port)
 '''
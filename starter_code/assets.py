@@ -0,0 +1,238 @@
+import gzip
+import hashlib
+import io
+import json
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_from_directory, url_for
+
+from compression import negotiate
+
+# bundle name -> source files (relative to the static folder), concatenated
+# in this order. head.js is loaded blocking in <head>, main.js deferred.
+BUNDLES = {
+    'main.css': [
+        'css/bootstrap.min.css',
+        'css/layout.main.css',
+        'css/main.css',
+        'css/main.responsive.css',
+        'css/main.quickfix.css',
+    ],
+    'head.js': [
+        'js/libs/modernizr-2.8.2.min.js',
+        'js/libs/moment.min.js',
+    ],
+    'main.js': [
+        'js/libs/bootstrap-3.1.1.min.js',
+        'js/plugins.js',
+        'js/script.js',
+    ],
+}
+
+# image (relative to the static folder) -> widths of the downscaled variants
+# the build writes for srcset
+IMAGES = {
+    'img/front-splash.jpg': (480, 640, 960, 1280),
+}
+JPEG_QUALITY = 75
+
+# bundles are written here, one level below the static folder so relative
+# url(../fonts/...) references in the stylesheets keep resolving
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+
+_CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.DOTALL)
+_CSS_SPACE_RE = re.compile(r'\s*([{};,>])\s*')
+
+
+def minify_css(text):
+    # drops comments (except /*! licence */ ones) and the whitespace around
+    # punctuation; does not try to be clever about anything else
+    text = _CSS_COMMENT_RE.sub('', text)
+    text = re.sub(r'\s+', ' ', text)
+    text = _CSS_SPACE_RE.sub(r'\1', text)
+    return text.replace(';}', '}').strip()
+
+
+def minify_js(text):
+    # strips indentation and blank lines only; anything more needs a real JS
+    # parser, and the libraries are already minified upstream
+    lines = (line.strip() for line in text.splitlines())
+    return '\n'.join(line for line in lines if line)
+
+
+def build(static_folder, bundles=BUNDLES, generated=None, images=IMAGES):
+    # concatenates and minifies every bundle into static/dist/<name>.<hash>.<ext>
+    # next to a gzip sibling, and writes the manifest the templates read.
+    # generated maps further asset names to their already built content;
+    # images get one re-encoded variant per width instead.
+    dist = os.path.join(static_folder, DIST_DIR)
+    os.makedirs(dist, exist_ok=True)
+    manifest = {}
+    for name, sources in bundles.items():
+        ext = os.path.splitext(name)[1]
+        minify = minify_css if ext == '.css' else minify_js
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_folder, source), encoding='utf-8') as fp:
+                parts.append(minify(fp.read()))
+        # a lone ; keeps one script's trailing expression from running into the next
+        data = ('\n' if ext == '.css' else '\n;\n').join(parts)
+        manifest[name] = _write_fingerprinted(dist, name, data.encode('utf-8'))
+    for name, data in (generated or {}).items():
+        manifest[name] = _write_fingerprinted(dist, name, data.encode('utf-8'))
+    for name, widths in images.items():
+        manifest[name] = build_image_variants(static_folder, dist, name, widths)
+    with open(os.path.join(dist, MANIFEST), 'w') as fp:
+        json.dump(manifest, fp, indent=2, sort_keys=True)
+    keep = set()
+    for value in manifest.values():
+        keep.update(value['variants'].values() if isinstance(value, dict) else [value])
+    _remove_stale(dist, keep)
+    return manifest
+
+
+def build_image_variants(static_folder, dist, name, widths):
+    # downscaled, progressive JPEGs without metadata; widths wider than the
+    # original are skipped, since upscaling only adds bytes
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError('Pillow is required to build the image variants')
+    base = os.path.splitext(os.path.basename(name))[0]
+    with Image.open(os.path.join(static_folder, name)) as original:
+        image = original.convert('RGB')
+    variants = {}
+    for width in sorted(widths):
+        if width > image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        out = io.BytesIO()
+        image.resize((width, height), Image.LANCZOS).save(
+            out, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+        variants[str(width)] = _write_fingerprinted(dist, f'{base}-{width}.jpg', out.getvalue(), compress=False)
+    return {'width': image.width, 'height': image.height, 'variants': variants}
+
+
+def _write_fingerprinted(dist, name, data, compress=True):
+    base, ext = os.path.splitext(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    filename = f'{base}.{digest}{ext}'
+    path = os.path.join(dist, filename)
+    with open(path, 'wb') as fp:
+        fp.write(data)
+    if compress:
+        with open(path + '.gz', 'wb') as fp:
+            # mtime=0 keeps the archive byte-identical between builds
+            with gzip.GzipFile(filename, 'wb', 9, fp, mtime=0) as gz:
+                gz.write(data)
+    return filename
+
+
+def _remove_stale(dist, keep):
+    for filename in os.listdir(dist):
+        if filename == MANIFEST or filename in keep:
+            continue
+        if filename.endswith('.gz') and filename[:-3] in keep:
+            continue
+        os.remove(os.path.join(dist, filename))
+
+
+class Assets:
+    # Serves the bundles written by `flask assets build`.
+    #
+    # Templates call asset_urls('main.css'): once the bundles are built that
+    # is the single fingerprinted bundle, otherwise (e.g. in development) the
+    # original source files, so nothing needs building to work on the CSS.
+    # asset_image('img/front-splash.jpg') likewise gives src/srcset/size of
+    # the built variants, or just the original image.
+    # Bundles are served with a far-future immutable Cache-Control, and the
+    # .gz sibling is sent as is to clients that accept gzip.
+    #
+    # Assets that are generated rather than bundled (the icon sprite) are
+    # registered with add_generated(name, func): the build writes func()'s
+    # output, and without a build it is produced per request, uncached.
+
+    def __init__(self, app=None):
+        self.manifest = {}
+        self.generated = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MAX_AGE', 365 * 24 * 60 * 60)
+        self.app = app
+        self.dist = os.path.join(app.static_folder, DIST_DIR)
+        self.max_age = app.config['ASSETS_MAX_AGE']
+        self.load_manifest()
+        app.add_url_rule(f'{app.static_url_path}/{DIST_DIR}/<path:filename>',
+                         'asset', self.send_asset)
+        app.jinja_env.globals['asset_urls'] = self.urls
+        app.jinja_env.globals['asset_image'] = self.image
+        app.extensions['assets'] = self
+
+    def load_manifest(self):
+        try:
+            with open(os.path.join(self.dist, MANIFEST)) as fp:
+                self.manifest = json.load(fp)
+        except FileNotFoundError:
+            self.manifest = {}
+
+    def add_generated(self, name, func):
+        self.generated[name] = func
+
+    def build(self):
+        manifest = build(self.app.static_folder,
+                         generated={name: func() for name, func in self.generated.items()})
+        self.load_manifest()
+        return manifest
+
+    def urls(self, name):
+        if name in self.manifest:
+            return [url_for('asset', filename=self.manifest[name])]
+        if name in self.generated:
+            return [url_for('asset', filename=name)]
+        return [url_for('static', filename=source) for source in BUNDLES[name]]
+
+    def url(self, name):
+        return self.urls(name)[0]
+
+    def image(self, name):
+        # src, srcset and intrinsic size of a built image; before a build,
+        # just the original file
+        built = self.manifest.get(name)
+        if not built:
+            return {'src': url_for('static', filename=name), 'srcset': None,
+                    'width': None, 'height': None}
+        variants = sorted(built['variants'].items(), key=lambda item: int(item[0]))
+        urls = [(url_for('asset', filename=filename), width) for width, filename in variants]
+        widest = int(variants[-1][0])
+        return {
+            'src': urls[-1][0],
+            'srcset': ', '.join(f'{url} {width}w' for url, width in urls),
+            'width': widest,
+            'height': round(built['height'] * widest / built['width']),
+        }
+
+    def send_asset(self, filename):
+        if filename in self.generated and filename not in self.manifest.values():
+            response = Response(self.generated[filename](), mimetype=_mimetype(filename))
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+        # the content hash is in the name, so a bundle never changes under its URL
+        gzipped = os.path.join(self.dist, filename + '.gz')
+        if negotiate(request.headers.get('Accept-Encoding'), ('gzip',)) and os.path.isfile(gzipped):
+            response = send_from_directory(self.dist, filename + '.gz',
+                                           mimetype=_mimetype(filename))
+            response.headers['Content-Encoding'] = 'gzip'
+        else:
+            response = send_from_directory(self.dist, filename)
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.headers['Cache-Control'] = f'public, max-age={self.max_age}, immutable'
+        return response
+
+
+def _mimetype(filename):
+    return mimetypes.guess_type(filename)[0] or 'application/octet-stream'
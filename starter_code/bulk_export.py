@@ -0,0 +1,66 @@
+import csv
+import io
+import json
+import zlib
+
+FORMATS = ('csv', 'ndjson')
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# rows are joined into chunks of about this many bytes before being yielded,
+# so the WSGI server is not handed one tiny write per row
+CHUNK_SIZE = 64 * 1024
+
+
+def json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def iter_csv(columns, rows):
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+    writer.writerow(columns)
+    for row in rows:
+        writer.writerow(row)
+        if buf.tell() >= CHUNK_SIZE:
+            yield buf.getvalue()
+            buf.seek(0)
+            buf.truncate()
+    yield buf.getvalue()
+
+
+def iter_ndjson(columns, rows):
+    chunk = []
+    size = 0
+    for row in rows:
+        line = json.dumps(dict(zip(columns, row)), default=json_default) + '\n'
+        chunk.append(line)
+        size += len(line)
+        if size >= CHUNK_SIZE:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+    yield ''.join(chunk)
+
+
+def iter_export(fmt, columns, rows):
+    # encodes rows as they come off the cursor; nothing is held beyond one chunk
+    chunks = iter_csv(columns, rows) if fmt == 'csv' else iter_ndjson(columns, rows)
+    for chunk in chunks:
+        if chunk:
+            yield chunk.encode('utf-8')
+
+
+def gzip_chunks(chunks, level=6):
+    # gzip-compresses a byte stream on the fly (wbits=31 writes the gzip header)
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
@@ -0,0 +1,177 @@
+import csv
+import io
+import itertools
+import json
+import os
+
+from sqlalchemy import exc
+from werkzeug.datastructures import MultiDict
+
+FORMATS = ('csv', 'ndjson')
+
+# values a CSV cell can use to mean "unchecked" for a BooleanField
+FALSE_VALUES = ('', '0', 'n', 'no', 'f', 'false', 'off')
+
+
+def detect_format(path):
+    # .ndjson / .jsonl files are read as one JSON object per line, anything else as CSV
+    ext = os.path.splitext(path)[1].lower()
+    return 'ndjson' if ext in ('.ndjson', '.jsonl') else 'csv'
+
+
+def iter_records(path, fmt, start_row=0):
+    # lazily yields (row_number, record) pairs so a file of any size is read in
+    # constant memory; rows before start_row are skipped without validation
+    with open(path, newline='', encoding='utf-8') as fp:
+        if fmt == 'ndjson':
+            records = (json.loads(line) for line in fp if line.strip())
+        else:
+            records = csv.DictReader(fp)
+        yield from itertools.islice(enumerate(records), start_row, None)
+
+
+def to_formdata(record, multi_fields=('genres',)):
+    # turns a CSV/NDJSON record into the MultiDict shape a submitted form has
+    formdata = MultiDict()
+    for key, value in record.items():
+        if value is None:
+            continue
+        if key in multi_fields and isinstance(value, str):
+            value = [v.strip() for v in value.split(',') if v.strip()]
+        if isinstance(value, bool):
+            value = 'y' if value else ''
+        elif isinstance(value, str) and key.startswith('seeking_') and value.strip().lower() in FALSE_VALUES:
+            value = ''
+        if isinstance(value, list):
+            for item in value:
+                formdata.add(key, str(item))
+        else:
+            formdata.add(key, str(value))
+    return formdata
+
+
+def validate_record(form_class, record):
+    # runs the same validators as the web forms; returns (data, errors)
+    form = form_class(formdata=to_formdata(record), meta={'csrf': False})
+    if not form.validate():
+        return None, form.errors
+    data = {name: field.data for name, field in form._fields.items() if name != 'csrf_token'}
+    return data, {}
+
+
+def format_genres(genres):
+    # stores genres the same way the create forms do, i.e. as a postgres array literal
+    def quote(value):
+        if any(c in value for c in ' ,{}"\\'):
+            return '"' + value.replace('\\', '\\\\').replace('"', '\\"') + '"'
+        return value
+    return '{' + ','.join(quote(g) for g in genres) + '}'
+
+
+def parse_genres(value):
+    # inverse of format_genres; plain comma separated values are accepted too
+    if not value:
+        return []
+    if value.startswith('{') and value.endswith('}'):
+        reader = csv.reader([value[1:-1]], doublequote=False, escapechar='\\')
+        return [g for g in next(reader, []) if g]
+    return [g.strip() for g in value.split(',') if g.strip()]
+
+
+def _copy_value(value):
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    text = value.isoformat(' ') if hasattr(value, 'isoformat') else str(value)
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class BatchWriter:
+    # buffers validated rows and writes them batch_size at a time, with COPY on
+    # postgres and a single executemany INSERT everywhere else. Each batch is
+    # committed on its own so a failure only loses the batch in flight.
+    #
+    # A row the database rejects (a constraint, a value too long for its
+    # column) fails its whole batch; that batch is then written again one row
+    # at a time, and only the rejected rows are skipped and passed to
+    # on_reject(row_number, error).
+
+    def __init__(self, db, table, batch_size=1000, on_reject=None):
+        self.db = db
+        self.table = table
+        self.batch_size = batch_size
+        self.on_reject = on_reject
+        self.rows = []
+        self.row_numbers = []
+        self.written = 0
+        self.rejected = 0
+
+    @property
+    def pending_from(self):
+        # source row number of the oldest row not yet committed
+        return self.row_numbers[0] if self.row_numbers else None
+
+    def add(self, row, row_number=None):
+        self.rows.append(row)
+        self.row_numbers.append(row_number)
+        if len(self.rows) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self.rows:
+            return
+        try:
+            self._write(self.rows)
+        except self._row_errors():
+            self._write_one_by_one()
+            return
+        self.written += len(self.rows)
+        self.rows = []
+        self.row_numbers = []
+
+    def _write_one_by_one(self):
+        while self.rows:
+            try:
+                self._write(self.rows[:1])
+            except self._row_errors() as e:
+                self.rejected += 1
+                if self.on_reject is not None:
+                    self.on_reject(self.row_numbers[0], getattr(e, 'orig', None) or e)
+            else:
+                self.written += 1
+            del self.rows[0]
+            del self.row_numbers[0]
+
+    def _row_errors(self):
+        # what a bad row raises: SQLAlchemy wraps the driver's errors for
+        # the INSERT, COPY runs on the raw cursor and raises them as they are
+        dbapi = self.db.engine.dialect.dbapi
+        return (exc.IntegrityError, exc.DataError, dbapi.IntegrityError, dbapi.DataError)
+
+    def _write(self, rows):
+        try:
+            if self.db.engine.dialect.name == 'postgresql':
+                self._copy(rows)
+            else:
+                self.db.session.execute(self.table.insert(), rows)
+            self.db.session.commit()
+        except Exception:
+            self.db.session.rollback()
+            raise
+
+    def _copy(self, rows):
+        columns = list(rows[0])
+        preparer = self.db.engine.dialect.identifier_preparer
+        buf = io.StringIO()
+        for row in rows:
+            buf.write('\t'.join(_copy_value(row[c]) for c in columns) + '\n')
+        buf.seek(0)
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            preparer.format_table(self.table),
+            ', '.join(preparer.quote(c) for c in columns))
+        cursor = self.db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(sql, buf)
+        finally:
+            cursor.close()
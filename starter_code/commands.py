@@ -0,0 +1,150 @@
+#----------------------------------------------------------------------------#
+# Commands.
+#
+# Registered on the app by create_app(); run with `flask <command>`.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+
+import assets as asset_bundles
+from bulk_export import FORMATS as EXPORT_FORMATS, gzip_chunks, iter_export
+from bulk_import import FORMATS, BatchWriter, detect_format, format_genres, iter_records, validate_record
+from extensions import assets, data_cache, db, template_cache
+from forms import ArtistForm, ShowForm, VenueForm
+from models import Artist, IdempotencyKey, Show, Venue
+from views.common import ARTIST_EDIT_FIELDS, VENUE_EDIT_FIELDS
+from views.shows import export_shows_query
+
+import_cli = AppGroup('import', help='Bulk import venues, artists or shows from CSV/NDJSON.')
+
+# the columns a record may set; the forms' hidden fields (version, original,
+# idempotency_key) and anything else in the file are left out
+SHOW_IMPORT_FIELDS = ('artist_id', 'venue_id', 'start_time')
+
+def _venue_row(data):
+  data['genres'] = format_genres(data['genres'])
+  return data
+
+def _artist_row(data):
+  data['genres'] = format_genres(data['genres'])
+  return data
+
+def _show_row(data):
+  data['artist_id'] = int(data['artist_id'])
+  data['venue_id'] = int(data['venue_id'])
+  return data
+
+def run_import(path, form_class, model, fields, to_row, fmt, batch_size, start_row):
+  fmt = fmt or detect_format(path)
+
+  def rejected(row_number, error):
+    # reported like a row that failed validation
+    errors = {'row': [str(error)]}
+    click.echo(f'row {row_number}: skipped {errors}', err=True)
+
+  writer = BatchWriter(db, model.__table__, batch_size, on_reject=rejected)
+  invalid = 0
+  row_number = start_row - 1
+  try:
+    for row_number, record in iter_records(path, fmt, start_row):
+      data, errors = validate_record(form_class, record)
+      if not errors:
+        try:
+          data = to_row({k: v for k, v in data.items() if k in fields})
+        except (TypeError, ValueError) as e:
+          errors = {'row': [str(e)]}
+      if errors:
+        invalid += 1
+        click.echo(f'row {row_number}: skipped {errors}', err=True)
+        continue
+      writer.add(data, row_number)
+      if (row_number + 1) % batch_size == 0:
+        click.echo(f'row {row_number + 1}: {writer.written} written, {invalid + writer.rejected} skipped', err=True)
+    writer.flush()
+  except Exception as e:
+    # every row before the first one still buffered is committed or was
+    # skipped, so re-running from there picks up exactly where we stopped
+    resume_at = writer.pending_from if writer.rows else row_number + 1
+    raise click.ClickException(f'{e}\nimport stopped; resume with --start-row {resume_at}')
+  finally:
+    # the rows bypass the views' post-commit hooks; drop all cached page data
+    if writer.written:
+      data_cache.clear()
+  click.echo(f'done: {writer.written} written, {invalid + writer.rejected} skipped, {row_number + 1} rows read')
+
+@import_cli.command('venues')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--start-row', default=0, show_default=True, help='Resume from this data row.')
+def import_venues(path, fmt, batch_size, start_row):
+  run_import(path, VenueForm, Venue, VENUE_EDIT_FIELDS, _venue_row, fmt, batch_size, start_row)
+
+@import_cli.command('artists')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--start-row', default=0, show_default=True, help='Resume from this data row.')
+def import_artists(path, fmt, batch_size, start_row):
+  run_import(path, ArtistForm, Artist, ARTIST_EDIT_FIELDS, _artist_row, fmt, batch_size, start_row)
+
+@import_cli.command('shows')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(FORMATS), help='Defaults to the file extension.')
+@click.option('--batch-size', default=1000, show_default=True)
+@click.option('--start-row', default=0, show_default=True, help='Resume from this data row.')
+def import_shows(path, fmt, batch_size, start_row):
+  run_import(path, ShowForm, Show, SHOW_IMPORT_FIELDS, _show_row, fmt, batch_size, start_row)
+
+export_cli = AppGroup('export', help='Stream full dumps as CSV/NDJSON.')
+
+@export_cli.command('shows')
+@click.argument('output', type=click.File('wb'), default='-')
+@click.option('--format', 'fmt', type=click.Choice(EXPORT_FORMATS), default='csv', show_default=True)
+@click.option('--gzip', 'compress', is_flag=True, help='Gzip the output.')
+@click.option('--since', type=click.DateTime(), help='Only shows starting at or after this time.')
+def export_shows_command(output, fmt, compress, since):
+  query = export_shows_query(since)
+  chunks = iter_export(fmt, [c['name'] for c in query.column_descriptions], query)
+  if compress:
+    chunks = gzip_chunks(chunks)
+  for chunk in chunks:
+    output.write(chunk)
+
+assets_cli = AppGroup('assets', help='Build the static css/js bundles and icon sprite.')
+
+@assets_cli.command('build')
+def build_assets_command():
+  # writes static/dist/<bundle>.<hash>.<ext> plus .gz siblings and the
+  # downscaled image variants; run on deploy
+  manifest = assets.build()
+  for name, built in sorted(manifest.items()):
+    filenames = built['variants'].values() if isinstance(built, dict) else [built]
+    for filename in filenames:
+      click.echo(f'{name} -> {asset_bundles.DIST_DIR}/{filename}')
+
+@click.command('compile-templates')
+@with_appcontext
+def compile_templates_command():
+  # fills the template bytecode cache so new workers skip compilation; run on deploy
+  timings = template_cache.compile_all()
+  for name, seconds in sorted(timings.items()):
+    click.echo(f'{name} {seconds * 1000:.1f} ms')
+  click.echo(f'{len(timings)} templates compiled into {current_app.config["TEMPLATE_BYTECODE_CACHE_DIR"]}')
+
+@click.command('purge-idempotency-keys')
+@with_appcontext
+def purge_idempotency_keys():
+  # deletes expired keys in one statement; safe to run from cron
+  cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+  deleted = IdempotencyKey.query.filter(IdempotencyKey.created_at < cutoff).delete(synchronize_session=False)
+  db.session.commit()
+  click.echo(f'{deleted} expired idempotency keys deleted')
+
+def register_commands(app):
+  for command in (import_cli, export_cli, assets_cli, compile_templates_command, purge_idempotency_keys):
+    app.cli.add_command(command)
@@ -0,0 +1,171 @@
+import re
+import zlib
+
+# whitespace runs that contain a line break, i.e. template indentation
+_INDENT_RE = re.compile(r'[ \t\r\f\v]*\n\s*')
+# elements whose whitespace is significant and must be left alone
+_PRESERVE_RE = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+
+
+def minify_html(html):
+    # collapses indentation and blank lines to a single line break; whitespace
+    # between inline elements is kept, so the rendered page does not change
+    parts = _PRESERVE_RE.split(html)
+    out = []
+    # split() yields text, whole preserved block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        out.append(_INDENT_RE.sub('\n', parts[i]))
+        if i + 1 < len(parts):
+            out.append(parts[i + 1])
+    return ''.join(out).strip() + '\n'
+
+
+def negotiate(accept_encoding, encodings=('gzip', 'deflate')):
+    # picks the first of encodings the client accepts with a non-zero q value
+    accepted = {}
+    for item in (accept_encoding or '').split(','):
+        name, _, params = item.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in encodings:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, level=6):
+    # gzip and zlib-wrapped deflate, which is what browsers expect for "deflate"
+    wbits = 31 if encoding == 'gzip' else 15
+    compressor = zlib.compressobj(level, zlib.DEFLATED, wbits)
+    return compressor.compress(data) + compressor.flush()
+
+
+class CompressionMiddleware:
+    # WSGI middleware that gzip/deflate-compresses responses the client
+    # accepts, and optionally strips template indentation from HTML.
+    #
+    # Only responses with a Content-Length of at least COMPRESS_MIN_SIZE and
+    # a content type in COMPRESS_MIMETYPES are touched. Streamed responses
+    # (no Content-Length) and ones that already carry a Content-Encoding,
+    # such as the gzip exports, are passed through unchanged.
+    #
+    #   compression = CompressionMiddleware(app)
+
+    def __init__(self, app=None):
+        self.wsgi_app = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_ENABLED', True)
+        app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.config.setdefault('COMPRESS_MIMETYPES', (
+            'text/html', 'text/css', 'text/plain', 'text/csv',
+            'application/javascript', 'application/json', 'image/svg+xml'))
+        app.config.setdefault('MINIFY_HTML', False)
+        self.enabled = app.config['COMPRESS_ENABLED']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.level = app.config['COMPRESS_LEVEL']
+        self.mimetypes = frozenset(app.config['COMPRESS_MIMETYPES'])
+        self.minify = app.config['MINIFY_HTML']
+        self.wsgi_app = app.wsgi_app
+        app.wsgi_app = self
+        app.extensions['compression'] = self
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate(environ.get('HTTP_ACCEPT_ENCODING')) if self.enabled else None
+        if not encoding and not self.minify:
+            return self.wsgi_app(environ, start_response)
+
+        captured = {}
+
+        def capture(status, headers, exc_info=None):
+            captured['response'] = (status, headers, exc_info)
+            # the real start_response is called once the body is known;
+            # writes through the legacy write() callable are not supported
+            return lambda data: None
+
+        body = self.wsgi_app(environ, capture)
+        status, headers, exc_info = captured['response']
+        if not self._should_process(environ, status, headers, encoding):
+            start_response(status, headers, exc_info)
+            return body
+
+        try:
+            data = b''.join(body)
+        finally:
+            if hasattr(body, 'close'):
+                body.close()
+
+        mimetype, charset = self._content_type(headers)
+        if self.minify and mimetype == 'text/html':
+            data = minify_html(data.decode(charset)).encode(charset)
+        if encoding and mimetype in self.mimetypes and len(data) >= self.min_size:
+            data = compress(data, encoding, self.level)
+            headers = self._set_header(headers, 'Content-Encoding', encoding)
+            headers = self._weaken_etag(headers)
+        else:
+            encoding = None
+        headers = self._set_header(headers, 'Content-Length', str(len(data)))
+        if self.enabled and mimetype in self.mimetypes:
+            headers = self._add_vary(headers)
+        start_response(status, headers, exc_info)
+        return [data]
+
+    def _should_process(self, environ, status, headers, encoding):
+        # HEAD responses carry no body to compress or measure
+        if environ.get('REQUEST_METHOD') == 'HEAD':
+            return False
+        code = int(status.split(' ', 1)[0])
+        if code < 200 or code in (204, 206, 304):
+            return False
+        names = {name.lower(): value for name, value in headers}
+        if 'content-encoding' in names or 'content-length' not in names:
+            return False
+        if 'no-transform' in names.get('cache-control', ''):
+            return False
+        mimetype, _ = self._content_type(headers)
+        if mimetype not in self.mimetypes:
+            return False
+        return bool(encoding) or (self.minify and mimetype == 'text/html')
+
+    @staticmethod
+    def _content_type(headers):
+        for name, value in headers:
+            if name.lower() == 'content-type':
+                mimetype, _, params = value.partition(';')
+                charset = 'utf-8'
+                for param in params.split(';'):
+                    key, _, val = param.strip().partition('=')
+                    if key.lower() == 'charset' and val:
+                        charset = val.strip('"')
+                return mimetype.strip().lower(), charset
+        return None, 'utf-8'
+
+    @staticmethod
+    def _set_header(headers, name, value):
+        return [(k, v) for k, v in headers if k.lower() != name.lower()] + [(name, value)]
+
+    @staticmethod
+    def _add_vary(headers):
+        for i, (name, value) in enumerate(headers):
+            if name.lower() == 'vary':
+                if 'accept-encoding' not in value.lower():
+                    headers[i] = (name, value + ', Accept-Encoding')
+                return headers
+        return headers + [('Vary', 'Accept-Encoding')]
+
+    @staticmethod
+    def _weaken_etag(headers):
+        # the compressed body is a different representation, so a strong
+        # validator of the identity body no longer holds for it
+        return [(name, 'W/' + value if name.lower() == 'etag' and not value.startswith('W/') else value)
+                for name, value in headers]
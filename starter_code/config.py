@@ -1,14 +1,189 @@
 import os
-SECRET_KEY = os.urandom(32)
+
+# Every worker process must sign sessions, flash messages and CSRF tokens with
+# the same key, so production reads it from SECRET_KEY or a SECRET_KEY_FILE.
+# The random fallback is only fit for a single development process.
+SECRET_KEY = os.environ.get('SECRET_KEY')
+if not SECRET_KEY and os.environ.get('SECRET_KEY_FILE'):
+    with open(os.environ['SECRET_KEY_FILE']) as f:
+        SECRET_KEY = f.read().strip()
+if not SECRET_KEY:
+    SECRET_KEY = os.urandom(32)
+
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
 
-# Enable debug mode.
-DEBUG = True
+# Enable debug mode (FLASK_DEBUG=0 turns it off; wsgi.py does so by default).
+DEBUG = os.environ.get('FLASK_DEBUG', '1') not in ('0', 'false', 'False', '')
+
+# Re-check template files for changes on every render only while debugging
+TEMPLATES_AUTO_RELOAD = DEBUG
+
+# Compiled templates are cached here (shared by all workers); `flask
+# compile-templates` fills it at deploy time. Empty disables the cache.
+TEMPLATE_BYTECODE_CACHE_DIR = os.environ.get('TEMPLATE_BYTECODE_CACHE_DIR', os.path.join(basedir, 'instance', 'jinja-cache'))
 
 # Connect to the database
 
 
 # TODO IMPLEMENT DATABASE URL
-SQLALCHEMY_DATABASE_URI = 'postgresql://postgres@localhost:5432/fyyurdb'
+SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'postgresql://postgres@localhost:5432/fyyurdb')
 SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# Connection pool, tunable per deployment through the environment.
+# pool_size + max_overflow bounds the connections one process can open,
+# pool_recycle retires connections before server/proxy idle timeouts and
+# pool_pre_ping checks a connection is alive before handing it out.
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': float(os.environ.get('DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+}
+
+# Log a warning (at most every POOL_WARNING_INTERVAL seconds) once this share
+# of pool_size + max_overflow is checked out
+POOL_SATURATION_WARNING = float(os.environ.get('DB_POOL_SATURATION_WARNING', 0.9))
+POOL_WARNING_INTERVAL = 60
+
+# Time spent per SQL statement fingerprint (literals stripped), on
+# /admin/query-stats and logged every QUERY_STATS_LOG_INTERVAL seconds (0
+# disables the log) as the QUERY_STATS_LOG_TOP most expensive fingerprints
+QUERY_STATS_ENABLED = os.environ.get('QUERY_STATS_ENABLED', '1') == '1'
+QUERY_STATS_MAX_FINGERPRINTS = 500
+QUERY_STATS_LOG_INTERVAL = int(os.environ.get('QUERY_STATS_LOG_INTERVAL', 300))
+QUERY_STATS_LOG_TOP = 10
+
+# Requests slower than SLOW_REQUEST_MS (0 disables) log one record with each
+# SQL statement (up to SLOW_REQUEST_MAX_STATEMENTS), row counts, render and
+# format_datetime time; at most SLOW_REQUEST_LOG_LIMIT records every
+# SLOW_REQUEST_LOG_WINDOW seconds
+SLOW_REQUEST_MS = int(os.environ.get('SLOW_REQUEST_MS', 1000))
+SLOW_REQUEST_MAX_STATEMENTS = 50
+SLOW_REQUEST_LOG_LIMIT = int(os.environ.get('SLOW_REQUEST_LOG_LIMIT', 10))
+SLOW_REQUEST_LOG_WINDOW = 60
+
+# Requests sent with X-Profile: 1 and the admin token run under cProfile;
+# the newest PROFILE_MAX_FILES profiles are kept in PROFILE_DIR and served
+# from /admin/profiles
+PROFILE_DIR = os.environ.get('PROFILE_DIR', os.path.join(basedir, 'instance', 'profiles'))
+PROFILE_MAX_FILES = int(os.environ.get('PROFILE_MAX_FILES', 50))
+
+# Prometheus metrics on /metrics. Each worker process records into its own
+# file in METRICS_DIR (gunicorn.conf.py provides one); without it /metrics
+# covers the answering process only. With METRICS_TOKEN set, the scraper must
+# send it as a bearer token.
+METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_COLLECT_INTERVAL = 1.0
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Development/test aid: reports a request that runs one statement fingerprint
+# more than QUERY_REPEAT_LIMIT times (an N+1 loop) or more statements than its
+# view's @query_budget, with the offending line. QUERY_AUDIT_ACTION is 'warn'
+# (log it) or 'raise'; scripts/check_query_budgets.py raises.
+QUERY_AUDIT = os.environ.get('QUERY_AUDIT', '1' if DEBUG else '0') == '1'
+QUERY_REPEAT_LIMIT = int(os.environ.get('QUERY_REPEAT_LIMIT', 5))
+QUERY_AUDIT_ACTION = os.environ.get('QUERY_AUDIT_ACTION', 'warn')
+
+# Token required by the /admin endpoints (X-Admin-Token header); unset disables them
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# app.logger writes JSON lines to LOG_FILE from a background thread (empty
+# disables it; the debug server logs to the console instead). The file
+# rotates at LOG_MAX_BYTES; with several gunicorn workers set it to 0 and
+# rotate externally, e.g. with logrotate.
+LOG_FILE = os.environ.get('LOG_FILE', '' if DEBUG else 'error.log')
+LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT', 5))
+
+# Records waiting for the writer thread; beyond this they are dropped rather
+# than blocking the request
+LOG_QUEUE_SIZE = 10000
+
+# At most LOG_SAMPLE_BURST records per logging call site every
+# LOG_SAMPLE_WINDOW seconds; the rest are counted and dropped. Records above
+# LOG_SAMPLE_MAX_LEVEL (errors and worse by default) are never sampled
+LOG_SAMPLE_BURST = int(os.environ.get('LOG_SAMPLE_BURST', 20))
+LOG_SAMPLE_WINDOW = 60
+LOG_SAMPLE_MAX_LEVEL = os.environ.get('LOG_SAMPLE_MAX_LEVEL', 'WARNING')
+
+# One access line (method, path, status, duration) per request
+LOG_REQUESTS = os.environ.get('LOG_REQUESTS', '0') == '1'
+
+# Number of artists listed per page on /artists/available
+AVAILABILITY_PER_PAGE = 25
+
+# Rows fetched per round trip by the server-side cursor behind the exports
+EXPORT_BATCH_SIZE = 1000
+
+# Default and maximum page size of the /api list endpoints
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 500
+
+# Upper bound on the number of shows a single recurring series may create
+SHOW_SERIES_MAX_OCCURRENCES = 104
+
+# Post-commit side effects: worker threads, max queued jobs, how long a
+# request waits for a queue slot before running the job itself, and how long
+# shutdown waits for the queue to drain
+POST_COMMIT_WORKERS = 4
+POST_COMMIT_QUEUE_SIZE = 1000
+POST_COMMIT_SUBMIT_TIMEOUT = 0.05
+POST_COMMIT_DRAIN_TIMEOUT = 10
+
+# Listing and venue/artist page data can be cached per process for
+# DATA_CACHE_TTL seconds; 0, the default, leaves it off. At most
+# DATA_CACHE_MAX_ENTRIES entries. Edits invalidate it at once in every worker
+# sharing the DATA_CACHE_GENERATIONS file; empty keeps that per process.
+DATA_CACHE_TTL = int(os.environ.get('DATA_CACHE_TTL', 0))
+DATA_CACHE_MAX_ENTRIES = 1000
+DATA_CACHE_GENERATIONS = os.environ.get('DATA_CACHE_GENERATIONS', os.path.join(basedir, 'instance', 'data-cache-generations'))
+
+# Seconds a create submission's idempotency key is honoured for replays; each
+# new key deletes up to IDEMPOTENCY_PURGE_BATCH expired ones
+IDEMPOTENCY_KEY_TTL = 24 * 60 * 60
+IDEMPOTENCY_PURGE_BATCH = 100
+
+# Shows deleted per statement (and transaction) when a venue or artist is removed
+DELETE_CHUNK_SIZE = 5000
+
+# Run the independent queries of the venue/artist pages concurrently from
+# async views (needs asgiref). Each page then holds up to
+# DETAIL_QUERY_WORKERS pooled connections at once, so size the pool for it.
+ASYNC_DETAIL_VIEWS = os.environ.get('ASYNC_DETAIL_VIEWS', '0') == '1'
+DETAIL_QUERY_WORKERS = int(os.environ.get('DETAIL_QUERY_WORKERS', 8))
+
+# Response compression: responses of at least COMPRESS_MIN_SIZE bytes with
+# one of these content types are gzip/deflate encoded when the client
+# accepts it. MINIFY_HTML also strips template indentation from pages.
+COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+COMPRESS_MIN_SIZE = 500
+COMPRESS_LEVEL = 6
+COMPRESS_MIMETYPES = (
+    'text/html', 'text/css', 'text/plain', 'text/csv',
+    'application/javascript', 'application/json', 'image/svg+xml',
+)
+MINIFY_HTML = os.environ.get('MINIFY_HTML', '0') == '1'
+
+# Cache lifetime of the fingerprinted bundles under /static/dist
+ASSETS_MAX_AGE = 365 * 24 * 60 * 60
+
+# Image proxy (/img/...): on-disk cache location and size bound, limits on
+# what is fetched from an origin, how long a failing origin is left alone,
+# the thumbnail widths that may be requested and the browser cache lifetime.
+# Private/loopback origins are refused unless IMAGE_ALLOW_PRIVATE_HOSTS is set.
+IMAGE_CACHE_DIR = os.environ.get('IMAGE_CACHE_DIR', os.path.join(basedir, 'instance', 'image-cache'))
+IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))
+IMAGE_MAX_ORIGIN_BYTES = 10 * 1024 * 1024
+IMAGE_FETCH_TIMEOUT = 5
+IMAGE_FAILURE_TTL = 60
+IMAGE_WIDTHS = (200, 400, 800)
+IMAGE_MAX_AGE = 7 * 24 * 60 * 60
+IMAGE_ALLOW_PRIVATE_HOSTS = os.environ.get('IMAGE_ALLOW_PRIVATE_HOSTS', '0') == '1'
+
+# Fetch a new or edited venue/artist image into the proxy's cache after the
+# write commits, instead of on the first page view
+IMAGE_PREFETCH = os.environ.get('IMAGE_PREFETCH', '1') == '1'
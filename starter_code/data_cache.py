@@ -0,0 +1,174 @@
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+import zlib
+from collections import OrderedDict
+
+# generation counters in the shared table; slot 0 is the epoch clear() bumps
+_SLOTS = 4096
+_COUNTER = struct.Struct('Q')
+
+
+class DataCache:
+    # Keeps the data behind the busiest pages (the venue, artist and show
+    # listings, the venue and artist pages) in process memory for up to
+    # DATA_CACHE_TTL seconds (0, the default, turns it off), dropping the least recently used entry past
+    # DATA_CACHE_MAX_ENTRIES. Cached values are shared between requests, so
+    # callers must not modify them.
+    #
+    # Writes make their keys stale through post-commit hooks (views/common).
+    # Every key hashes to one of a fixed number of generation counters, kept
+    # in a small memory-mapped file (DATA_CACHE_GENERATIONS) that all worker
+    # processes on the host share: invalidate() bumps the key's counter, and
+    # an entry is only served while its counter still holds the value read
+    # before the entry was built. So an edit made through one worker is seen
+    # by every worker on its next request, and data read while a write was
+    # committing is never kept. Keys sharing a counter only cost an extra
+    # miss. Without the file the counters are local to the process, and other
+    # processes see writes once the TTL runs out.
+    #
+    #   stamp = data_cache.stamp(key)
+    #   value = build()
+    #   data_cache.set(key, value, stamp)
+    #
+    # or just data_cache.get_or_set(key, build).
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._path = None
+        self._table = bytearray(_SLOTS * _COUNTER.size)
+        self._fd = None
+        self._pid = None
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('DATA_CACHE_TTL', 0)
+        app.config.setdefault('DATA_CACHE_MAX_ENTRIES', 1000)
+        app.config.setdefault('DATA_CACHE_GENERATIONS', '')
+        self.ttl = app.config['DATA_CACHE_TTL']
+        self.max_entries = app.config['DATA_CACHE_MAX_ENTRIES']
+        path = app.config['DATA_CACHE_GENERATIONS'] or None
+        with self._lock:
+            self._entries.clear()
+            if path != self._path:
+                self._close()
+                self._path = path
+                self._table = bytearray(_SLOTS * _COUNTER.size) if path is None else None
+        app.extensions['data_cache'] = self
+
+    def _counters(self):
+        # the shared table, (re)opened in each process: a forked worker must
+        # not share the parent's file lock
+        if self._path is None:
+            return self._table
+        if self._pid != os.getpid():
+            self._close()
+            os.makedirs(os.path.dirname(self._path) or '.', exist_ok=True)
+            fd = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o644)
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(fd).st_size < _SLOTS * _COUNTER.size:
+                    os.ftruncate(fd, _SLOTS * _COUNTER.size)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            self._table = mmap.mmap(fd, _SLOTS * _COUNTER.size)
+            self._fd = fd
+            self._pid = os.getpid()
+        return self._table
+
+    def _close(self):
+        if self._fd is not None and self._pid == os.getpid():
+            self._table.close()
+            os.close(self._fd)
+        self._fd = None
+        self._pid = None
+
+    @staticmethod
+    def _slot(key):
+        return 1 + zlib.crc32(key.encode('utf-8')) % (_SLOTS - 1)
+
+    def stamp(self, key):
+        # take it before reading what will be cached under key
+        table = self._counters()
+        return (_COUNTER.unpack_from(table, 0)[0],
+                _COUNTER.unpack_from(table, self._slot(key) * _COUNTER.size)[0])
+
+    def get(self, key):
+        # the cached value, or None when missing, expired or invalidated
+        if not self.ttl:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires, stamp, value = entry
+                if expires > time.monotonic() and stamp == self.stamp(key):
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def set(self, key, value, stamp):
+        if not self.ttl:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, stamp, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get_or_set(self, key, build):
+        if not self.ttl:
+            return build()
+        value = self.get(key)
+        if value is None:
+            stamp = self.stamp(key)
+            value = build()
+            self.set(key, value, stamp)
+        return value
+
+    def invalidate(self, *keys):
+        if not self.ttl:
+            return
+        self._bump(sorted({self._slot(key) for key in keys}))
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        # every key, in every process sharing the table
+        if not self.ttl:
+            return
+        self._bump([0])
+        with self._lock:
+            self._entries.clear()
+
+    def _bump(self, slots):
+        with self._lock:
+            table = self._counters()
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                for slot in slots:
+                    offset = slot * _COUNTER.size
+                    _COUNTER.pack_into(table, offset, _COUNTER.unpack_from(table, offset)[0] + 1)
+            finally:
+                if self._fd is not None:
+                    fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+            }
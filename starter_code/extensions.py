@@ -0,0 +1,49 @@
+# Extension instances, bound to the application in app.create_app(). Import
+# them from here rather than from app, so modules never need the app itself.
+
+from flask_moment import Moment
+from flask_sqlalchemy import SQLAlchemy
+
+from assets import Assets
+from compression import CompressionMiddleware
+from data_cache import DataCache
+from image_cache import ImageCache
+from log_pipeline import LogPipeline
+from metrics import Metrics
+from pool_monitor import PoolMonitor
+from query_audit import QueryAudit
+from post_commit import PostCommitExecutor
+from query_stats import QueryStats
+from request_profiler import RequestProfiler
+from slow_requests import SlowRequestLog
+from template_cache import TemplateCache
+
+db = SQLAlchemy()
+moment = Moment()
+# JSON lines written by a background thread, with request id and timing
+log_pipeline = LogPipeline()
+# Prometheus counters and histograms, shared across workers through mmap'd files
+metrics = Metrics()
+# compiled templates persist on disk across workers and restarts
+template_cache = TemplateCache()
+pool_monitor = PoolMonitor()
+# count and timing percentiles of every statement, by fingerprint
+query_stats = QueryStats()
+# N+1 and per-view statement budget checks, in development and CI
+query_audit = QueryAudit()
+# cProfile of single requests sent with X-Profile: 1 and the admin token
+request_profiler = RequestProfiler()
+# one log record with SQL and render timings per request over SLOW_REQUEST_MS
+slow_requests = SlowRequestLog()
+# gzip/deflate (and optional HTML minification) of rendered responses
+compression = CompressionMiddleware()
+# fingerprinted css/js bundles, icon sprite and image variants, built with
+# `flask assets build`
+assets = Assets()
+# local copies (and thumbnails) of the remote venue/artist images
+image_cache = ImageCache()
+# side effects registered with @post_commit.hook run off the request thread
+# once the transaction that queued them commits
+post_commit = PostCommitExecutor()
+# listing and detail page data, invalidated by the writes' post-commit hooks
+data_cache = DataCache()
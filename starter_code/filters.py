@@ -0,0 +1,18 @@
+#----------------------------------------------------------------------------#
+# Filters.
+#----------------------------------------------------------------------------#
+
+from slow_requests import timed
+
+@timed('format_datetime')
+def format_datetime(value, format='medium'):
+  # dateutil and babel.dates are imported on first use rather than when the
+  # app is created; wsgi.warm_up() makes that happen before workers fork
+  import dateutil.parser
+  from babel.dates import format_datetime as format_babel_datetime
+  date = dateutil.parser.parse(value)
+  if format == 'full':
+      format="EEEE MMMM, d, y 'at' h:mma"
+  elif format == 'medium':
+      format="EE MM, dd, y h:mma"
+  return format_babel_datetime(date, format, locale='en')
@@ -1,9 +1,18 @@
+import uuid
 from datetime import datetime
+from flask import current_app
 from flask_wtf import Form
-from wtforms import StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField
-from wtforms.validators import DataRequired, AnyOf, URL
+from wtforms import HiddenField, StringField, SelectField, SelectMultipleField, DateTimeField, BooleanField, IntegerField, DateField
+from wtforms.validators import DataRequired, AnyOf, URL, Optional, NumberRange, ValidationError
+
+def new_idempotency_key():
+    return uuid.uuid4().hex
 
 class ShowForm(Form):
+    # rendered once per form view; a resubmitted POST carries the same key
+    idempotency_key = HiddenField(
+        'idempotency_key', default=new_idempotency_key
+    )
     artist_id = StringField(
         'artist_id'
     )
@@ -16,7 +25,46 @@ class ShowForm(Form):
         default= datetime.today()
     )
 
+class ShowSeriesForm(ShowForm):
+    frequency = SelectField(
+        'frequency', validators=[DataRequired()],
+        choices=[
+            ('weekly', 'Weekly'),
+            ('monthly', 'Monthly'),
+        ]
+    )
+    # a series ends after `count` occurrences or on `end_date`, whichever comes first
+    count = IntegerField(
+        'count', validators=[Optional(), NumberRange(min=1)]
+    )
+    end_date = DateField(
+        'end_date', validators=[Optional()]
+    )
+
+    # either bound may be at most SHOW_SERIES_MAX_OCCURRENCES shows
+    def validate_count(self, field):
+        NumberRange(max=current_app.config['SHOW_SERIES_MAX_OCCURRENCES'])(self, field)
+
+    def validate_end_date(self, field):
+        if field.data is None or self.start_time.data is None or self.count.data:
+            return
+        from dateutil.relativedelta import relativedelta
+        limit = current_app.config['SHOW_SERIES_MAX_OCCURRENCES']
+        step = relativedelta(weeks=1) if self.frequency.data == 'weekly' else relativedelta(months=1)
+        if (self.start_time.data + step * limit).date() <= field.data:
+            raise ValidationError(f'A series can have at most {limit} shows; choose an earlier end date.')
+
 class VenueForm(Form):
+    idempotency_key = HiddenField(
+        'idempotency_key', default=new_idempotency_key
+    )
+    # edit forms only: the row version the edit started from and the values shown
+    version = HiddenField(
+        'version'
+    )
+    original = HiddenField(
+        'original'
+    )
     name = StringField(
         'name', validators=[DataRequired()]
     )
@@ -129,6 +177,16 @@ class VenueForm(Form):
 
 
 class ArtistForm(Form):
+    idempotency_key = HiddenField(
+        'idempotency_key', default=new_idempotency_key
+    )
+    # edit forms only: the row version the edit started from and the values shown
+    version = HiddenField(
+        'version'
+    )
+    original = HiddenField(
+        'original'
+    )
     name = StringField(
         'name', validators=[DataRequired()]
     )
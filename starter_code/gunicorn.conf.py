@@ -0,0 +1,53 @@
+# gunicorn settings for serving Fyyur with several worker processes:
+#
+#   SECRET_KEY=... gunicorn -c gunicorn.conf.py
+#
+# Everything can be overridden from the environment.
+
+import gc
+import glob
+import multiprocessing
+import os
+import tempfile
+
+wsgi_app = 'wsgi:app'
+bind = os.environ.get('BIND', '0.0.0.0:' + os.environ.get('PORT', '5000'))
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+
+# import and warm up the app once in the master; workers inherit it via fork
+preload_app = True
+
+# recycle each worker after this many requests (jittered so they don't all
+# restart at once) to bound slow memory growth
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('MAX_REQUESTS_JITTER', 100))
+
+# every worker keeps its /metrics values in a file here; the files of the
+# previous run are removed so its counters are not added in
+os.environ.setdefault('METRICS_DIR', os.path.join(tempfile.gettempdir(), 'fyyur-metrics'))
+for path in glob.glob(os.path.join(os.environ['METRICS_DIR'], '*.db')):
+    os.remove(path)
+
+# no collections while the master builds up the preloaded heap
+gc.disable()
+
+
+def when_ready(server):
+    # the app is loaded; freeze it into the permanent generation so the
+    # workers' collections never touch (and thereby copy) the shared pages
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    gc.enable()
+    # connections must never be shared across processes
+    from wsgi import app
+    from extensions import db
+    with app.app_context():
+        db.engine.dispose()
+
+
+def child_exit(server, worker):
+    # keeps the counters of an exited (e.g. recycled) worker in the totals
+    from extensions import metrics
+    metrics.retire(worker.pid)
@@ -0,0 +1,77 @@
+import os
+import re
+import xml.etree.ElementTree as ElementTree
+
+from markupsafe import Markup
+
+# icon name used in the templates -> code point in the bundled Font Awesome
+# 4 font (static/fonts/fontawesome-webfont.svg). Names follow the Font
+# Awesome 5 classes the templates used with the remote kit.
+GLYPHS = {
+    'facebook-f': 0xf09a,
+    'globe-americas': 0xf0ac,
+    'home': 0xf015,
+    'link': 0xf0c1,
+    'map-marker': 0xf041,
+    'moon': 0xf186,
+    'music': 0xf001,
+    'phone-alt': 0xf095,
+    'quote-left': 0xf10d,
+    'quote-right': 0xf10e,
+    'users': 0xf0c0,
+}
+
+FONT = 'fonts/fontawesome-webfont.svg'
+
+# {{ icon('music') }} / {{ icon('home', 'pull-right') }}
+_ICON_CALL_RE = re.compile(r"""\bicon\(\s*['"]([a-z0-9-]+)['"]""")
+_SVG_NS = '{http://www.w3.org/2000/svg}'
+
+
+def referenced_icons(template_folder):
+    # the icon names the templates actually use, so the sprite holds nothing else
+    names = set()
+    for root, _, files in os.walk(template_folder):
+        for filename in files:
+            if filename.endswith('.html'):
+                with open(os.path.join(root, filename), encoding='utf-8') as fp:
+                    names.update(_ICON_CALL_RE.findall(fp.read()))
+    unknown = names - set(GLYPHS)
+    if unknown:
+        raise KeyError(f'no glyph for icon(s): {", ".join(sorted(unknown))}')
+    return sorted(names)
+
+
+def build_sprite(font_path, names):
+    # turns the named glyphs of an SVG font into <symbol>s of one sprite.
+    # Font glyphs are drawn y-up from the baseline, hence the flip.
+    font = ElementTree.parse(font_path).getroot().find(f'.//{_SVG_NS}font')
+    face = font.find(f'{_SVG_NS}font-face')
+    em = int(face.get('units-per-em'))
+    ascent = int(face.get('ascent'))
+    default_advance = font.get('horiz-adv-x')
+    glyphs = {g.get('unicode'): g for g in font.iter(f'{_SVG_NS}glyph')}
+    symbols = []
+    for name in names:
+        glyph = glyphs[chr(GLYPHS[name])]
+        advance = glyph.get('horiz-adv-x', default_advance)
+        symbols.append(
+            f'<symbol id="icon-{name}" viewBox="0 {-ascent} {advance} {em}">'
+            f'<path transform="scale(1,-1)" d="{glyph.get("d")}"/></symbol>')
+    return ('<svg xmlns="http://www.w3.org/2000/svg">'
+            + ''.join(symbols) + '</svg>\n')
+
+
+def sprite(app):
+    template_folder = os.path.join(app.root_path, app.template_folder)
+    return build_sprite(os.path.join(app.static_folder, FONT), referenced_icons(template_folder))
+
+
+def icon_macro(sprite_url):
+    # jinja global rendering an inline <svg> that points into the sprite
+    def icon(name, classes=''):
+        return Markup(
+            '<svg class="icon icon-{0} {1}" aria-hidden="true" focusable="false">'
+            '<use href="{2}#icon-{0}" xlink:href="{2}#icon-{0}"></use></svg>'
+        ).format(name, classes, sprite_url())
+    return icon
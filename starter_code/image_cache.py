@@ -0,0 +1,331 @@
+import hashlib
+import http.client
+import io
+import ipaddress
+import json
+import os
+import socket
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict, namedtuple
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+CachedImage = namedtuple('CachedImage', 'path content_type etag size')
+
+
+class ImageFetchError(Exception):
+    pass
+
+
+class _CheckedRedirectHandler(urllib.request.HTTPRedirectHandler):
+    # re-validates every redirect target, so a public origin cannot bounce
+    # the fetch to an internal address
+    def __init__(self, cache):
+        self.cache = cache
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        self.cache.check_url(newurl)
+        return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+
+class _PinnedConnection:
+    # opens the socket through ImageCache.connect, which resolves the host
+    # once, vets every address and connects to one of those same addresses,
+    # so a DNS answer that changes after the check cannot steer the fetch to
+    # an internal host. The URL's name is still what goes in the Host header
+    # and, for https, in SNI and the certificate check.
+    def __init__(self, *args, cache, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._create_connection = cache.connect
+
+
+class _PinnedHTTPConnection(_PinnedConnection, http.client.HTTPConnection):
+    pass
+
+
+class _PinnedHTTPSConnection(_PinnedConnection, http.client.HTTPSConnection):
+    pass
+
+
+class _PinnedHTTPHandler(urllib.request.HTTPHandler):
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    def http_open(self, req):
+        return self.do_open(_PinnedHTTPConnection, req, cache=self.cache)
+
+
+class _PinnedHTTPSHandler(urllib.request.HTTPSHandler):
+    def __init__(self, cache):
+        super().__init__()
+        self.cache = cache
+
+    def https_open(self, req):
+        return self.do_open(_PinnedHTTPSConnection, req, cache=self.cache,
+                            context=self._context, check_hostname=self._check_hostname)
+
+
+class ImageCache:
+    # Fetches remote images once and keeps them in a size-bounded directory,
+    # evicting the least recently served entry first.
+    #
+    # Entries are keyed by URL (and thumbnail width); the ETag is a hash of
+    # the stored bytes. Concurrent requests for an entry that is still being
+    # fetched wait for that fetch instead of starting their own, and failed
+    # origins are not retried for IMAGE_FAILURE_TTL seconds.
+    #
+    # The LRU index lives in memory and is rebuilt from the directory on
+    # start, so with several worker processes each enforces the bound on its
+    # own view of the directory.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._index = OrderedDict()
+        self._inflight = {}
+        self._failures = {}
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('IMAGE_CACHE_DIR', os.path.join(app.instance_path, 'image-cache'))
+        app.config.setdefault('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+        app.config.setdefault('IMAGE_MAX_ORIGIN_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('IMAGE_FETCH_TIMEOUT', 5)
+        app.config.setdefault('IMAGE_FAILURE_TTL', 60)
+        app.config.setdefault('IMAGE_WIDTHS', (200, 400, 800))
+        app.config.setdefault('IMAGE_ALLOW_PRIVATE_HOSTS', False)
+        self.directory = app.config['IMAGE_CACHE_DIR']
+        self.max_bytes = app.config['IMAGE_CACHE_MAX_BYTES']
+        self.max_origin_bytes = app.config['IMAGE_MAX_ORIGIN_BYTES']
+        self.timeout = app.config['IMAGE_FETCH_TIMEOUT']
+        self.failure_ttl = app.config['IMAGE_FAILURE_TTL']
+        self.widths = frozenset(app.config['IMAGE_WIDTHS'])
+        self.allow_private_hosts = app.config['IMAGE_ALLOW_PRIVATE_HOSTS']
+        # no ProxyHandler: through a proxy the vetted address would be the
+        # proxy's, not the origin's
+        self._opener = urllib.request.OpenerDirector()
+        for handler in (_PinnedHTTPHandler(self), _PinnedHTTPSHandler(self), _CheckedRedirectHandler(self),
+                        urllib.request.HTTPDefaultErrorHandler(), urllib.request.HTTPErrorProcessor()):
+            self._opener.add_handler(handler)
+        os.makedirs(self.directory, exist_ok=True)
+        self._load_index()
+        app.extensions['image_cache'] = self
+
+    def _load_index(self):
+        entries = []
+        for filename in os.listdir(self.directory):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(self.directory, filename[:-5])
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                os.remove(os.path.join(self.directory, filename))
+                continue
+            entries.append((stat.st_mtime, filename[:-5], stat.st_size))
+        with self._lock:
+            self._index.clear()
+            self.total_bytes = 0
+            for _, key, size in sorted(entries):
+                self._index[key] = size
+                self.total_bytes += size
+
+    @staticmethod
+    def key(url, width=None):
+        return hashlib.sha256(f'{url}\n{width or ""}'.encode('utf-8')).hexdigest()
+
+    def get(self, url, width=None):
+        # returns a CachedImage, fetching (and thumbnailing) on a miss;
+        # raises ImageFetchError when the origin cannot be used
+        if width is not None and width not in self.widths:
+            raise ValueError(f'unsupported width {width}')
+        key = self.key(url, width)
+        while True:
+            entry = self._hit(key)
+            if entry is not None:
+                with self._lock:
+                    self.hits += 1
+                return entry
+            with self._lock:
+                if key in self._index:
+                    # stored by another request since the lookup
+                    continue
+                self.misses += 1
+                failure = self._failures.get(key)
+                if failure and failure[0] > time.monotonic():
+                    raise ImageFetchError(failure[1])
+                future = self._inflight.get(key)
+                owner = future is None
+                if owner:
+                    future = self._inflight[key] = Future()
+                break
+        if not owner:
+            try:
+                return future.result(timeout=self.timeout * 2)
+            except FutureTimeoutError:
+                raise ImageFetchError(f'{url}: timed out waiting for a concurrent fetch')
+        try:
+            if width is None:
+                data, content_type = self._fetch(url)
+            else:
+                data, content_type = self._thumbnail(self.get(url), width)
+            entry = self._store(key, url, data, content_type)
+        except Exception as e:
+            error = e if isinstance(e, ImageFetchError) else ImageFetchError(f'{url}: {e}')
+            with self._lock:
+                now = time.monotonic()
+                self._failures = {k: f for k, f in self._failures.items() if f[0] > now}
+                self._failures[key] = (now + self.failure_ttl, str(error))
+                del self._inflight[key]
+            future.set_exception(error)
+            raise error
+        with self._lock:
+            self._failures.pop(key, None)
+            del self._inflight[key]
+        future.set_result(entry)
+        return entry
+
+    def _hit(self, key):
+        # only the index lookups hold the lock; the file I/O runs outside it,
+        # so a slow disk does not hold up every other image request
+        with self._lock:
+            size = self._index.get(key)
+        if size is None:
+            return None
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path + '.json') as fp:
+                meta = json.load(fp)
+            os.utime(path)
+        except FileNotFoundError:
+            # evicted by another worker process
+            with self._lock:
+                if self._index.get(key) == size:
+                    self.total_bytes -= self._index.pop(key)
+            return None
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        return CachedImage(path, meta['content_type'], meta['etag'], size)
+
+    def check_url(self, url):
+        # the addresses are vetted when the fetch connects (see connect)
+        parts = urllib.parse.urlsplit(url)
+        if parts.scheme not in ('http', 'https') or not parts.hostname:
+            raise ImageFetchError(f'{url}: only http(s) URLs can be proxied')
+
+    def connect(self, address, timeout=socket._GLOBAL_DEFAULT_TIMEOUT, source_address=None):
+        # socket.create_connection, except that the host is resolved once and
+        # every address it resolves to must be public before one is used
+        host, port = address
+        try:
+            infos = socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        except socket.gaierror as e:
+            raise ImageFetchError(f'{host}: {e}')
+        if not self.allow_private_hosts:
+            for info in infos:
+                ip = ipaddress.ip_address(info[4][0].split('%')[0])
+                if not ip.is_global:
+                    raise ImageFetchError(f'{host}: refusing to fetch from non-public address {ip}')
+        error = None
+        for family, type_, proto, _, sockaddr in infos:
+            sock = socket.socket(family, type_, proto)
+            try:
+                if timeout is not socket._GLOBAL_DEFAULT_TIMEOUT:
+                    sock.settimeout(timeout)
+                if source_address:
+                    sock.bind(source_address)
+                sock.connect(sockaddr)
+                return sock
+            except OSError as e:
+                sock.close()
+                error = e
+        raise error or OSError(f'{host}: no addresses')
+
+    def _fetch(self, url):
+        self.check_url(url)
+        request = urllib.request.Request(url, headers={'User-Agent': 'fyyur-image-proxy'})
+        try:
+            with self._opener.open(request, timeout=self.timeout) as response:
+                content_type = response.headers.get_content_type()
+                if not content_type.startswith('image/'):
+                    raise ImageFetchError(f'{url}: not an image ({content_type})')
+                data = response.read(self.max_origin_bytes + 1)
+        except (urllib.error.URLError, OSError) as e:
+            raise ImageFetchError(f'{url}: {e}')
+        if len(data) > self.max_origin_bytes:
+            raise ImageFetchError(f'{url}: larger than {self.max_origin_bytes} bytes')
+        return data, content_type
+
+    def _thumbnail(self, original, width):
+        with open(original.path, 'rb') as fp:
+            data = fp.read()
+        # Pillow is optional and only loaded once a thumbnail is first needed;
+        # without it the original is served
+        try:
+            from PIL import Image
+        except ImportError:
+            return data, original.content_type
+        image = Image.open(io.BytesIO(data))
+        if image.width <= width or getattr(image, 'is_animated', False):
+            return data, original.content_type
+        fmt = image.format
+        image = image.resize((width, max(1, round(image.height * width / image.width))), Image.LANCZOS)
+        out = io.BytesIO()
+        if fmt == 'JPEG':
+            image.convert('RGB').save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+        elif fmt in ('PNG', 'WEBP', 'GIF'):
+            image.save(out, fmt, optimize=True)
+        else:
+            image.convert('RGB').save(out, 'JPEG', quality=82, optimize=True, progressive=True)
+            fmt = 'JPEG'
+        return out.getvalue(), Image.MIME.get(fmt, original.content_type)
+
+    def _store(self, key, url, data, content_type):
+        path = os.path.join(self.directory, key)
+        etag = hashlib.sha256(data).hexdigest()[:32]
+        self._write(path, data)
+        self._write(path + '.json', json.dumps(
+            {'url': url, 'content_type': content_type, 'etag': etag}).encode('utf-8'))
+        with self._lock:
+            self.total_bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            self._evict()
+        return CachedImage(path, content_type, etag, len(data))
+
+    def _write(self, path, data):
+        # write-then-rename, so a reader never sees a partial file
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        with os.fdopen(fd, 'wb') as fp:
+            fp.write(data)
+        os.replace(tmp, path)
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self.total_bytes -= size
+            for suffix in ('', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, key + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._index),
+                'bytes': self.total_bytes,
+                'max_bytes': self.max_bytes,
+                'inflight': len(self._inflight),
+                'failing': sum(1 for expires, _ in self._failures.values() if expires > time.monotonic()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
@@ -0,0 +1,256 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+from flask.logging import default_handler
+
+# attributes every LogRecord has; anything else on a record was passed with
+# extra= (or set by a filter below) and is written as a field of its own
+_RECORD_ATTRIBUTES = frozenset(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    # one JSON object per line
+
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'where': f'{record.module}:{record.lineno}',
+            'pid': record.process,
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES and value is not None:
+                entry[name] = value
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class RequestContextFilter(logging.Filter):
+    # copies the request details onto the record while it is still on the
+    # request thread; the listener thread that writes it has no request context
+
+    def filter(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.route = request.url_rule.rule if request.url_rule else None
+            started = g.get('request_started')
+            if started is not None:
+                record.elapsed_ms = round((time.perf_counter() - started) * 1000, 1)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    # Lets at most `burst` records per call site through every `window`
+    # seconds and drops the rest. The first record a site logs after its
+    # window has passed carries the number dropped in between as `suppressed`.
+    # Records above `max_level` and loggers named in `exempt` (and their
+    # children) are never sampled.
+
+    def __init__(self, burst, window, exempt=(), max_level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.window = window
+        self.exempt = tuple(exempt)
+        self.max_level = max_level
+        self.suppressed = 0
+        self._lock = threading.Lock()
+        self._sites = {}
+
+    def filter(self, record):
+        if self.burst <= 0 or record.levelno > self.max_level or any(record.name == name or record.name.startswith(name + '.') for name in self.exempt):
+            return True
+        key = (record.pathname, record.lineno, record.levelno)
+        now = time.monotonic()
+        with self._lock:
+            site = self._sites.get(key)
+            if site is None or now - site[0] >= self.window:
+                # [window start, records let through, records dropped]
+                self._sites[key] = [now, 1, 0]
+                if site is not None and site[2]:
+                    record.suppressed = site[2]
+                return True
+            if site[1] < self.burst:
+                site[1] += 1
+                return True
+            site[2] += 1
+            self.suppressed += 1
+            return False
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+
+    def __init__(self, pipeline, log_queue):
+        super().__init__(log_queue)
+        self.pipeline = pipeline
+
+    def prepare(self, record):
+        # resolves the message and traceback on the logging thread, so the
+        # record holds no arguments or frames that may change (or be freed)
+        # before the listener gets to it; other handlers keep the original
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        self.pipeline.ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # never wait for the disk: a burst beyond LOG_QUEUE_SIZE is dropped
+            self.pipeline.count_dropped()
+
+
+class LogPipeline:
+    # Structured, non-blocking logging for app.logger.
+    #
+    # A log call only puts the record on an in-memory queue; a background
+    # QueueListener thread formats it as a JSON line and writes it to
+    # LOG_FILE. Each line carries the request id (the X-Request-ID header,
+    # or a generated one echoed back in the response), method, route, path
+    # and the milliseconds since the request started. Noisy call sites are
+    # sampled (LOG_SAMPLE_BURST per LOG_SAMPLE_WINDOW seconds, up to
+    # LOG_SAMPLE_MAX_LEVEL, so errors always get through) and a full queue
+    # drops records instead of blocking the request.
+    #
+    # The file rotates at LOG_MAX_BYTES keeping LOG_BACKUP_COUNT old files.
+    # Several worker processes appending to one file must not rotate it
+    # themselves: set LOG_MAX_BYTES=0 there and let logrotate (or similar)
+    # move the file, which is then reopened.
+    #
+    # With LOG_REQUESTS on, every request also gets an access line on the
+    # `<app>.access` logger, which is never sampled.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._pid = None
+        self.handler = None
+        self.listener = None
+        self.dropped = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('LOG_FILE', 'error.log')
+        app.config.setdefault('LOG_LEVEL', 'INFO')
+        app.config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+        app.config.setdefault('LOG_BACKUP_COUNT', 5)
+        app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+        app.config.setdefault('LOG_SAMPLE_BURST', 20)
+        app.config.setdefault('LOG_SAMPLE_WINDOW', 60)
+        app.config.setdefault('LOG_SAMPLE_MAX_LEVEL', 'WARNING')
+        app.config.setdefault('LOG_REQUESTS', False)
+        self.app = app
+        self.filename = app.config['LOG_FILE']
+        self.max_bytes = app.config['LOG_MAX_BYTES']
+        self.backup_count = app.config['LOG_BACKUP_COUNT']
+        self.queue_size = app.config['LOG_QUEUE_SIZE']
+        self.log_requests = app.config['LOG_REQUESTS']
+        self.access_logger = app.logger.getChild('access')
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        app.extensions['log_pipeline'] = self
+        if not self.filename:
+            return
+        if self.handler is None:
+            atexit.register(self.stop)
+        else:
+            # bound to another app: the apps share the logger, and the old
+            # handler's listener would keep running while the new queue is
+            # never read
+            self.stop()
+            self.logger.removeHandler(self.handler)
+        max_level = app.config['LOG_SAMPLE_MAX_LEVEL']
+        if isinstance(max_level, str):
+            max_level = logging.getLevelName(max_level.upper())
+        self.sampling = SamplingFilter(app.config['LOG_SAMPLE_BURST'], app.config['LOG_SAMPLE_WINDOW'],
+                                       exempt=(self.access_logger.name,), max_level=max_level)
+        self.handler = _NonBlockingQueueHandler(self, queue.Queue(self.queue_size))
+        self.handler.addFilter(self.sampling)
+        self.handler.addFilter(RequestContextFilter())
+        app.logger.setLevel(app.config['LOG_LEVEL'])
+        # replaces Flask's console handler, which writes on the calling thread
+        app.logger.removeHandler(default_handler)
+        app.logger.addHandler(self.handler)
+        self.logger = app.logger
+
+    def _file_handler(self):
+        if self.max_bytes:
+            handler = logging.handlers.RotatingFileHandler(
+                self.filename, maxBytes=self.max_bytes, backupCount=self.backup_count,
+                encoding='utf-8', delay=True)
+        else:
+            handler = logging.handlers.WatchedFileHandler(self.filename, encoding='utf-8', delay=True)
+        handler.setFormatter(JsonFormatter())
+        return handler
+
+    def ensure_started(self):
+        # the listener thread is started on first use in every process:
+        # gunicorn forks its workers from a master that already created the
+        # app, and threads (and the queue they were reading) do not carry over
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if self._pid is not None:
+                self.handler.queue = queue.Queue(self.queue_size)
+            self.listener = logging.handlers.QueueListener(self.handler.queue, self._file_handler())
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def count_dropped(self):
+        with self._lock:
+            self.dropped += 1
+
+    def stop(self):
+        # writes out whatever is still queued; runs at interpreter exit
+        with self._lock:
+            if self.listener is None or self._pid != os.getpid():
+                return
+            listener, self.listener, self._pid = self.listener, None, None
+        listener.stop()
+        for handler in listener.handlers:
+            handler.close()
+
+    def _start_request(self):
+        g.request_started = time.perf_counter()
+        g.request_id = request.headers.get('X-Request-ID', '')[:64] or uuid.uuid4().hex
+
+    def _end_request(self, response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers.setdefault('X-Request-ID', request_id)
+        if self.log_requests and 'request_started' in g:
+            self.access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.request_started) * 1000, 1),
+            })
+        return response
+
+    def stats(self):
+        return {
+            'queued': self.handler.queue.qsize() if self.handler else 0,
+            'dropped': self.dropped,
+            'suppressed': self.sampling.suppressed if self.handler else 0,
+        }
@@ -0,0 +1,445 @@
+import fcntl
+import json
+import math
+import mmap
+import os
+import resource
+import struct
+import threading
+import time
+
+from flask import g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_USED = struct.Struct('Q')
+_LENGTH = struct.Struct('I')
+_VALUE = struct.Struct('d')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+STATEMENT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# name: (type, help, buckets for a histogram / how gauges of several worker
+# processes combine: 'sum' adds them up, 'pid' lists each under a pid label)
+FAMILIES = {
+    'fyyur_http_requests_total': ('counter', 'Requests served, by route, method and status.', None),
+    'fyyur_http_request_duration_seconds': ('histogram', 'Time to handle a request, by route.', LATENCY_BUCKETS),
+    'fyyur_http_response_size_bytes': ('histogram', 'Response body size before compression, by route.', SIZE_BUCKETS),
+    'fyyur_db_statement_duration_seconds': ('histogram', 'Time spent executing SQL statements, by kind.',
+                                            STATEMENT_BUCKETS),
+    'fyyur_db_pool_size': ('gauge', 'Connections the pool keeps open.', 'sum'),
+    'fyyur_db_pool_checked_out': ('gauge', 'Connections in use.', 'sum'),
+    'fyyur_db_pool_idle': ('gauge', 'Open connections waiting in the pool.', 'sum'),
+    'fyyur_db_pool_overflow': ('gauge', 'Connections open beyond the pool size.', 'sum'),
+    'fyyur_db_pool_checkouts_total': ('counter', 'Connections handed out by the pool.', None),
+    'fyyur_db_pool_connects_total': ('counter', 'New database connections opened.', None),
+    'fyyur_db_pool_invalidations_total': ('counter', 'Connections discarded as broken.', None),
+    'fyyur_db_pool_timeouts_total': ('counter', 'Checkouts that timed out waiting for a connection.', None),
+    'fyyur_db_pool_waits_total': ('counter', 'Checkouts that had to wait for a connection.', None),
+    'fyyur_post_commit_queue_depth': ('gauge', 'Side effects waiting to run.', 'sum'),
+    'fyyur_post_commit_jobs_total': ('counter', 'Side effects by outcome.', None),
+    'fyyur_cache_hits_total': ('counter', 'Cache lookups answered from the cache.', None),
+    'fyyur_cache_misses_total': ('counter', 'Cache lookups that missed.', None),
+    'fyyur_cache_hit_ratio': ('gauge', 'Hits over lookups since start, over all workers.', 'sum'),
+    'fyyur_process_resident_memory_bytes': ('gauge', 'Resident memory of each worker process.', 'pid'),
+}
+
+
+class _Values:
+    # float values keyed by sample, kept in a memory map that only the
+    # owning process writes. Layout: bytes in use (uint64), then per sample
+    # its key length (uint32), the JSON key padded to 8 bytes, the value.
+    # A sample is written in full before the used count covers it, so a
+    # reader in another process never sees half an entry.
+
+    def __init__(self, path=None, size=64 * 1024):
+        self.path = path
+        self.positions = {}
+        self._fd = None
+        if path is not None:
+            self._fd = os.open(path, os.O_RDWR | os.O_CREAT | os.O_TRUNC, 0o644)
+            os.ftruncate(self._fd, size)
+        self._map = mmap.mmap(-1 if self._fd is None else self._fd, size)
+        self.used = _USED.size
+        _USED.pack_into(self._map, 0, self.used)
+
+    def _grow(self, needed):
+        size = len(self._map)
+        while size < needed:
+            size *= 2
+        if self._fd is not None:
+            os.ftruncate(self._fd, size)
+            grown = mmap.mmap(self._fd, size)
+        else:
+            grown = mmap.mmap(-1, size)
+            grown[:self.used] = self._map[:self.used]
+        self._map.close()
+        self._map = grown
+
+    def _position(self, key):
+        encoded = json.dumps(key, separators=(',', ':')).encode('utf-8')
+        padded = (_LENGTH.size + len(encoded) + 7) // 8 * 8
+        start = self.used
+        if start + padded + _VALUE.size > len(self._map):
+            self._grow(start + padded + _VALUE.size)
+        _LENGTH.pack_into(self._map, start, len(encoded))
+        self._map[start + _LENGTH.size:start + _LENGTH.size + len(encoded)] = encoded
+        position = start + padded
+        _VALUE.pack_into(self._map, position, 0.0)
+        self.used = position + _VALUE.size
+        _USED.pack_into(self._map, 0, self.used)
+        self.positions[key] = position
+        return position
+
+    def add(self, key, amount):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._position(key)
+        _VALUE.pack_into(self._map, position, _VALUE.unpack_from(self._map, position)[0] + amount)
+
+    def set(self, key, value):
+        position = self.positions.get(key)
+        if position is None:
+            position = self._position(key)
+        _VALUE.pack_into(self._map, position, value)
+
+    def read(self):
+        return _parse(self._map[:self.used])
+
+    def close(self):
+        self._map.close()
+        if self._fd is not None:
+            os.close(self._fd)
+
+
+def _parse(data):
+    # {(name, labels): value} from the bytes of a values file
+    values = {}
+    if len(data) < _USED.size:
+        return values
+    used = min(_USED.unpack_from(data, 0)[0], len(data))
+    position = _USED.size
+    while position + _LENGTH.size <= used:
+        length = _LENGTH.unpack_from(data, position)[0]
+        padded = (_LENGTH.size + length + 7) // 8 * 8
+        name, labels = json.loads(data[position + _LENGTH.size:position + _LENGTH.size + length])
+        values[name, tuple(map(tuple, labels))] = _VALUE.unpack_from(data, position + padded)[0]
+        position += padded + _VALUE.size
+    return values
+
+
+def _family(name):
+    for suffix in ('_bucket', '_sum', '_count'):
+        if name.endswith(suffix) and name[:-len(suffix)] in FAMILIES:
+            return name[:-len(suffix)]
+    return name
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _resident_memory():
+    try:
+        with open('/proc/self/statm') as fp:
+            return int(fp.read().split()[1]) * mmap.PAGESIZE
+    except (OSError, IndexError, ValueError):
+        # peak rather than current where /proc is missing; kilobytes on Linux, bytes on macOS
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _escape(value):
+    if value == math.inf:
+        return '+Inf'
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _sample(name, labels, value):
+    rendered = ','.join(f'{k}="{_escape(v)}"' for k, v in labels)
+    if float(value).is_integer():
+        value = int(value)
+    return f'{name}{{{rendered}}} {value}' if rendered else f'{name} {value}'
+
+
+class Metrics:
+    # Prometheus metrics for /metrics, in the text exposition format and
+    # without a client library.
+    #
+    # Every worker process records into its own memory-mapped file in
+    # METRICS_DIR (<pid>.db); /metrics, whichever worker answers it, adds up
+    # all the files. Recording is a dict lookup and a struct write under an
+    # uncontended lock. Counters of a worker gunicorn has reaped are folded
+    # into archive.db by retire(), so totals survive worker restarts; gauges
+    # only count for live processes. Without METRICS_DIR the values stay in
+    # anonymous memory and /metrics shows this process only.
+    #
+    # Per request: count by route/method/status, latency and response size
+    # histograms by route. Per statement: a duration histogram by kind
+    # (SELECT, INSERT, ...). The pool, post-commit queue, cache and memory
+    # figures are copied from their extensions at most every
+    # METRICS_COLLECT_INTERVAL seconds, as a request ends.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._values = None
+        self._next_collect = 0.0
+        self.collectors = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('METRICS_ENABLED', True)
+        app.config.setdefault('METRICS_DIR', '')
+        app.config.setdefault('METRICS_COLLECT_INTERVAL', 1.0)
+        app.config.setdefault('METRICS_TOKEN', None)
+        self.app = app
+        self.directory = app.config['METRICS_DIR']
+        self.collect_interval = app.config['METRICS_COLLECT_INTERVAL']
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        # the rest is per process: set up with the first app only, or every
+        # statement would be counted once per app created
+        if event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            return
+        # a forked worker must not write into its parent's file
+        os.register_at_fork(after_in_child=self._forget_values)
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+        self.collectors.extend((self._collect_extensions, self._collect_memory))
+
+    def _forget_values(self):
+        self._lock = threading.Lock()
+        self._values = None
+        self._next_collect = 0.0
+
+    def _file(self):
+        # under self._lock
+        if self._values is None:
+            path = os.path.join(self.directory, f'{os.getpid()}.db') if self.directory else None
+            self._values = _Values(path)
+        return self._values
+
+    def inc(self, name, labels=(), amount=1.0):
+        with self._lock:
+            self._file().add((name, labels), amount)
+
+    def set(self, name, labels=(), value=0.0):
+        with self._lock:
+            self._file().set((name, labels), value)
+
+    def observe(self, name, labels, value):
+        buckets = FAMILIES[name][2]
+        with self._lock:
+            values = self._file()
+            for bound in buckets:
+                if value <= bound:
+                    # per-bucket counts; made cumulative when rendered
+                    values.add((name + '_bucket', labels + (('le', bound),)), 1.0)
+                    break
+            values.add((name + '_sum', labels), value)
+            values.add((name + '_count', labels), 1.0)
+
+    # -- recording
+
+    def _start_request(self):
+        g.metrics_started = time.perf_counter()
+
+    def _end_request(self, response):
+        started = g.get('metrics_started')
+        if started is None:
+            return response
+        route = request.url_rule.rule if request.url_rule else '<unmatched>'
+        labels = (('route', route), ('method', request.method))
+        self.inc('fyyur_http_requests_total', labels + (('status', str(response.status_code)),))
+        self.observe('fyyur_http_request_duration_seconds', labels, time.perf_counter() - started)
+        # streamed responses (the exports) have no length up front and are left out
+        size = response.content_length if response.is_streamed else response.calculate_content_length()
+        if size is not None:
+            self.observe('fyyur_http_response_size_bytes', labels, size)
+        now = time.monotonic()
+        if now >= self._next_collect:
+            self._next_collect = now + self.collect_interval
+            self.collect()
+        return response
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        context._metrics_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_metrics_started', None)
+        if started is None:
+            return
+        kind = statement.lstrip()[:6].upper()
+        if kind not in ('SELECT', 'INSERT', 'UPDATE', 'DELETE'):
+            kind = 'OTHER'
+        self.observe('fyyur_db_statement_duration_seconds', (('kind', kind),), time.perf_counter() - started)
+
+    def collect(self):
+        # copies the state other extensions keep in memory into the file
+        for collector in self.collectors:
+            try:
+                collector(self)
+            except Exception:
+                self.app.logger.exception('metrics collector %r failed', collector)
+
+    def _collect_extensions(self, metrics):
+        # counters these keep are cumulative per process, so they are set
+        # rather than added
+        extensions = self.app.extensions
+        if 'pool_monitor' in extensions:
+            pool = extensions['pool_monitor'].stats()
+            for name in ('size', 'checked_out', 'idle', 'overflow'):
+                if name in pool:
+                    self.set(f'fyyur_db_pool_{name}', (), pool[name])
+            for name in ('checkouts', 'connects', 'invalidations', 'timeouts', 'waits'):
+                self.set(f'fyyur_db_pool_{name}_total', (), pool[name])
+        if 'post_commit' in extensions:
+            jobs = extensions['post_commit'].stats()
+            self.set('fyyur_post_commit_queue_depth', (), jobs['queue_depth'])
+            for outcome in ('submitted', 'completed', 'failed', 'inline'):
+                self.set('fyyur_post_commit_jobs_total', (('outcome', outcome),), jobs[outcome])
+        for cache, extension in (('image', 'image_cache'), ('template', 'template_cache'), ('data', 'data_cache')):
+            if extension in extensions:
+                stats = extensions[extension].stats()
+                self.set('fyyur_cache_hits_total', (('cache', cache),), stats['hits'])
+                self.set('fyyur_cache_misses_total', (('cache', cache),), stats['misses'])
+
+    def _collect_memory(self, metrics):
+        self.set('fyyur_process_resident_memory_bytes', (), _resident_memory())
+
+    # -- reading
+
+    def _files(self):
+        # [(pid or None for the archive, values)] of every process
+        if not self.directory:
+            with self._lock:
+                return [(os.getpid(), self._file().read())]
+        files = []
+        for filename in os.listdir(self.directory):
+            stem, ext = os.path.splitext(filename)
+            if ext != '.db':
+                continue
+            try:
+                with open(os.path.join(self.directory, filename), 'rb') as fp:
+                    values = _parse(fp.read())
+            except FileNotFoundError:
+                continue
+            files.append((None if stem == 'archive' else int(stem), values))
+        return files
+
+    def _lockfile(self, operation):
+        fd = os.open(os.path.join(self.directory, '.lock'), os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.flock(fd, operation)
+        return fd
+
+    def retire(self, pid):
+        # folds the counters and histograms of an exited worker into the
+        # archive and removes its file; gunicorn's child_exit hook calls it
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f'{pid}.db')
+        fd = self._lockfile(fcntl.LOCK_EX)
+        try:
+            try:
+                with open(path, 'rb') as fp:
+                    retired = _parse(fp.read())
+            except FileNotFoundError:
+                return
+            archive_path = os.path.join(self.directory, 'archive.db')
+            try:
+                with open(archive_path, 'rb') as fp:
+                    merged = _parse(fp.read())
+            except FileNotFoundError:
+                merged = {}
+            for key, value in retired.items():
+                if FAMILIES[_family(key[0])][0] != 'gauge':
+                    merged[key] = merged.get(key, 0.0) + value
+            tmp = os.path.join(self.directory, 'archive.tmp')
+            archive = _Values(tmp)
+            for key, value in merged.items():
+                archive.set(key, value)
+            archive.close()
+            os.replace(tmp, archive_path)
+            os.remove(path)
+        finally:
+            os.close(fd)
+
+    def aggregate(self):
+        # {(name, labels): value} summed over every process; gauges of live
+        # processes only
+        if self.directory:
+            fd = self._lockfile(fcntl.LOCK_SH)
+            try:
+                files = self._files()
+            finally:
+                os.close(fd)
+        else:
+            files = self._files()
+        totals = {}
+        for pid, values in files:
+            live = pid is not None and (pid == os.getpid() or _alive(pid))
+            for (name, labels), value in values.items():
+                kind, _, combine = FAMILIES[_family(name)]
+                if kind == 'gauge':
+                    if not live:
+                        continue
+                    if combine == 'pid':
+                        labels = labels + (('pid', str(pid)),)
+                totals[name, labels] = totals.get((name, labels), 0.0) + value
+        # ratios are only meaningful over the summed counters
+        for (name, labels), hits in list(totals.items()):
+            if name == 'fyyur_cache_hits_total':
+                lookups = hits + totals.get(('fyyur_cache_misses_total', labels), 0.0)
+                totals['fyyur_cache_hit_ratio', labels] = hits / lookups if lookups else 0.0
+        return totals
+
+    def render(self):
+        self.collect()
+        by_family = {}
+        for (name, labels), value in self.aggregate().items():
+            by_family.setdefault(_family(name), []).append((name, labels, value))
+        lines = []
+        for family, (kind, help_text, _) in FAMILIES.items():
+            samples = by_family.get(family)
+            if not samples:
+                continue
+            lines.append(f'# HELP {family} {help_text}')
+            lines.append(f'# TYPE {family} {kind}')
+            if kind == 'histogram':
+                lines.extend(self._render_histogram(family, samples))
+            else:
+                lines.extend(_sample(name, labels, value) for name, labels, value in sorted(samples))
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _render_histogram(family, samples):
+        series = {}
+        for name, labels, value in samples:
+            if name.endswith('_bucket'):
+                bound = dict(labels)['le']
+                labels = tuple(label for label in labels if label[0] != 'le')
+                series.setdefault(labels, [{}, 0.0, 0.0])[0][bound] = value
+            elif name.endswith('_sum'):
+                series.setdefault(labels, [{}, 0.0, 0.0])[1] = value
+            else:
+                series.setdefault(labels, [{}, 0.0, 0.0])[2] = value
+        for labels, (buckets, total, count) in sorted(series.items()):
+            cumulative = 0.0
+            for bound in FAMILIES[family][2]:
+                cumulative += buckets.get(bound, 0.0)
+                yield _sample(family + '_bucket', labels + (('le', bound),), cumulative)
+            yield _sample(family + '_bucket', labels + (('le', math.inf),), count)
+            yield _sample(family + '_sum', labels, total)
+            yield _sample(family + '_count', labels, count)
@@ -0,0 +1,26 @@
+"""add version columns to Venue and Artist
+
+Revision ID: 5b7e0f3c2a19
+Revises: c3d91e5a7b20
+Create Date: 2026-10-19 13:26:51.902318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b7e0f3c2a19'
+down_revision = 'c3d91e5a7b20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('Venue', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+    op.add_column('Artist', sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    op.drop_column('Artist', 'version')
+    op.drop_column('Venue', 'version')
@@ -0,0 +1,27 @@
+"""store the response of an idempotent submission
+
+Revision ID: 7c5e2b8d4f13
+Revises: e41a8d6b9f02
+Create Date: 2026-10-19 15:42:10.604118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c5e2b8d4f13'
+down_revision = 'e41a8d6b9f02'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # keys stored so far were all answered with a plain 200
+    op.add_column('idempotency_keys', sa.Column('status', sa.Integer(), nullable=False, server_default='200'))
+    op.add_column('idempotency_keys', sa.Column('location', sa.String(length=300), nullable=True))
+
+
+def downgrade():
+    op.drop_column('idempotency_keys', 'location')
+    op.drop_column('idempotency_keys', 'status')
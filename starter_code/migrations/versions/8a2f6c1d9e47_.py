@@ -0,0 +1,27 @@
+"""add indexes for artist availability search
+
+Revision ID: 8a2f6c1d9e47
+Revises: 3e5d504bbcb1
+Create Date: 2026-10-19 09:12:40.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a2f6c1d9e47'
+down_revision = '3e5d504bbcb1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_shows_artist_id_start_time', 'shows', ['artist_id', 'start_time'], unique=False)
+    op.create_index('ix_Artist_seeking_state_city', 'Artist', ['state', 'city'], unique=False,
+                    postgresql_where=sa.text('seeking_venue'))
+
+
+def downgrade():
+    op.drop_index('ix_Artist_seeking_state_city', table_name='Artist')
+    op.drop_index('ix_shows_artist_id_start_time', table_name='shows')
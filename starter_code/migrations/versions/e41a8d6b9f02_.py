@@ -0,0 +1,34 @@
+"""cascade show deletes from Venue and Artist
+
+Revision ID: e41a8d6b9f02
+Revises: 5b7e0f3c2a19
+Create Date: 2026-10-19 14:48:03.215770
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e41a8d6b9f02'
+down_revision = '5b7e0f3c2a19'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the original foreign keys were created unnamed, so they carry postgres' default names
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'Venue', ['venue_id'], ['id'], ondelete='CASCADE')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'Artist', ['artist_id'], ['id'], ondelete='CASCADE')
+    # the per-artist index from 8a2f6c1d9e47 covers artist_id lookups; venue_id needs its own
+    op.create_index('ix_shows_venue_id', 'shows', ['venue_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_shows_venue_id', table_name='shows')
+    op.drop_constraint('shows_artist_id_fkey', 'shows', type_='foreignkey')
+    op.drop_constraint('shows_venue_id_fkey', 'shows', type_='foreignkey')
+    op.create_foreign_key('shows_artist_id_fkey', 'shows', 'Artist', ['artist_id'], ['id'])
+    op.create_foreign_key('shows_venue_id_fkey', 'shows', 'Venue', ['venue_id'], ['id'])
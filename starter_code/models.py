@@ -0,0 +1,97 @@
+from datetime import datetime
+
+from extensions import db
+
+#----------------------------------------------------------------------------#
+# Models.
+#----------------------------------------------------------------------------#
+
+class Venue(db.Model):
+    __tablename__ = 'Venue'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    address = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    genres = db.Column(db.String(120))
+    website_link = db.Column(db.String(120))
+    seeking_talent = db.Column(db.Boolean, default=False)
+    seeking_description = db.Column(db.String(500))
+    # bumped by every edit; edits carry the version they started from
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    shows = db.relationship('Show', backref='venue', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version}
+
+    def __repr__(self) -> str:
+        return f'<Venue {self.id} {self.name}>'
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+class Artist(db.Model):
+    __tablename__ = 'Artist'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String)
+    city = db.Column(db.String(120))
+    state = db.Column(db.String(120))
+    phone = db.Column(db.String(120))
+    genres = db.Column(db.String(120))
+    image_link = db.Column(db.String(500))
+    facebook_link = db.Column(db.String(120))
+    website_link = db.Column(db.String(120))
+    seeking_venue = db.Column(db.Boolean, default=False)
+    seeking_description = db.Column(db.String(500))
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1')
+    shows = db.relationship('Show', backref='artist', passive_deletes=True)
+
+    __mapper_args__ = {'version_id_col': version}
+
+    # availability search filters artists seeking a venue by state and city
+    __table_args__ = (
+        db.Index('ix_Artist_seeking_state_city', 'state', 'city',
+                 postgresql_where=db.text('seeking_venue')),
+    )
+
+    def __repr__(self) -> str:
+        return f'<Artist {self.id} {self.name}>'
+
+
+    # TODO: implement any missing fields, as a database migration using Flask-Migrate
+
+# TODO Implement Show and Artist models, and complete all model relationships and properties, as a database migration.
+class Show(db.Model):
+    __tablename__ = 'shows'
+
+    id = db.Column(db.Integer, primary_key=True)
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False, index=True)
+    start_time = db.Column(db.DateTime, default=datetime.now(), nullable=False)
+
+    # supports the per-artist date range probe of the availability anti-join
+    __table_args__ = (
+        db.Index('ix_shows_artist_id_start_time', 'artist_id', 'start_time'),
+    )
+
+    def __repr__(self):
+        return f'<Show {self.id} {self.artist_id} {self.venue_id} {self.start_time}>'
+
+class IdempotencyKey(db.Model):
+    # outcome of a create submission, so a retried POST carrying the same key
+    # is answered from here instead of inserting a duplicate
+    __tablename__ = 'idempotency_keys'
+
+    key = db.Column(db.String(64), primary_key=True)
+    endpoint = db.Column(db.String(64), primary_key=True)
+    message = db.Column(db.String(300), nullable=False)
+    # the response the submission got: its status and Location, if any
+    status = db.Column(db.Integer, nullable=False, server_default='200')
+    location = db.Column(db.String(300))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+
+    def __repr__(self):
+        return f'<IdempotencyKey {self.endpoint} {self.key}>'
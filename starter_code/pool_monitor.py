@@ -0,0 +1,134 @@
+import threading
+import time
+
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+
+class PoolMonitor:
+    # Counts what the connection pool does (checkouts, new connections,
+    # invalidations, time spent waiting for a free connection, timeouts) and
+    # logs a warning when the pool runs close to saturation.
+    #
+    # Waiting time is only observable inside the pool, so init_app makes the
+    # engine use InstrumentedQueuePool unless another poolclass was configured.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self.pool = None
+        self.checkouts = 0
+        self.checkins = 0
+        self.connects = 0
+        self.invalidations = 0
+        self.timeouts = 0
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+        self.peak_checked_out = 0
+        self._last_warning = 0.0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('POOL_SATURATION_WARNING', 0.9)
+        app.config.setdefault('POOL_WARNING_INTERVAL', 60)
+        self.app = app
+        self.saturation_warning = app.config['POOL_SATURATION_WARNING']
+        self.warning_interval = app.config['POOL_WARNING_INTERVAL']
+        options = app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {})
+        if 'pool_size' in options:
+            options.setdefault('poolclass', InstrumentedQueuePool)
+        InstrumentedQueuePool.monitor = self
+        app.extensions['pool_monitor'] = self
+        # class-wide listeners, so once per process however many apps there are
+        if event.contains(QueuePool, 'checkout', self._on_checkout):
+            return
+        event.listen(QueuePool, 'checkout', self._on_checkout)
+        event.listen(QueuePool, 'checkin', self._on_checkin)
+        event.listen(QueuePool, 'connect', self._on_connect)
+        event.listen(QueuePool, 'invalidate', self._on_invalidate)
+        event.listen(QueuePool, 'soft_invalidate', self._on_invalidate)
+
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        pool = connection_proxy._pool
+        with self._lock:
+            self.pool = pool
+            self.checkouts += 1
+            self.peak_checked_out = max(self.peak_checked_out, pool.checkedout())
+        self._check_saturation(pool)
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+    def record_wait(self, seconds, timed_out=False):
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += seconds
+            self.max_wait_seconds = max(self.max_wait_seconds, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def _capacity(self, pool):
+        return pool.size() + max(pool._max_overflow, 0)
+
+    def _check_saturation(self, pool):
+        capacity = self._capacity(pool)
+        if not capacity or pool.checkedout() / capacity < self.saturation_warning:
+            return
+        now = time.monotonic()
+        if now - self._last_warning < self.warning_interval:
+            return
+        self._last_warning = now
+        self.app.logger.warning('db pool saturated: %s', self.stats())
+
+    def stats(self):
+        with self._lock:
+            pool = self.pool
+            stats = {
+                'checkouts': self.checkouts,
+                'checkins': self.checkins,
+                'connects': self.connects,
+                'invalidations': self.invalidations,
+                'timeouts': self.timeouts,
+                'waits': self.waits,
+                'mean_wait_seconds': self.wait_seconds / self.waits if self.waits else 0.0,
+                'max_wait_seconds': self.max_wait_seconds,
+                'peak_checked_out': self.peak_checked_out,
+            }
+        if isinstance(pool, QueuePool):
+            capacity = self._capacity(pool)
+            stats.update({
+                'size': pool.size(),
+                'checked_out': pool.checkedout(),
+                'idle': pool.checkedin(),
+                'overflow': max(pool.overflow(), 0),
+                'saturation': pool.checkedout() / capacity if capacity else 0.0,
+            })
+        return stats
+
+
+class InstrumentedQueuePool(QueuePool):
+    # QueuePool that reports how long each checkout waited for a connection
+    monitor = None
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except PoolTimeoutError:
+            if self.monitor is not None:
+                self.monitor.record_wait(time.perf_counter() - started, timed_out=True)
+            raise
+        if self.monitor is not None:
+            self.monitor.record_wait(time.perf_counter() - started)
+        return connection
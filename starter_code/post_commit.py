@@ -0,0 +1,199 @@
+import atexit
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from sqlalchemy import event
+
+
+class PostCommitExecutor:
+    # Runs registered side effects (cache invalidation, index updates, counters)
+    # on a bounded thread pool once the session they were queued on commits.
+    # Work queued in a transaction that rolls back is dropped.
+    #
+    #   post_commit = PostCommitExecutor(app, db)
+    #
+    #   @post_commit.hook('venue.changed')
+    #   def refresh_venue(venue_id): ...
+    #
+    #   post_commit.enqueue('venue.changed', venue_id=venue.id)
+    #   db.session.commit()
+    #
+    # Hooks registered with inline=True run on the committing thread instead,
+    # before the response goes out; that is for cheap work the next request
+    # must already see, like dropping cached data.
+    #
+    # One executor serves every app built in the process: the pool, the
+    # session listeners and the shutdown handler are set up once, and each
+    # side effect runs in the app context it was queued from.
+
+    def __init__(self, app=None, db=None):
+        self.hooks = defaultdict(list)
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pool = None
+        self._slots = None
+        self._reset_stats()
+        if app is not None:
+            self.init_app(app, db)
+
+    def init_app(self, app, db):
+        app.config.setdefault('POST_COMMIT_WORKERS', 4)
+        app.config.setdefault('POST_COMMIT_QUEUE_SIZE', 1000)
+        app.config.setdefault('POST_COMMIT_SUBMIT_TIMEOUT', 0.05)
+        app.config.setdefault('POST_COMMIT_DRAIN_TIMEOUT', 10)
+        self.app = app
+        self.db = db
+        self.submit_timeout = app.config['POST_COMMIT_SUBMIT_TIMEOUT']
+        self.drain_timeout = app.config['POST_COMMIT_DRAIN_TIMEOUT']
+        app.extensions['post_commit'] = self
+        if self._pool is None:
+            self._slots = threading.BoundedSemaphore(app.config['POST_COMMIT_QUEUE_SIZE'])
+            self._pool = ThreadPoolExecutor(max_workers=app.config['POST_COMMIT_WORKERS'],
+                                            thread_name_prefix='post-commit')
+        if not event.contains(db.session, 'after_commit', self._after_commit):
+            event.listen(db.session, 'after_commit', self._after_commit)
+            event.listen(db.session, 'after_soft_rollback', self._after_rollback)
+            atexit.register(self.shutdown)
+
+    def _reset_stats(self):
+        self.pending = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.inline = 0
+        self.wait_seconds = 0.0
+        self.run_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def hook(self, name, inline=False):
+        def decorator(func):
+            self.hooks[name].append((func, inline))
+            return func
+        return decorator
+
+    def enqueue(self, name, **kwargs):
+        # queue a side effect on the current transaction; nothing runs unless
+        # it commits
+        if not self.hooks.get(name):
+            return
+        session = self.db.session()
+        if not session.in_transaction():
+            # so that a rollback, even before any statement, drops it too
+            session.begin()
+        session.info.setdefault('post_commit', []).append(
+            (name, kwargs, current_app._get_current_object()))
+
+    def _after_commit(self, session):
+        for name, kwargs, app in session.info.pop('post_commit', []):
+            for func, inline in self.hooks.get(name, ()):
+                if inline:
+                    self._run(func, kwargs, time.perf_counter(), app, inline=True)
+                else:
+                    self._submit(func, kwargs, app)
+
+    def _after_rollback(self, session, previous_transaction):
+        session.info.pop('post_commit', None)
+
+    def _submit(self, func, kwargs, app):
+        # backpressure: once the queue is full the request thread waits a
+        # little for a slot, then waits for the side effect itself rather than
+        # letting the backlog grow without bound
+        queued_at = time.perf_counter()
+        pool = self._pool
+        if pool is None or not self._slots.acquire(timeout=self.submit_timeout):
+            with self._lock:
+                self.inline += 1
+            self._run_waiting(func, kwargs, queued_at, app)
+            return
+        with self._lock:
+            self.pending += 1
+            self.submitted += 1
+        try:
+            pool.submit(self._run_queued, func, kwargs, queued_at, app)
+        except RuntimeError:
+            # pool already shut down (interpreter exiting)
+            self._done_queued()
+            self._run_waiting(func, kwargs, queued_at, app)
+
+    def _run_waiting(self, func, kwargs, queued_at, app):
+        # on a thread of its own, while the caller waits: the caller is still
+        # inside its commit, so its session can neither run the side effect's
+        # queries nor be removed when the side effect's app context ends
+        thread = threading.Thread(target=self._run, args=(func, kwargs, queued_at, app),
+                                  name='post-commit-overflow')
+        thread.start()
+        thread.join()
+
+    def _run_queued(self, func, kwargs, queued_at, app):
+        try:
+            self._run(func, kwargs, queued_at, app)
+        finally:
+            self._done_queued()
+
+    def _done_queued(self):
+        self._slots.release()
+        with self._lock:
+            self.pending -= 1
+            if not self.pending:
+                self._idle.notify_all()
+
+    def _run(self, func, kwargs, queued_at, app, inline=False):
+        started = time.perf_counter()
+        failed = False
+        try:
+            if inline:
+                # still inside the committing code's app context; pushing
+                # another would remove its session on the way out
+                func(**kwargs)
+            else:
+                with app.app_context():
+                    func(**kwargs)
+        except Exception:
+            failed = True
+            app.logger.exception('post-commit hook %s failed', func.__name__)
+        finished = time.perf_counter()
+        with self._lock:
+            waited = started - queued_at
+            self.wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+            self.run_seconds += finished - started
+            if failed:
+                self.failed += 1
+            else:
+                self.completed += 1
+
+    def stats(self):
+        with self._lock:
+            done = self.completed + self.failed
+            return {
+                'queue_depth': self.pending,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'inline': self.inline,
+                'mean_wait_seconds': self.wait_seconds / done if done else 0.0,
+                'max_wait_seconds': self.max_wait_seconds,
+                'mean_run_seconds': self.run_seconds / done if done else 0.0,
+            }
+
+    def drain(self, timeout=None):
+        # block until every queued side effect has run; False on timeout
+        deadline = time.monotonic() + (self.drain_timeout if timeout is None else timeout)
+        with self._idle:
+            while self.pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def shutdown(self):
+        if self._pool is None:
+            return
+        if not self.drain():
+            self.app.logger.warning('post-commit: %d side effects still queued at shutdown', self.pending)
+        self._pool.shutdown(wait=False)
+        self._pool = None
@@ -0,0 +1,99 @@
+import functools
+import os
+import sys
+
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from query_stats import fingerprint
+
+_fingerprint = functools.lru_cache(maxsize=1024)(fingerprint)
+
+
+class QueryAuditError(Exception):
+    pass
+
+
+def query_budget(statements):
+    # declares the most statements one request to the view may run; put it
+    # below the @bp.route decorator
+    def decorator(f):
+        f.query_budget = statements
+        return f
+    return decorator
+
+
+def _call_site(root):
+    # the innermost frame of our own code, i.e. the line that ran the query
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(root) and 'site-packages' not in filename and filename != __file__:
+            return f'{os.path.relpath(filename, root)}:{frame.f_lineno} in {frame.f_code.co_name}'
+        frame = frame.f_back
+    return None
+
+
+class QueryAudit:
+    # Development/test aid that counts the statements each request runs.
+    #
+    # A statement fingerprint (see query_stats) executed more than
+    # QUERY_REPEAT_LIMIT times in one request is reported once, with the line
+    # that ran it: the telltale of an N+1 loop. A view declaring
+    # @query_budget(n) is reported when a request to it runs more than n
+    # statements. QUERY_AUDIT_ACTION 'warn' logs the report, 'raise' raises
+    # QueryAuditError (which the test client passes on with TESTING set).
+    # Responses carry the count in an X-Query-Count header.
+    #
+    # Statements run outside the request thread (the async detail views'
+    # executor, post-commit jobs) are not counted.
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_AUDIT', False)
+        app.config.setdefault('QUERY_REPEAT_LIMIT', 5)
+        app.config.setdefault('QUERY_AUDIT_ACTION', 'warn')
+        self.app = app
+        app.extensions['query_audit'] = self
+        if not app.config['QUERY_AUDIT']:
+            return
+        if app.config['QUERY_AUDIT_ACTION'] not in ('warn', 'raise'):
+            raise ValueError('QUERY_AUDIT_ACTION must be warn or raise')
+        app.after_request(self._end_request)
+        # the Engine listener serves every app in the process: registered
+        # once, and it skips the apps that have the audit off
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+
+    def _report(self, message, **details):
+        if current_app.config['QUERY_AUDIT_ACTION'] == 'raise':
+            raise QueryAuditError(message)
+        current_app.logger.warning(message, extra=details)
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if not has_request_context() or not current_app.config['QUERY_AUDIT']:
+            return
+        counts = g.get('query_counts')
+        if counts is None:
+            counts = g.query_counts = {}
+        fp = _fingerprint(statement)
+        count = counts[fp] = counts.get(fp, 0) + 1
+        limit = current_app.config['QUERY_REPEAT_LIMIT']
+        if count == limit + 1:
+            call_site = _call_site(current_app.root_path)
+            self._report(f'{request.endpoint}: statement ran more than {limit} times in one request '
+                         f'at {call_site}: {fp}', fingerprint=fp, call_site=call_site)
+
+    def _end_request(self, response):
+        total = sum(g.get('query_counts', {}).values())
+        response.headers['X-Query-Count'] = str(total)
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and total > budget:
+            self._report(f'{request.endpoint}: {total} statements, over its budget of {budget}',
+                         statements=total, budget=budget)
+        return response
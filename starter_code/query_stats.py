@@ -0,0 +1,263 @@
+import math
+import re
+import threading
+import time
+import weakref
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# literals and bind parameters are replaced by ?, so statements that differ
+# only in their values share a fingerprint
+_STRING_RE = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_RE = re.compile(r'(?<![\w."])-?\d+(?:\.\d+)?(?![\w"])')
+_PARAM_RE = re.compile(r'%\(\w+\)s|%s|\?|(?<![:\w]):\w+')
+# IN (?, ?, ?) and multi-row VALUES (...), (...) collapse to a single entry
+_IN_LIST_RE = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_VALUES_RE = re.compile(r'(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+', re.IGNORECASE)
+_SPACE_RE = re.compile(r'\s+')
+
+# latencies are counted in geometric buckets (each 20% wider than the last,
+# from 10 microseconds up), so percentiles are exact to within a bucket and
+# recording one costs a dict increment
+_BUCKET_BASE = 1e-5
+_BUCKET_RATIO = 1.2
+_LOG_RATIO = math.log(_BUCKET_RATIO)
+
+OTHER = '<other>'
+SORT_KEYS = ('total_ms', 'mean_ms', 'count', 'p95_ms', 'p99_ms', 'max_ms')
+
+
+def fingerprint(statement):
+    fp = _STRING_RE.sub('?', statement)
+    fp = _NUMBER_RE.sub('?', fp)
+    fp = _PARAM_RE.sub('?', fp)
+    fp = _IN_LIST_RE.sub('(?, ...)', fp)
+    fp = _VALUES_RE.sub(r'\1, ...', fp)
+    return _SPACE_RE.sub(' ', fp).strip()
+
+
+def _bucket(seconds):
+    if seconds <= _BUCKET_BASE:
+        return 0
+    return math.ceil(math.log(seconds / _BUCKET_BASE) / _LOG_RATIO)
+
+
+def _merge(into, shard, limit=None):
+    # adds shard's entries to into; past limit fingerprints, new ones count
+    # as '<other>'
+    for fp, (count, total, maximum, buckets) in shard.copy().items():
+        entry = into.get(fp)
+        if entry is None and limit is not None and len(into) >= limit:
+            fp = OTHER
+            entry = into.get(fp)
+        if entry is None:
+            into[fp] = [count, total, maximum, buckets.copy()]
+            continue
+        entry[0] += count
+        entry[1] += total
+        entry[2] = max(entry[2], maximum)
+        for bucket, n in buckets.copy().items():
+            entry[3][bucket] = entry[3].get(bucket, 0) + n
+
+
+def _percentile(buckets, count, q, maximum):
+    # upper bound of the bucket holding the q-th quantile, capped at the max
+    rank = q * count
+    seen = 0
+    for index in sorted(buckets):
+        seen += buckets[index]
+        if seen >= rank:
+            return min(_BUCKET_BASE * _BUCKET_RATIO ** index, maximum)
+    return maximum
+
+
+class QueryStats:
+    # Aggregates the time spent in every statement the engine executes by
+    # fingerprint: count, total, mean, max and p95/p99.
+    #
+    # Each thread records into its own dict, so the hot path takes no lock;
+    # report() merges the per-thread dicts. The dicts are registered by thread
+    # ident, and those of finished threads are folded into a single one when
+    # another thread starts recording or a report is made, so threads coming
+    # and going (a threaded server, pool workers) don't pile them up. At most
+    # QUERY_STATS_MAX_FINGERPRINTS distinct fingerprints are kept per thread,
+    # the rest count as '<other>'.
+    # Times cover cursor.execute() only, not fetching from a server-side
+    # cursor (the streamed exports).
+    #
+    # Every QUERY_STATS_LOG_INTERVAL seconds (checked as statements run) the
+    # top QUERY_STATS_LOG_TOP fingerprints of the interval are logged, so the
+    # logs of all worker processes can be summed up into a fleet-wide view.
+
+    def __init__(self, app=None):
+        self._local = threading.local()
+        # {thread ident: (weakref to the thread, shard)}
+        self._shards = {}
+        self._retired = {}
+        self._lock = threading.Lock()
+        self._fingerprints = {}
+        self._last_dump = {}
+        self._next_dump = None
+        self.started = time.time()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('QUERY_STATS_ENABLED', True)
+        app.config.setdefault('QUERY_STATS_MAX_FINGERPRINTS', 500)
+        app.config.setdefault('QUERY_STATS_LOG_INTERVAL', 300)
+        app.config.setdefault('QUERY_STATS_LOG_TOP', 10)
+        self.app = app
+        self.max_fingerprints = app.config['QUERY_STATS_MAX_FINGERPRINTS']
+        self.log_interval = app.config['QUERY_STATS_LOG_INTERVAL']
+        self.log_top = app.config['QUERY_STATS_LOG_TOP']
+        app.extensions['query_stats'] = self
+        if not app.config['QUERY_STATS_ENABLED']:
+            return
+        # one set of listeners however many apps are created
+        if event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            return
+        event.listen(Engine, 'before_cursor_execute', self._before_execute)
+        event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = {}
+            thread = threading.current_thread()
+            with self._lock:
+                self._retire_finished()
+                self._shards[thread.ident] = (weakref.ref(thread), shard)
+        return shard
+
+    def _retire_finished(self):
+        # called with the lock held. A finished thread no longer writes to its
+        # shard, and its ident may already belong to a new thread.
+        for ident, (thread, shard) in list(self._shards.items()):
+            thread = thread()
+            if thread is None or not thread.is_alive():
+                del self._shards[ident]
+                _merge(self._retired, shard, self.max_fingerprints)
+
+    def _fingerprint(self, statement):
+        fp = self._fingerprints.get(statement)
+        if fp is None:
+            if len(self._fingerprints) >= 4 * self.max_fingerprints:
+                self._fingerprints.clear()
+            fp = self._fingerprints[statement] = fingerprint(statement)
+        return fp
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        # kept on the execution context, which is dropped with a failed statement
+        context._query_stats_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_query_stats_started', None)
+        if started is None:
+            return
+        elapsed = time.perf_counter() - started
+        self.record(statement, elapsed)
+        if self.log_interval:
+            now = time.monotonic()
+            if self._next_dump is None:
+                self._next_dump = now + self.log_interval
+            elif now >= self._next_dump:
+                self._dump(now)
+
+    def record(self, statement, seconds):
+        shard = self._shard()
+        fp = self._fingerprint(statement)
+        entry = shard.get(fp)
+        if entry is None:
+            if len(shard) >= self.max_fingerprints:
+                fp = OTHER
+                entry = shard.get(fp)
+            if entry is None:
+                # [count, total seconds, max seconds, {bucket: count}]
+                entry = shard[fp] = [0, 0.0, 0.0, {}]
+        entry[0] += 1
+        entry[1] += seconds
+        if seconds > entry[2]:
+            entry[2] = seconds
+        bucket = _bucket(seconds)
+        entry[3][bucket] = entry[3].get(bucket, 0) + 1
+
+    def snapshot(self):
+        # {fingerprint: [count, total, max, buckets]} over all threads. Other
+        # threads keep recording meanwhile, so an entry may be a statement or
+        # two behind; never wrong by more.
+        merged = {}
+        with self._lock:
+            self._retire_finished()
+            shards = [shard for _, shard in self._shards.values()]
+            _merge(merged, self._retired)
+        for shard in shards:
+            _merge(merged, shard)
+        return merged
+
+    @staticmethod
+    def _rows(snapshot):
+        grand_total = sum(entry[1] for entry in snapshot.values()) or 1.0
+        rows = []
+        for fp, (count, total, maximum, buckets) in snapshot.items():
+            if not count:
+                continue
+            rows.append({
+                'fingerprint': fp,
+                'count': count,
+                'total_ms': round(total * 1000, 3),
+                'mean_ms': round(total / count * 1000, 3),
+                'p95_ms': round(_percentile(buckets, count, 0.95, maximum) * 1000, 3),
+                'p99_ms': round(_percentile(buckets, count, 0.99, maximum) * 1000, 3),
+                'max_ms': round(maximum * 1000, 3),
+                'share': round(total / grand_total, 4),
+            })
+        return rows
+
+    def report(self, limit=50, sort='total_ms'):
+        snapshot = self.snapshot()
+        rows = sorted(self._rows(snapshot), key=lambda row: row[sort], reverse=True)
+        return {
+            'since': self.started,
+            'fingerprints': len(snapshot),
+            'statements': sum(entry[0] for entry in snapshot.values()),
+            'total_ms': round(sum(entry[1] for entry in snapshot.values()) * 1000, 3),
+            'queries': rows[:limit],
+        }
+
+    def reset(self):
+        with self._lock:
+            shards = [shard for _, shard in self._shards.values()]
+            self._retired = {}
+            self._last_dump = {}
+        for shard in shards:
+            shard.clear()
+        self.started = time.time()
+
+    def _dump(self, now):
+        # logs what ran since the previous dump; one thread does it, the
+        # others carry on
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            if now < self._next_dump:
+                return
+            self._next_dump = now + self.log_interval
+            previous = self._last_dump
+        finally:
+            self._lock.release()
+        current = self.snapshot()
+        delta = {}
+        for fp, (count, total, maximum, buckets) in current.items():
+            before = previous.get(fp)
+            if before is None:
+                delta[fp] = [count, total, maximum, buckets]
+            elif count > before[0]:
+                delta[fp] = [count - before[0], total - before[1], maximum,
+                             {b: n - before[3].get(b, 0) for b, n in buckets.items() if n > before[3].get(b, 0)}]
+        self._last_dump = current
+        rows = sorted(self._rows(delta), key=lambda row: row['total_ms'], reverse=True)
+        self.app.logger.info('query stats: %d statements, %d fingerprints in the last %ds',
+                             sum(row['count'] for row in rows), len(rows), self.log_interval,
+                             extra={'query_stats': rows[:self.log_top]})
@@ -0,0 +1,137 @@
+import cProfile
+import hmac
+import io
+import json
+import os
+import pstats
+import re
+import time
+import uuid
+
+from flask import g, request
+
+_PROFILE_ID_RE = re.compile(r'^[0-9]{8}T[0-9]{12}-[0-9a-f]{8}$')
+
+SORT_KEYS = ('cumulative', 'tottime', 'ncalls')
+
+
+class RequestProfiler:
+    # Runs a single request under cProfile when it asks for it: an
+    # `X-Profile: 1` header next to a valid X-Admin-Token (the token of the
+    # /admin pages). Other requests pay for one header lookup.
+    #
+    # The profile is written to PROFILE_DIR as <id>.prof (pstats format, for
+    # snakeviz, gprof2dot or pstats) with a <id>.json sidecar describing the
+    # request; only the newest PROFILE_MAX_FILES are kept. The response
+    # carries the id in X-Profile-Id and /admin/profiles lists and serves
+    # them, also as a text report.
+    #
+    # cProfile sees the request thread only: the concurrent queries of the
+    # async detail views show up as waiting, so turn ASYNC_DETAIL_VIEWS off
+    # to see inside them.
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('PROFILE_DIR', os.path.join(app.instance_path, 'profiles'))
+        app.config.setdefault('PROFILE_MAX_FILES', 50)
+        self.app = app
+        self.directory = app.config['PROFILE_DIR']
+        self.max_files = app.config['PROFILE_MAX_FILES']
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        app.teardown_request(self._teardown_request)
+        app.extensions['request_profiler'] = self
+
+    def _requested(self):
+        if request.headers.get('X-Profile') != '1':
+            return False
+        token = self.app.config.get('ADMIN_TOKEN')
+        return bool(token) and hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token)
+
+    def _start_request(self):
+        if not self._requested():
+            return
+        now = time.time()
+        g.profile_id = f'{time.strftime("%Y%m%dT%H%M%S", time.gmtime(now))}{int(now % 1 * 1e6):06d}-{uuid.uuid4().hex[:8]}'
+        g.profile_started = time.perf_counter()
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+    def _end_request(self, response):
+        if 'profiler' in g:
+            response.headers['X-Profile-Id'] = g.profile_id
+        return response
+
+    def _teardown_request(self, exc):
+        # runs after the response is built, even when the view raised
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            return
+        profiler.disable()
+        elapsed = time.perf_counter() - g.profile_started
+        try:
+            self._save(g.profile_id, profiler, {
+                'id': g.profile_id,
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'request_id': g.get('request_id'),
+                'duration_ms': round(elapsed * 1000, 1),
+                'error': repr(exc) if exc is not None else None,
+                'created': time.time(),
+            })
+        except OSError:
+            self.app.logger.exception('profile %s could not be saved', g.profile_id)
+
+    def _save(self, profile_id, profiler, meta):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, profile_id)
+        profiler.dump_stats(path + '.prof')
+        with open(path + '.json', 'w') as fp:
+            json.dump(meta, fp)
+        self._evict()
+
+    def _evict(self):
+        # ids start with their UTC time, so sorting by name is oldest first
+        ids = sorted(name[:-5] for name in os.listdir(self.directory) if name.endswith('.prof'))
+        for profile_id in ids[:max(len(ids) - self.max_files, 0)]:
+            for suffix in ('.prof', '.json'):
+                try:
+                    os.remove(os.path.join(self.directory, profile_id + suffix))
+                except FileNotFoundError:
+                    pass
+
+    def path(self, profile_id):
+        # the .prof file of a stored profile, or None
+        if not _PROFILE_ID_RE.match(profile_id):
+            return None
+        path = os.path.join(self.directory, profile_id + '.prof')
+        return path if os.path.exists(path) else None
+
+    def list(self):
+        # newest first
+        if not os.path.isdir(self.directory):
+            return []
+        profiles = []
+        for name in sorted(os.listdir(self.directory), reverse=True):
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as fp:
+                    profiles.append(json.load(fp))
+            except (FileNotFoundError, ValueError):
+                continue
+        return profiles
+
+    def report(self, profile_id, sort='cumulative', limit=60):
+        # pstats' text table of the top functions
+        path = self.path(profile_id)
+        if path is None:
+            return None
+        out = io.StringIO()
+        stats = pstats.Stats(path, stream=out)
+        stats.strip_dirs().sort_stats(sort).print_stats(limit)
+        return out.getvalue()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+# /api routes vs the HTML pages showing the same data.
+#
+#   python scripts/bench_api.py [--requests 200] [--database sqlite://]
+#
+# Seeds a catalog (the one check_query_budgets.py uses) into an empty
+# database, in-memory SQLite by default, and times each pair of routes
+# through the test client with the data cache off, so every request queries
+# the database: the API projects rows straight to JSON, the pages load models
+# and render a template.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAIRS = (
+    ('/venues', '/api/venues?fields=name,city,state&limit=500'),
+    ('/artists', '/api/artists?fields=name&limit=500'),
+    ('/shows', '/api/shows?fields=venue_id,venue_name,artist_id,artist_name,start_time&limit=500'),
+    ('/venues/1', '/api/venues/1'),
+    ('/artists/1', '/api/artists/1'),
+)
+
+
+def timings(client, url, requests):
+    response = client.get(url)
+    assert response.status_code == 200, (url, response.status_code)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(url)
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite://', help='An empty database to seed.')
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--venues', type=int, default=200)
+    parser.add_argument('--artists', type=int, default=200)
+    parser.add_argument('--shows', type=int, default=500)
+    args = parser.parse_args()
+
+    from app import create_app
+    from check_query_budgets import seed, settings
+    from extensions import db
+
+    config = settings(args.database)
+    config.QUERY_AUDIT = False
+    app = create_app(config)
+    with app.app_context():
+        seed(db, args.venues, args.artists, args.shows)
+
+    print(f'{args.requests} requests each; median and p95 in ms')
+    print(f'{"page":<12} {"html p50":>9} {"html p95":>9}  {"api":<40} {"api p50":>8} {"api p95":>8} {"speedup":>8}')
+    client = app.test_client()
+    for page, api in PAIRS:
+        html = timings(client, page, args.requests)
+        data = timings(client, api, args.requests)
+        print(f'{page:<12} {html[0]:9.2f} {html[1]:9.2f}  {api.split("?")[0]:<40} {data[0]:8.2f} {data[1]:8.2f}'
+              f' {html[0] / data[0]:7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
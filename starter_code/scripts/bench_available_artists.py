@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# /artists/available at scale.
+#
+#   python scripts/bench_available_artists.py [--artists 100000] [--shows 1000000] [--database sqlite://]
+#
+# Seeds an empty database (in-memory SQLite unless --database names a
+# scratch one) with --artists artists, a third of them seeking a venue, and
+# --shows shows spread over a year, then times the availability search for a
+# day and a week, alone and narrowed by state, city and genre, and prints the
+# plan the database chose for the first one. With --drop-indexes every search
+# is timed again without the supporting indexes (shows on artist_id,
+# start_time and the seeking artists' state, city); that is a scan of shows
+# per artist, so keep the catalog small for it.
+
+import argparse
+from datetime import datetime, timedelta
+import os
+import random
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from check_query_budgets import CITIES, settings  # noqa: E402
+
+GENRES = ('Jazz', 'Folk', 'Rock n Roll', 'Classical', 'Hip-Hop', 'Blues', 'Country', 'Electronic')
+
+INDEXES = ('ix_shows_artist_id_start_time', 'ix_Artist_seeking_state_city')
+
+BATCH = 10000
+
+
+def seed(db, artists, venues, shows, start):
+    from models import Artist, Show, Venue
+    db.create_all()
+    rng = random.Random(1)
+
+    def batches(rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    db.session.execute(Venue.__table__.insert(), [{
+        'name': f'Venue {i}', 'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1],
+    } for i in range(1, venues + 1)])
+    for batch in batches({
+        'name': f'Artist {i}', 'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1],
+        'genres': '{' + ','.join(f'"{g}"' for g in rng.sample(GENRES, 2)) + '}', 'seeking_venue': i % 3 == 0,
+    } for i in range(1, artists + 1)):
+        db.session.execute(Artist.__table__.insert(), batch)
+    for batch in batches({
+        'artist_id': rng.randint(1, artists), 'venue_id': rng.randint(1, venues),
+        'start_time': start + timedelta(days=rng.randrange(365), hours=rng.choice((19, 20, 21))),
+    } for _ in range(shows)):
+        db.session.execute(Show.__table__.insert(), batch)
+    db.session.commit()
+
+
+def searches(day):
+    week = day + timedelta(days=7)
+    city, state = CITIES[0]
+    return (
+        ('one day', {'date': day.date().isoformat()}),
+        ('one week', {'start': day.date().isoformat(), 'end': week.date().isoformat()}),
+        ('day + state', {'date': day.date().isoformat(), 'state': state}),
+        ('day + city', {'date': day.date().isoformat(), 'state': state, 'city': city}),
+        ('day + genre', {'date': day.date().isoformat(), 'genre': 'Jazz'}),
+        ('week, page 20', {'start': day.date().isoformat(), 'end': week.date().isoformat(), 'page': 20}),
+    )
+
+
+def timings(client, params, requests):
+    response = client.get('/artists/available', query_string=params)
+    assert response.status_code == 200, (params, response.status_code)
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get('/artists/available', query_string=params)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def explain(db, day, title):
+    from sqlalchemy import exists, select
+    from models import Artist, Show
+    booked = select(Show.id).where(Show.artist_id == Artist.id, Show.start_time >= day,
+                                   Show.start_time < day + timedelta(days=1))
+    stmt = select(Artist.id, Artist.name).where(Artist.seeking_venue.is_(True), ~exists(booked)) \
+        .order_by(Artist.name, Artist.id).limit(25)
+    sql = str(stmt.compile(db.engine, compile_kwargs={'literal_binds': True}))
+    prefix = 'EXPLAIN QUERY PLAN' if db.engine.dialect.name == 'sqlite' else 'EXPLAIN'
+    print(title + ':')
+    # the comment keeps sqlite3's statement cache from returning the old plan
+    for row in db.session.execute(db.text(f'{prefix} /* {title} */ {sql}')):
+        print('   ', row[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite://', help='An empty database to seed.')
+    parser.add_argument('--artists', type=int, default=100000)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--drop-indexes', action='store_true', help='Time the searches without the indexes too.')
+    args = parser.parse_args()
+
+    from app import create_app
+    from extensions import db
+
+    config = settings(args.database)
+    config.QUERY_AUDIT = False
+    config.SLOW_REQUEST_MS = 0
+    app = create_app(config)
+    start = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    day = start + timedelta(days=180)
+
+    with app.app_context():
+        started = time.perf_counter()
+        seed(db, args.artists, args.venues, args.shows, start)
+        print(f'seeded {args.artists} artists and {args.shows} shows in {time.perf_counter() - started:.1f} s')
+        explain(db, day, 'plan for one day')
+
+        client = app.test_client()
+        results = [(label, timings(client, params, args.requests)) for label, params in searches(day)]
+        unindexed = None
+        if args.drop_indexes:
+            db.session.remove()
+            for name in INDEXES:
+                db.session.execute(db.text(f'DROP INDEX "{name}"'))
+            db.session.commit()
+            explain(db, day, 'plan for one day without the indexes')
+            unindexed = [timings(client, params, args.requests) for _, params in searches(day)]
+
+    print(f'{args.requests} requests each, median and max in ms')
+    print(f'{"":<16} {"p50":>8} {"max":>8}' + (f' {"unindexed p50":>14} {"max":>8}' if unindexed else ''))
+    for i, (label, indexed) in enumerate(results):
+        print(f'{label:<16} {indexed[0]:8.1f} {indexed[1]:8.1f}'
+              + (f' {unindexed[i][0]:14.1f} {unindexed[i][1]:8.1f}' if unindexed else ''))
+
+
+if __name__ == '__main__':
+    main()
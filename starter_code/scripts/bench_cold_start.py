@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# First-request latency of a fresh worker, with and without compiled
+# templates on disk.
+#
+#   python scripts/bench_cold_start.py [--runs 7]
+#
+# Every run starts a new Python process. It builds the app on a seeded
+# in-memory database and times the first GET of each route, which is when
+# the route's templates are loaded. This is done three ways:
+#
+#   no cache  TEMPLATE_BYTECODE_CACHE_DIR empty, every template is compiled
+#   cold      an empty cache directory, compiled and written on first use
+#   warm      a directory `flask compile-templates` already filled
+#
+# The script prints the median over the runs for each route. The routes are
+# requested in the order listed, so the shared layout is only loaded by the
+# first one.
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ('/', '/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/venues/create', '/artists/1/edit')
+
+MODES = ('no cache', 'cold', 'warm')
+
+
+def app_for(cache_dir):
+    from app import create_app
+    from check_query_budgets import settings
+    config = settings('sqlite://')
+    config.QUERY_AUDIT = False
+    config.SLOW_REQUEST_MS = 0
+    config.TEMPLATE_BYTECODE_CACHE_DIR = cache_dir
+    return create_app(config)
+
+
+def child(cache_dir, fill):
+    # runs in the fresh process; prints {route: ms} as JSON
+    app = app_for(cache_dir)
+    from extensions import db, template_cache
+    with app.app_context():
+        if fill:
+            template_cache.compile_all()
+            return
+        from check_query_budgets import seed
+        seed(db, 10, 10, 20)
+    client = app.test_client()
+    timings = {}
+    for url in ROUTES:
+        started = time.perf_counter()
+        response = client.get(url)
+        timings[url] = (time.perf_counter() - started) * 1000
+        assert response.status_code == 200, (url, response.status_code)
+    print(json.dumps(timings))
+
+
+def run(cache_dir, fill=False):
+    command = [sys.executable, os.path.abspath(__file__), '--child', '--cache-dir', cache_dir]
+    if fill:
+        command.append('--fill')
+    out = subprocess.run(command, check=True, stdout=subprocess.PIPE, cwd=ROOT, text=True).stdout
+    return None if fill else json.loads(out.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--fill', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--cache-dir', default='', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child(args.cache_dir, args.fill)
+        return
+
+    samples = {mode: {url: [] for url in ROUTES} for mode in MODES}
+    for _ in range(args.runs):
+        with tempfile.TemporaryDirectory() as cold, tempfile.TemporaryDirectory() as warm:
+            run(warm, fill=True)
+            for mode, cache_dir in zip(MODES, ('', cold, warm)):
+                for url, ms in run(cache_dir).items():
+                    samples[mode][url].append(ms)
+
+    print(f'first GET per route in a fresh process, median of {args.runs} runs, ms')
+    print(f'{"route":<18}' + ''.join(f' {mode:>9}' for mode in MODES) + f' {"saved":>7}')
+    totals = dict.fromkeys(MODES, 0.0)
+    for url in ROUTES:
+        medians = {mode: statistics.median(samples[mode][url]) for mode in MODES}
+        for mode in MODES:
+            totals[mode] += medians[mode]
+        print(f'{url:<18}' + ''.join(f' {medians[mode]:9.1f}' for mode in MODES)
+              + f' {medians["no cache"] - medians["warm"]:7.1f}')
+    print(f'{"all routes":<18}' + ''.join(f' {totals[mode]:9.1f}' for mode in MODES)
+          + f' {totals["no cache"] - totals["warm"]:7.1f}')
+
+
+if __name__ == '__main__':
+    main()
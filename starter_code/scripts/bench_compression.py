@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# Response compression and HTML minification, on and off.
+#
+#   python scripts/bench_compression.py [--requests 100] [--database sqlite://]
+#
+# Seeds a catalog (the one check_query_budgets.py uses) and requests the main
+# pages through the test client four times over: as they are, with
+# MINIFY_HTML, with CompressionMiddleware (gzip at COMPRESS_LEVEL) and with
+# both. For each route it prints the bytes sent and the median time per
+# request, so the bytes saved can be weighed against the CPU the middleware
+# adds. The test client has no network, so the times are server-side only;
+# on a real link the smaller body is also faster to deliver.
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+ROUTES = ('/', '/venues', '/artists', '/shows', '/venues/1', '/artists/1', '/api/shows?limit=500')
+
+VARIANTS = (
+    ('plain', {'COMPRESS_ENABLED': False, 'MINIFY_HTML': False}),
+    ('minified', {'COMPRESS_ENABLED': False, 'MINIFY_HTML': True}),
+    ('gzip', {'COMPRESS_ENABLED': True, 'MINIFY_HTML': False}),
+    ('minified+gzip', {'COMPRESS_ENABLED': True, 'MINIFY_HTML': True}),
+)
+
+
+def measure(client, url, requests):
+    # (bytes sent, median ms) for GET url, accepting gzip
+    headers = {'Accept-Encoding': 'gzip'}
+    response = client.get(url, headers=headers)
+    assert response.status_code == 200, (url, response.status_code)
+    size = len(response.get_data())
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        client.get(url, headers=headers)
+        samples.append((time.perf_counter() - started) * 1000)
+    return size, statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite://', help='An empty database to seed.')
+    parser.add_argument('--requests', type=int, default=100)
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--artists', type=int, default=40)
+    parser.add_argument('--shows', type=int, default=400)
+    args = parser.parse_args()
+
+    from app import create_app
+    from check_query_budgets import seed, settings
+    from extensions import db
+
+    results = {}
+    for label, options in VARIANTS:
+        config = settings(args.database)
+        config.QUERY_AUDIT = False
+        config.SLOW_REQUEST_MS = 0
+        vars(config).update(options)
+        app = create_app(config)
+        with app.app_context():
+            db.drop_all()
+            seed(db, args.venues, args.artists, args.shows)
+        client = app.test_client()
+        results[label] = [measure(client, url, args.requests) for url in ROUTES]
+
+    print(f'{args.requests} requests each; bytes sent and median ms')
+    print(f'{"route":<22}' + ''.join(f' {label:>15} {"ms":>6}' for label, _ in VARIANTS))
+    for i, url in enumerate(ROUTES):
+        plain = results['plain'][i][0]
+        cells = []
+        for label, _ in VARIANTS:
+            size, ms = results[label][i]
+            cells.append(f' {size:>7} ({size / plain:4.0%}) {ms:6.2f}')
+        print(f'{url.split("?")[0]:<22}' + ''.join(cells))
+
+
+if __name__ == '__main__':
+    main()
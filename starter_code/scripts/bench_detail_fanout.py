@@ -0,0 +1,124 @@
+#!/usr/bin/env python
+# Venue/artist page latency, one query after another vs concurrently.
+#
+#   python scripts/bench_detail_fanout.py [--latency 20] [--requests 50] [--database sqlite:///...]
+#
+# Seeds a catalog (the one check_query_budgets.py uses) into a scratch
+# SQLite file unless --database names another empty database, and adds
+# --latency ms of artificial delay to every statement, as a database across
+# the network would. It then times the reads behind a venue and an artist page
+# with fetch_all (the sync views) and fetch_all_concurrently (the
+# ASYNC_DETAIL_VIEWS ones): sequentially the page costs one delay per query,
+# concurrently about one in all. With asgiref installed the whole pages are
+# timed through both kinds of view as well.
+
+import argparse
+import asyncio
+from datetime import datetime
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from sqlalchemy.pool import NullPool
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def build_app(database, engine_options, async_views):
+    from app import create_app
+    from check_query_budgets import settings
+    config = settings(database)
+    config.SQLALCHEMY_ENGINE_OPTIONS = engine_options
+    config.QUERY_AUDIT = False
+    config.ASYNC_DETAIL_VIEWS = async_views
+    # every request has to reach the database
+    config.DATA_CACHE_TTL = 0
+    return create_app(config)
+
+
+def add_latency(seconds):
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    def delay(conn, cursor, statement, parameters, context, executemany):
+        time.sleep(seconds)
+    event.listen(Engine, 'before_cursor_execute', delay)
+
+
+def timings(run, requests):
+    run()
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        run()
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def report(label, sequential, concurrent):
+    print(f'{label:<22} {sequential[0]:9.1f} {sequential[1]:9.1f} {concurrent[0]:11.1f} {concurrent[1]:11.1f}'
+          f' {sequential[0] / concurrent[0]:7.1f}x')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', help='An empty database to seed (default: a temporary SQLite file).')
+    parser.add_argument('--latency', type=float, default=20, help='Delay added to every statement, in ms.')
+    parser.add_argument('--requests', type=int, default=50)
+    parser.add_argument('--shows', type=int, default=400)
+    args = parser.parse_args()
+
+    scratch = None
+    database, engine_options = args.database, {}
+    if database is None:
+        # a file, not :memory:, so the concurrent connections share the data;
+        # connected through creator, as Flask-SQLAlchemy 2.4 cannot rewrite
+        # SQLAlchemy 1.4's immutable sqlite file URLs
+        scratch = tempfile.TemporaryDirectory()
+        path = os.path.join(scratch.name, 'bench.db')
+        database = 'sqlite://'
+        engine_options = {'poolclass': NullPool, 'creator': lambda: sqlite3.connect(path, check_same_thread=False)}
+
+    from check_query_budgets import seed
+    from extensions import db
+    from views.artists import artist_detail_queries
+    from views.common import fetch_all, fetch_all_concurrently
+    from views.venues import venue_detail_queries
+
+    app = build_app(database, engine_options, async_views=False)
+    with app.app_context():
+        seed(db, 40, 40, args.shows)
+    add_latency(args.latency / 1000)
+
+    print(f'{args.latency:g} ms per statement, {args.requests} requests each; median and p95 in ms')
+    print(f'{"":<22} {"seq p50":>9} {"seq p95":>9} {"concur p50":>11} {"concur p95":>11} {"speedup":>8}')
+    with app.test_request_context():
+        for label, queries in (('venue page queries', venue_detail_queries),
+                               ('artist page queries', artist_detail_queries)):
+            report(label,
+                   timings(lambda: fetch_all(queries(1, datetime.now())), args.requests),
+                   timings(lambda: asyncio.run(fetch_all_concurrently(queries(1, datetime.now()))), args.requests))
+            db.session.remove()
+
+    try:
+        import asgiref
+    except ImportError:
+        print('asgiref is not installed: skipping the async views')
+    else:
+        sequential, concurrent = app.test_client(), build_app(database, engine_options, async_views=True).test_client()
+        for url in ('/venues/1', '/artists/1'):
+            report(f'GET {url}',
+                   timings(lambda: sequential.get(url), args.requests),
+                   timings(lambda: concurrent.get(url), args.requests))
+
+    if scratch is not None:
+        scratch.cleanup()
+
+
+if __name__ == '__main__':
+    main()
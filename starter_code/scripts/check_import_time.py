@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# Import-time regression check for create_app().
+#
+#   python scripts/check_import_time.py [--budget-ms BUDGET] [--runs 7]
+#
+# Starts a fresh interpreter under `-X importtime` several times, adds up the
+# cumulative time of the top-level imports behind `create_app()` and fails
+# when the median run is over budget (twice: an over-budget set of runs is
+# measured again, as a busy machine slows down a whole set), or when a module that is meant to be
+# loaded lazily (see LAZY_MODULES) was imported anyway. Exits non-zero on
+# failure, so it can run in CI next to the other checks.
+
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# loaded on first use only: migrations by `flask db`, Pillow by thumbnails
+# and `flask assets build`, dateutil by the views parsing dates
+LAZY_MODULES = ('alembic', 'flask_migrate', 'PIL', 'dateutil.parser', 'dateutil.relativedelta')
+
+# measured as this script does, median of seven runs, five times over: 1220-1370
+# ms (overall median 1271 ms) with create_app(), 1455-1607 ms for the app.py
+# that built everything at import. Nearly all of it is Flask, SQLAlchemy and
+# WTForms. The budget is the measured median plus ~10%, below what the eager
+# imports cost. Override with --budget-ms or IMPORT_TIME_BUDGET_MS on slower
+# machines.
+DEFAULT_BUDGET_MS = 1400
+
+SNIPPET = 'from app import create_app; create_app()'
+
+_LINE_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def measure():
+    # one fresh interpreter; returns ({top-level module: cumulative µs},
+    # {module imported directly by a top-level one: cumulative µs}, set of
+    # every module imported)
+    env = dict(os.environ)
+    # outside the flask command line, as in a gunicorn worker
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', SNIPPET],
+                            cwd=ROOT, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            universal_newlines=True)
+    if result.returncode:
+        sys.exit(result.stderr)
+    top_level = {}
+    second_level = {}
+    imported = set()
+    for line in result.stderr.splitlines():
+        match = _LINE_RE.match(line)
+        if not match:
+            continue
+        _, cumulative, indent, name = match.groups()
+        imported.add(name)
+        # -X importtime indents nested imports by two spaces per level
+        if len(indent) == 1:
+            top_level[name] = int(cumulative)
+        elif len(indent) == 3:
+            second_level[name] = int(cumulative)
+    return top_level, second_level, imported
+
+
+def median_run(runs):
+    # (median total ms, sorted totals, second level imports of the median
+    # run, every module imported in any run); the median, so one lucky or
+    # one disturbed run does not decide
+    runs = sorted((measure() for _ in range(runs)), key=lambda run: sum(run[0].values()))
+    totals = [sum(run[0].values()) / 1000 for run in runs]
+    return statistics.median(totals), totals, runs[(len(runs) - 1) // 2][1], set.union(*(run[2] for run in runs))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--budget-ms', type=float,
+                        default=float(os.environ.get('IMPORT_TIME_BUDGET_MS', DEFAULT_BUDGET_MS)))
+    parser.add_argument('--runs', type=int, default=7)
+    parser.add_argument('--top', type=int, default=10, help='Slowest imports to list.')
+    args = parser.parse_args()
+
+    total_ms, totals, second_level, imported = median_run(args.runs)
+    if total_ms > args.budget_ms:
+        print(f'{total_ms:8.1f} ms  total is over budget, measuring again')
+        again = median_run(args.runs)
+        imported |= again[3]
+        if again[0] < total_ms:
+            total_ms, totals, second_level = again[:3]
+
+    # what app (and anything create_app() imports later) pulls in directly
+    for name, cumulative in sorted(second_level.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'{cumulative / 1000:8.1f} ms  {name}')
+    print(f'{total_ms:8.1f} ms  total (median of {args.runs}, {totals[0]:.0f}-{totals[-1]:.0f} ms;'
+          f' budget {args.budget_ms:.0f} ms)')
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in imported]
+    if eager:
+        print(f'FAIL: imported by create_app() but meant to be lazy: {", ".join(eager)}')
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f'FAIL: import time {total_ms:.1f} ms is over the {args.budget_ms:.0f} ms budget')
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
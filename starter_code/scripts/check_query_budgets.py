@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# Statement budget check for the views.
+#
+#   python scripts/check_query_budgets.py [--database sqlite://] [--venues 40] [--artists 40] [--shows 400]
+#
+# Builds the app on an empty database (in-memory SQLite unless --database
+# names a scratch one), seeds a catalog of venues, artists and shows and
+# requests every route whose view declares @query_budget, with the query
+# audit set to raise. A request fails when it runs more statements than its
+# budget, or one statement more than QUERY_REPEAT_LIMIT times (an N+1 loop,
+# reported with the line running it). The catalog is large enough that any
+# per-row query shows up. Exits non-zero on failure, so it can run in CI
+# next to the other checks.
+
+import argparse
+from datetime import datetime, timedelta
+import itertools
+import os
+import sys
+import types
+
+from flask import url_for
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# values for the URL variables of the routes checked; a route is requested
+# once per combination
+URL_VALUES = {
+    'venue_id': (1,),
+    'artist_id': (1,),
+    'item_id': (1,),
+    'resource': ('venues', 'artists', 'shows'),
+}
+
+# posted to budgeted views that only accept POST (the searches)
+FORM_DATA = {'search_term': 'a'}
+
+CITIES = (('San Francisco', 'CA'), ('New York', 'NY'), ('Austin', 'TX'), ('Seattle', 'WA'))
+
+
+def settings(database):
+    import config
+    values = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    values.update(
+        SQLALCHEMY_DATABASE_URI=database,
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        TESTING=True,
+        DEBUG=False,
+        WTF_CSRF_ENABLED=False,
+        LOG_FILE='',
+        QUERY_STATS_LOG_INTERVAL=0,
+        QUERY_AUDIT=True,
+        QUERY_AUDIT_ACTION='raise',
+        # the concurrent detail queries run off the request thread, uncounted
+        ASYNC_DETAIL_VIEWS=False,
+        # measure the views' queries, not the cache in front of them
+        DATA_CACHE_TTL=0,
+    )
+    return types.SimpleNamespace(**values)
+
+
+def seed(db, venues, artists, shows):
+    from models import Artist, Show, Venue
+    db.create_all()
+    db.session.execute(Venue.__table__.insert(), [{
+        'name': f'Venue {i}', 'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1],
+        'address': f'{i} Main St', 'phone': '123-123-1234', 'genres': '{Jazz,Rock n Roll}',
+        'image_link': f'https://example.com/venue/{i}.jpg', 'seeking_talent': i % 2 == 0,
+    } for i in range(1, venues + 1)])
+    db.session.execute(Artist.__table__.insert(), [{
+        'name': f'Artist {i}', 'city': CITIES[i % len(CITIES)][0], 'state': CITIES[i % len(CITIES)][1],
+        'phone': '123-123-1234', 'genres': '{Jazz,Folk}',
+        'image_link': f'https://example.com/artist/{i}.jpg', 'seeking_venue': i % 3 == 0,
+    } for i in range(1, artists + 1)])
+    # half of them past, half upcoming, spread over every venue and artist
+    now = datetime.now()
+    db.session.execute(Show.__table__.insert(), [{
+        'venue_id': i % venues + 1, 'artist_id': i % artists + 1,
+        'start_time': now + timedelta(days=i - shows // 2, hours=20 - now.hour),
+    } for i in range(shows)])
+    db.session.commit()
+
+
+def budgeted_requests(app):
+    # (method, url, budget) for every route whose view declares a budget
+    for rule in sorted(app.url_map.iter_rules(), key=lambda rule: rule.rule):
+        budget = getattr(app.view_functions[rule.endpoint], 'query_budget', None)
+        if budget is None:
+            continue
+        method = 'GET' if 'GET' in rule.methods else 'POST'
+        names = sorted(rule.arguments)
+        for values in itertools.product(*(URL_VALUES[name] for name in names)):
+            with app.test_request_context():
+                url = url_for(rule.endpoint, **dict(zip(names, values)))
+            yield method, url, budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--database', default='sqlite://', help='An empty database to seed.')
+    parser.add_argument('--venues', type=int, default=40)
+    parser.add_argument('--artists', type=int, default=40)
+    parser.add_argument('--shows', type=int, default=400)
+    args = parser.parse_args()
+
+    from app import create_app
+    from extensions import db
+    from query_audit import QueryAuditError
+    app = create_app(settings(args.database))
+    with app.app_context():
+        seed(db, args.venues, args.artists, args.shows)
+
+    client = app.test_client()
+    failed = 0
+    for method, url, budget in budgeted_requests(app):
+        try:
+            response = client.open(url, method=method, data=FORM_DATA if method == 'POST' else None)
+        except QueryAuditError as e:
+            print(f'FAIL {method} {url}: {e}')
+            failed += 1
+            continue
+        count = int(response.headers.get('X-Query-Count', 0))
+        if response.status_code >= 400:
+            print(f'FAIL {method} {url}: status {response.status_code}')
+            failed += 1
+            continue
+        print(f'{count:4d} / {budget:<4d} {method} {url}')
+    if failed:
+        print(f'FAIL: {failed} request(s) over budget or broken')
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
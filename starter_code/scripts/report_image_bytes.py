@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+# Bytes of the home page splash image per viewport, before and after the
+# srcset variants.
+#
+#   python scripts/report_image_bytes.py [--viewport 1440x2 ...]
+#
+# Renders / twice through the test client: once with the manifest of the last
+# `flask assets build` (after) and once without one, which is the plain <img
+# src> the page had before (before). For each viewport width and device pixel
+# ratio it picks the srcset candidate the way browsers do: the slot width comes
+# from the first matching `sizes` entry, and the smallest candidate at least
+# slot * DPR pixels wide is loaded, or the widest when none is. The bytes are
+# those the app serves for that URL.
+#
+# The image sits in a column hidden below 992px (hidden-sm hidden-xs), but the
+# browser fetches it all the same, so narrow viewports are listed too.
+
+import argparse
+import os
+import re
+import sys
+from html.parser import HTMLParser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+IMAGE_ID = 'front-splash'
+
+# (CSS width, device pixel ratio): phones, a tablet, laptops and desktops
+VIEWPORTS = ((360, 3), (414, 2), (768, 2), (1024, 2), (1280, 1), (1366, 1), (1440, 2), (1920, 1), (2560, 2))
+
+_MEDIA_RE = re.compile(r'^\((min|max)-width:\s*(\d+)px\)\s+(\d+)px$')
+
+
+class _ImageFinder(HTMLParser):
+
+    def __init__(self):
+        super().__init__()
+        self.attrs = None
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == 'img' and attrs.get('id') == IMAGE_ID:
+            self.attrs = attrs
+
+
+def find_image(page):
+    finder = _ImageFinder()
+    finder.feed(page)
+    if finder.attrs is None:
+        raise SystemExit(f'no <img id="{IMAGE_ID}"> on the page')
+    return finder.attrs
+
+
+def slot_width(sizes, viewport):
+    # the length of the first entry whose media condition matches
+    for entry in (part.strip() for part in sizes.split(',')):
+        match = _MEDIA_RE.match(entry)
+        if not match:
+            return int(entry.rstrip('px'))
+        kind, limit, length = match.group(1), int(match.group(2)), int(match.group(3))
+        if (viewport >= limit) if kind == 'min' else (viewport <= limit):
+            return length
+    return viewport
+
+
+def pick(img, viewport, dpr):
+    # (url, rendered width) the browser loads for this viewport
+    if not img.get('srcset'):
+        return img['src'], None
+    candidates = sorted((int(width.rstrip('w')), url) for url, width in
+                        (candidate.split() for candidate in img['srcset'].split(',')))
+    slot = slot_width(img.get('sizes', '100vw'), viewport)
+    for width, url in candidates:
+        if width >= slot * dpr:
+            return url, slot
+    return candidates[-1][1], slot
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--viewport', action='append', metavar='WIDTHxDPR',
+                        help='A viewport to report, e.g. 1440x2; repeat for more.')
+    args = parser.parse_args()
+    viewports = VIEWPORTS
+    if args.viewport:
+        viewports = [(int(width), float(dpr)) for width, dpr in (v.split('x') for v in args.viewport)]
+
+    from app import create_app
+    from check_query_budgets import seed, settings
+    from extensions import assets, db
+
+    config = settings('sqlite://')
+    config.QUERY_AUDIT = False
+    app = create_app(config)
+    with app.app_context():
+        seed(db, 10, 10, 20)
+    if not assets.manifest:
+        raise SystemExit('no asset manifest, run `flask assets build` first')
+    client = app.test_client()
+
+    sizes = {}
+
+    def served(url):
+        if url not in sizes:
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            sizes[url] = len(response.get_data())
+        return sizes[url]
+
+    after = find_image(client.get('/').get_data(as_text=True))
+    built, assets.manifest = assets.manifest, {}
+    before = find_image(client.get('/').get_data(as_text=True))
+    assets.manifest = built
+
+    print(f'sizes="{after.get("sizes")}"')
+    print(f'{"viewport":<10} {"slot":>5} {"before":>9} {"after":>9} {"saved":>6}  loads')
+    total_before = total_after = 0
+    for viewport, dpr in viewports:
+        before_url, _ = pick(before, viewport, dpr)
+        after_url, slot = pick(after, viewport, dpr)
+        before_bytes, after_bytes = served(before_url), served(after_url)
+        total_before += before_bytes
+        total_after += after_bytes
+        print(f'{viewport:>5}@{dpr:<4g} {slot:>5} {before_bytes:>9} {after_bytes:>9} '
+              f'{1 - after_bytes / before_bytes:6.0%}  {after_url.rsplit("/", 1)[-1]}')
+    print(f'{"all":<10} {"":>5} {total_before:>9} {total_after:>9} {1 - total_after / total_before:6.0%}')
+
+
+if __name__ == '__main__':
+    main()
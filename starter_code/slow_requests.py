@@ -0,0 +1,162 @@
+import functools
+import threading
+import time
+
+from flask import g, has_request_context, request
+from jinja2 import Template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# longer statements are cut in the log record
+_SQL_MAX_CHARS = 2000
+
+
+def _trace():
+    # the current request's trace, when one is being recorded
+    return g.get('slow_trace') if has_request_context() else None
+
+
+def timed(name):
+    # adds the calls to and time spent in the decorated function to the
+    # slow-request record, as timings[name]
+    def decorator(f):
+        @functools.wraps(f)
+        def wrapper(*args, **kwargs):
+            trace = _trace()
+            if trace is None:
+                return f(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                timing = trace['timings'].setdefault(name, [0, 0.0])
+                timing[0] += 1
+                timing[1] += time.perf_counter() - started
+        return wrapper
+    return decorator
+
+
+class _TimedTemplate(Template):
+    # render() is only called for the template a view renders; included and
+    # extended templates run inside it
+    render = timed('render_template')(Template.render)
+
+
+class SlowRequestLog:
+    # Logs one structured record for every request that takes longer than
+    # SLOW_REQUEST_MS: route, URL parameters, status, total time, every SQL
+    # statement with its duration and row count, the time spent rendering
+    # templates and in format_datetime (@timed functions), so a slow page
+    # can be diagnosed from the log alone.
+    #
+    # Each request keeps a small trace (statements past
+    # SLOW_REQUEST_MAX_STATEMENTS are only counted); the record is built only
+    # for slow requests and at most SLOW_REQUEST_LOG_LIMIT times per
+    # SLOW_REQUEST_LOG_WINDOW seconds, the next one carrying how many slow
+    # requests went unlogged in between.
+    #
+    # Row counts are the driver's cursor.rowcount: psycopg2 reports it for
+    # SELECTs too, SQLite only for writes. Statements run off the request
+    # thread (the async detail views' executor) are not part of the trace.
+
+    def __init__(self, app=None):
+        self._lock = threading.Lock()
+        self._window_started = 0.0
+        self._logged = 0
+        self._suppressed = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('SLOW_REQUEST_MS', 1000)
+        app.config.setdefault('SLOW_REQUEST_MAX_STATEMENTS', 50)
+        app.config.setdefault('SLOW_REQUEST_LOG_LIMIT', 10)
+        app.config.setdefault('SLOW_REQUEST_LOG_WINDOW', 60)
+        self.app = app
+        self.threshold = app.config['SLOW_REQUEST_MS'] / 1000
+        self.max_statements = app.config['SLOW_REQUEST_MAX_STATEMENTS']
+        self.log_limit = app.config['SLOW_REQUEST_LOG_LIMIT']
+        self.log_window = app.config['SLOW_REQUEST_LOG_WINDOW']
+        self.logger = app.logger.getChild('slow')
+        app.extensions['slow_requests'] = self
+        if not self.threshold:
+            return
+        app.before_request(self._start_request)
+        app.after_request(self._end_request)
+        app.jinja_env.template_class = _TimedTemplate
+        # statements only land in a request's trace, so one pair of Engine
+        # listeners serves every app
+        if not event.contains(Engine, 'before_cursor_execute', self._before_execute):
+            event.listen(Engine, 'before_cursor_execute', self._before_execute)
+            event.listen(Engine, 'after_cursor_execute', self._after_execute)
+
+    def _start_request(self):
+        g.slow_trace = {
+            'started': time.perf_counter(),
+            'statements': [],
+            'statement_count': 0,
+            'sql_seconds': 0.0,
+            'timings': {},
+        }
+
+    def _before_execute(self, conn, cursor, statement, parameters, context, executemany):
+        if _trace() is not None:
+            context._slow_request_started = time.perf_counter()
+
+    def _after_execute(self, conn, cursor, statement, parameters, context, executemany):
+        started = getattr(context, '_slow_request_started', None)
+        trace = _trace()
+        if started is None or trace is None:
+            return
+        elapsed = time.perf_counter() - started
+        trace['statement_count'] += 1
+        trace['sql_seconds'] += elapsed
+        if len(trace['statements']) < self.max_statements:
+            trace['statements'].append((statement, elapsed, cursor.rowcount))
+
+    def _allowed(self):
+        # True while this window's budget lasts; returns how many slow
+        # requests were skipped before this one
+        now = time.monotonic()
+        with self._lock:
+            if now - self._window_started >= self.log_window:
+                self._window_started = now
+                self._logged = 0
+            if self._logged >= self.log_limit:
+                self._suppressed += 1
+                return None
+            self._logged += 1
+            suppressed, self._suppressed = self._suppressed, 0
+            return suppressed
+
+    def _end_request(self, response):
+        trace = g.pop('slow_trace', None)
+        if trace is None:
+            return response
+        elapsed = time.perf_counter() - trace['started']
+        if elapsed < self.threshold:
+            return response
+        suppressed = self._allowed()
+        if suppressed is None:
+            return response
+        statements = [{
+            'sql': sql if len(sql) <= _SQL_MAX_CHARS else sql[:_SQL_MAX_CHARS] + '...',
+            'ms': round(seconds * 1000, 2),
+            'rows': rows if rows is not None and rows >= 0 else None,
+        } for sql, seconds, rows in trace['statements']]
+        timings = {name: {'calls': calls, 'ms': round(seconds * 1000, 2)}
+                   for name, (calls, seconds) in trace['timings'].items()}
+        self.logger.warning('slow request: %s %s took %.0f ms', request.method, request.path, elapsed * 1000, extra={
+            'status': response.status_code,
+            'duration_ms': round(elapsed * 1000, 1),
+            'endpoint': request.endpoint,
+            'view_args': request.view_args,
+            'query_args': request.args.to_dict(flat=False),
+            'sql_count': trace['statement_count'],
+            'sql_ms': round(trace['sql_seconds'] * 1000, 2),
+            'statements': statements,
+            'statements_omitted': trace['statement_count'] - len(statements),
+            'timings': timings,
+            'slow_suppressed': suppressed or None,
+        })
+        return response
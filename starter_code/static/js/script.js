@@ -2,3 +2,19 @@ window.parseISOString = function parseISOString(s) {
   var b = s.split(/\D+/);
   return new Date(Date.UTC(b[0], --b[1], b[2], b[3], b[4], b[5], b[6]));
 };
+
+document.addEventListener('click', function (e) {
+  var button = e.target.closest('[data-delete-url]');
+  if (!button || !window.confirm(button.getAttribute('data-confirm'))) {
+    return;
+  }
+  fetch(button.getAttribute('data-delete-url'), { method: 'DELETE' })
+    .then(function (response) { return response.json(); })
+    .then(function (body) {
+      if (body.success) {
+        window.location = body.redirect;
+      } else {
+        window.alert(body.error);
+      }
+    });
+});
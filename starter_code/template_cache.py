@@ -0,0 +1,80 @@
+import os
+import tempfile
+import threading
+import time
+
+from jinja2 import FileSystemBytecodeCache
+
+
+class AtomicFileSystemBytecodeCache(FileSystemBytecodeCache):
+    # several worker processes share the directory, so a cache file must
+    # never be visible half written
+
+    def __init__(self, directory):
+        super().__init__(directory)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def load_bytecode(self, bucket):
+        super().load_bytecode(bucket)
+        with self._lock:
+            if bucket.code is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+
+    def dump_bytecode(self, bucket):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as fp:
+                bucket.write_bytecode(fp)
+            os.replace(tmp, self._get_cache_filename(bucket))
+        except BaseException:
+            os.remove(tmp)
+            raise
+
+
+class TemplateCache:
+    # Keeps compiled templates on disk so a fresh worker (or a restarted
+    # server) loads bytecode instead of parsing and compiling every template
+    # on its first request. Entries are keyed by template path and checked
+    # against a checksum of the source, so editing a template invalidates it.
+    #
+    # With TEMPLATES_AUTO_RELOAD off (production), a loaded template is never
+    # stat()ed again for changes; restart to pick up edits.
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('TEMPLATE_BYTECODE_CACHE_DIR', os.path.join(app.instance_path, 'jinja-cache'))
+        self.app = app
+        directory = app.config['TEMPLATE_BYTECODE_CACHE_DIR']
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            app.jinja_env.bytecode_cache = AtomicFileSystemBytecodeCache(directory)
+        # the environment may already exist (extensions touch it on init), so
+        # apply the setting to it directly
+        auto_reload = app.config.get('TEMPLATES_AUTO_RELOAD')
+        app.jinja_env.auto_reload = app.debug if auto_reload is None else auto_reload
+        app.extensions['template_cache'] = self
+
+    def stats(self):
+        cache = self.app.jinja_env.bytecode_cache
+        return {
+            'hits': getattr(cache, 'hits', 0),
+            'misses': getattr(cache, 'misses', 0),
+        }
+
+    def compile_all(self):
+        # loads every template once, which writes its bytecode to the cache;
+        # returns {template name: seconds}
+        env = self.app.jinja_env
+        timings = {}
+        for name in env.list_templates(extensions=['html']):
+            started = time.perf_counter()
+            env.get_template(name)
+            timings[name] = time.perf_counter() - started
+        return timings
@@ -0,0 +1,64 @@
+# Shared setup for the tests. Run them from starter_code/ with
+#
+#   python -m unittest discover -s tests -t .
+#
+# Each test case gets its own app on an in-memory SQLite database, with the
+# background writers and disk caches turned off.
+
+import tempfile
+import types
+import unittest
+
+
+def settings(**overrides):
+    import config
+    values = {name: getattr(config, name) for name in dir(config) if name.isupper()}
+    values.update(
+        SQLALCHEMY_DATABASE_URI='sqlite://',
+        SQLALCHEMY_ENGINE_OPTIONS={},
+        TESTING=True,
+        DEBUG=False,
+        WTF_CSRF_ENABLED=False,
+        LOG_FILE='',
+        QUERY_STATS_LOG_INTERVAL=0,
+        QUERY_AUDIT=False,
+        METRICS_DIR='',
+        TEMPLATE_BYTECODE_CACHE_DIR='',
+        DATA_CACHE_GENERATIONS='',
+        ASYNC_DETAIL_VIEWS=False,
+        # the pool thread would share the in-memory database's one
+        # connection with the test
+        IMAGE_PREFETCH=False,
+    )
+    values.update(overrides)
+    return types.SimpleNamespace(**values)
+
+
+class AppTestCase(unittest.TestCase):
+    # self.app, self.db and a test client, with the tables created; extra
+    # config goes in `config`
+    config = {}
+
+    def setUp(self):
+        from extensions import db
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.app = self.new_app(**self.config)
+        self.db = db
+        self.context = self.app.app_context()
+        self.context.push()
+        self.addCleanup(self.context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+        self.client = self.app.test_client()
+
+    def new_app(self, **config):
+        # an app on the test's settings, keeping its disk caches under
+        # self.tmp; calling it again creates another app in the same process,
+        # as several test or worker apps would
+        from app import create_app
+        return create_app(settings(
+            IMAGE_CACHE_DIR=self.tmp.name + '/image-cache',
+            PROFILE_DIR=self.tmp.name + '/profiles',
+            **config))
@@ -0,0 +1,31 @@
+from extensions import db
+from models import Artist, Venue
+from tests.support import AppTestCase
+
+
+class ApiTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA', genres='{Jazz,"Rock n Roll"}'),
+            Venue(name='The Dueling Pianos Bar', city='New York', state='NY', genres='{Classical}'),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA', genres='{"Rock n Roll"}'),
+        ])
+        db.session.commit()
+
+    def test_genres_are_a_list(self):
+        venue = self.client.get('/api/venues/1').get_json()
+        self.assertEqual(venue['genres'], ['Jazz', 'Rock n Roll'])
+        artists = self.client.get('/api/artists?fields=name,genres').get_json()
+        self.assertEqual(artists['data'], [{'id': 1, 'name': 'Guns N Petals', 'genres': ['Rock n Roll']}])
+
+    def test_version_is_not_exposed(self):
+        self.assertNotIn('version', self.client.get('/api/venues/1').get_json())
+        self.assertEqual(self.client.get('/api/venues?fields=name,version').status_code, 400)
+
+    def test_keyset_pagination(self):
+        first = self.client.get('/api/venues?fields=name&limit=1').get_json()
+        self.assertEqual(first['data'], [{'id': 1, 'name': 'The Musical Hop'}])
+        second = self.client.get(f"/api/venues?fields=name&limit=1&after={first['next_after']}").get_json()
+        self.assertEqual(second, {'data': [{'id': 2, 'name': 'The Dueling Pianos Bar'}], 'next_after': None})
@@ -0,0 +1,79 @@
+import os
+import unittest
+from datetime import datetime, timedelta
+
+from data_cache import DataCache
+from extensions import post_commit
+from models import Artist, Show, Venue
+from tests.support import AppTestCase
+
+
+class FakeApp:
+    def __init__(self, **config):
+        self.config = dict({'DATA_CACHE_TTL': 60}, **config)
+        self.extensions = {}
+
+
+class DataCacheTest(unittest.TestCase):
+
+    def test_invalidate_reaches_other_processes_sharing_the_file(self):
+        import tempfile
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'generations')
+            worker_1 = DataCache(FakeApp(DATA_CACHE_GENERATIONS=path))
+            worker_2 = DataCache(FakeApp(DATA_CACHE_GENERATIONS=path))
+            worker_1.get_or_set('venue:1', lambda: 'old')
+            worker_2.invalidate('venue:1')
+            self.assertEqual(worker_1.get_or_set('venue:1', lambda: 'new'), 'new')
+
+    def test_value_built_during_a_write_is_not_kept(self):
+        cache = DataCache(FakeApp())
+        stamp = cache.stamp('venues')
+        cache.invalidate('venues')
+        cache.set('venues', 'read before the write committed', stamp)
+        self.assertIsNone(cache.get('venues'))
+
+    def test_least_recently_used_entry_goes_first(self):
+        cache = DataCache(FakeApp(DATA_CACHE_MAX_ENTRIES=2))
+        for key in ('a', 'b'):
+            cache.set(key, key, cache.stamp(key))
+        cache.get('a')
+        cache.set('c', 'c', cache.stamp('c'))
+        self.assertEqual((cache.get('a'), cache.get('b'), cache.get('c')), ('a', None, 'c'))
+
+
+class PageInvalidationTest(AppTestCase):
+    config = {'DATA_CACHE_TTL': 60}
+
+    def setUp(self):
+        super().setUp()
+        self.venue = Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+                           genres='{Jazz}')
+        self.artist = Artist(name='Guns N Petals', city='San Francisco', state='CA', genres='{Rock n Roll}')
+        self.db.session.add_all([self.venue, self.artist])
+        self.db.session.commit()
+
+    def test_edit_shows_on_the_page_it_redirects_to(self):
+        self.assertIn(b'The Musical Hop', self.client.get('/venues/1').data)
+        self.client.post('/venues/1/edit', data={'name': 'The Musical Hop II'})
+        self.assertIn(b'The Musical Hop II', self.client.get('/venues/1').data)
+        self.assertIn(b'The Musical Hop II', self.client.get('/venues').data)
+
+    def test_new_show_updates_both_pages_and_the_listing(self):
+        for url in ('/venues/1', '/artists/1', '/shows'):
+            self.client.get(url)
+        # as create_show_submission books it (its form posts a string that
+        # only Postgres converts)
+        self.db.session.add(Show(artist_id=1, venue_id=1, start_time=datetime.now() + timedelta(days=7)))
+        post_commit.enqueue('show.changed', show_id=None, artist_id=1, venue_id=1)
+        self.db.session.commit()
+        self.assertIn(b'Guns N Petals', self.client.get('/venues/1').data)
+        self.assertIn(b'The Musical Hop', self.client.get('/artists/1').data)
+        self.assertIn(b'Guns N Petals', self.client.get('/shows').data)
+
+    def test_renamed_venue_shows_on_its_artists_pages(self):
+        self.db.session.add(Show(artist_id=1, venue_id=1, start_time=datetime.now() + timedelta(days=7)))
+        self.db.session.commit()
+        self.assertIn(b'The Musical Hop', self.client.get('/artists/1').data)
+        self.client.post('/venues/1/edit', data={'name': 'Park Square Live'})
+        self.assertIn(b'Park Square Live', self.client.get('/artists/1').data)
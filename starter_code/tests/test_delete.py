@@ -0,0 +1,56 @@
+from datetime import datetime, timedelta
+
+from models import Artist, Show, Venue
+from tests.support import AppTestCase
+
+
+class DeleteVenueTest(AppTestCase):
+    config = {'DELETE_CHUNK_SIZE': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street'),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA'),
+        ])
+        self.db.session.flush()
+        self.db.session.add_all(Show(artist_id=1, venue_id=1, start_time=datetime.now() + timedelta(days=i))
+                                for i in range(5))
+        self.db.session.commit()
+
+    def shows_left(self):
+        return Show.query.filter_by(venue_id=1).count()
+
+    def test_deletes_the_venue_and_all_its_shows(self):
+        self.client.get('/artists/1')
+
+        response = self.client.delete('/venues/1')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIsNone(Venue.query.get(1))
+        self.assertEqual(self.shows_left(), 0)
+        # the artist page is no longer served from the cache
+        self.assertIn(b'0 Upcoming Shows', self.client.get('/artists/1').data)
+
+    def test_failure_after_committed_chunks_is_reported_and_a_retry_finishes(self):
+        self.db.session.execute('CREATE TRIGGER keep_venue BEFORE DELETE ON "Venue" '
+                                "BEGIN SELECT RAISE(ABORT, 'venue is locked'); END")
+        self.db.session.commit()
+
+        response = self.client.delete('/venues/1')
+
+        # two full chunks were committed, the last show stays with the venue
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(response.json['shows_deleted'], 4)
+        self.assertTrue(response.json['incomplete'])
+        self.assertIsNotNone(Venue.query.get(1))
+        self.assertEqual(self.shows_left(), 1)
+
+        self.db.session.execute('DROP TRIGGER keep_venue')
+        self.db.session.commit()
+        self.assertEqual(self.client.delete('/venues/1').status_code, 200)
+        self.assertIsNone(Venue.query.get(1))
+        self.assertEqual(self.shows_left(), 0)
+
+    def test_unknown_venue(self):
+        self.assertEqual(self.client.delete('/venues/2').status_code, 404)
@@ -0,0 +1,79 @@
+import html
+import json
+import re
+
+from sqlalchemy import event
+
+from models import Artist, Venue
+from tests.support import AppTestCase
+
+
+class EditTest(AppTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all([
+            Venue(name='The Musical Hop', city='San Francisco', state='CA', address='1015 Folsom Street',
+                  genres='{Jazz}', seeking_talent=True, seeking_description='We are on the lookout for a local artist'),
+            Artist(name='Guns N Petals', city='San Francisco', state='CA', genres='{"Rock n Roll"}'),
+        ])
+        self.db.session.commit()
+        self.updates = []
+        listener = lambda conn, cursor, statement, *args: statement.startswith('UPDATE') and self.updates.append(
+            statement)
+        event.listen(self.db.engine, 'before_cursor_execute', listener)
+        self.addCleanup(event.remove, self.db.engine, 'before_cursor_execute', listener)
+
+    def edit_form(self, url):
+        # the form as the edit page rendered it, hidden version and snapshot included
+        page = self.client.get(url).get_data(as_text=True)
+        hidden = {name: html.unescape(value) for name, value in
+                  re.findall(r'<input id="(version|original)" name="\w+" type="hidden" value="([^"]*)"', page)}
+        data = {'version': hidden['version'], 'original': hidden['original']}
+        for name, value in json.loads(hidden['original']).items():
+            if value is True:
+                data[name] = 'y'
+            elif value not in (False, '', []):
+                data[name] = value
+        return data
+
+    def test_only_the_edited_columns_are_written(self):
+        data = self.edit_form('/venues/1/edit')
+        data['city'] = 'Oakland'
+
+        response = self.client.post('/venues/1/edit', data=data)
+
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(len(self.updates), 1)
+        assignments = self.updates[0].split(' SET ')[1].split(' WHERE ')[0]
+        self.assertEqual(assignments, 'city=?, version=("Venue".version + ?)')
+        venue = Venue.query.get(1)
+        self.assertEqual((venue.city, venue.name, venue.version), ('Oakland', 'The Musical Hop', 2))
+        self.assertTrue(venue.seeking_talent)
+
+    def test_a_stale_version_is_a_conflict_and_writes_nothing(self):
+        data = self.edit_form('/venues/1/edit')
+        self.db.session.execute(Venue.__table__.update().values(version=2, name='The Musical Hop SF'))
+        self.db.session.commit()
+        data['city'] = 'Oakland'
+
+        response = self.client.post('/venues/1/edit', data=data)
+
+        self.assertEqual(response.headers['Location'], 'http://localhost/venues/1/edit')
+        self.assertIn(b'changed by someone else', self.client.get('/venues/1/edit').data)
+        venue = Venue.query.get(1)
+        self.assertEqual((venue.city, venue.name, venue.version), ('San Francisco', 'The Musical Hop SF', 2))
+
+    def test_a_missing_id_is_a_404(self):
+        self.assertEqual(self.client.post('/venues/99/edit', data={'name': 'Gone'}).status_code, 404)
+        self.assertEqual(self.client.post('/artists/99/edit', data={'name': 'Gone'}).status_code, 404)
+
+    def test_seeking_description_is_saved(self):
+        data = self.edit_form('/artists/1/edit')
+        data.update(seeking_venue='y', seeking_description='Looking for shows in the Bay Area')
+
+        self.client.post('/artists/1/edit', data=data)
+
+        artist = Artist.query.get(1)
+        self.assertEqual((artist.seeking_venue, artist.seeking_description, artist.version),
+                         (True, 'Looking for shows in the Bay Area', 2))
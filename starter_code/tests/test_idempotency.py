@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+from unittest import mock
+
+from models import Artist, IdempotencyKey, Show, Venue
+from tests.support import AppTestCase
+from views import common
+
+
+class IdempotencyTest(AppTestCase):
+    # through the show series form: the other create forms post values only
+    # postgres can bind
+    config = {'IDEMPOTENCY_PURGE_BATCH': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all([Artist(name='Guns N Petals'), Venue(name='The Musical Hop')])
+        self.db.session.commit()
+
+    def post(self, key, count='2', start='2035-01-31 20:00:00'):
+        return self.client.post('/shows/series/create', data={
+            'idempotency_key': key, 'artist_id': '1', 'venue_id': '1',
+            'start_time': start, 'frequency': 'weekly', 'count': count})
+
+    def test_a_resubmission_gets_the_original_response(self):
+        first = self.post('key-1')
+        second = self.post('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertNotIn('Idempotent-Replayed', first.headers)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.headers['Idempotent-Replayed'], 'true')
+        self.assertIn(b'Show series of 2 shows was successfully listed!', second.data)
+        self.assertEqual(Show.query.count(), 2)
+
+    def test_the_location_is_replayed(self):
+        self.db.session.add(IdempotencyKey(key='key-1', endpoint='venues.create_venue_submission',
+                                           message='Venue The Musical Hop was successfully listed!',
+                                           status=201, location='/venues/1'))
+        self.db.session.commit()
+
+        response = self.client.post('/venues/create', data={'idempotency_key': 'key-1', 'name': 'The Musical Hop'})
+
+        self.assertEqual((response.status_code, response.headers['Location']), (201, 'http://localhost/venues/1'))
+        self.assertEqual(Venue.query.count(), 1)
+
+    def test_a_concurrent_duplicate_loses_the_race_and_replays(self):
+        # the other request stores the key after this one has looked for it
+        real = common.replayed_outcome
+        lookups = []
+
+        def replayed_outcome(key):
+            lookups.append(key)
+            if len(lookups) == 1:
+                self.db.session.add(IdempotencyKey(key=key, endpoint='shows.create_show_series_submission',
+                                                   message='Show series of 3 shows was successfully listed!',
+                                                   status=201))
+                self.db.session.commit()
+                return None
+            return real(key)
+
+        with mock.patch('views.shows.replayed_outcome', replayed_outcome), \
+                self.assertLogs(self.app.logger, 'ERROR'):
+            response = self.post('key-1')
+
+        self.assertEqual(len(lookups), 2)
+        self.assertEqual((response.status_code, response.headers['Idempotent-Replayed']), (201, 'true'))
+        self.assertIn(b'Show series of 3 shows', response.data)
+        # this request's shows were rolled back with its key
+        self.assertEqual(Show.query.count(), 0)
+
+    def expired_keys(self, *keys):
+        old = datetime.utcnow() - timedelta(seconds=self.app.config['IDEMPOTENCY_KEY_TTL'] + 1)
+        self.db.session.add_all(IdempotencyKey(key=key, endpoint='shows.create_show_series_submission',
+                                               message='Show series of 2 shows was successfully listed!',
+                                               status=201, created_at=old) for key in keys)
+        self.db.session.commit()
+
+    def test_an_expired_key_is_used_afresh(self):
+        self.expired_keys('key-1')
+
+        response = self.post('key-1', count='1')
+
+        self.assertNotIn('Idempotent-Replayed', response.headers)
+        self.assertIn(b'Show series of 1 shows was successfully listed!', response.data)
+        self.assertEqual(Show.query.count(), 1)
+        self.assertEqual(self.post('key-1').headers['Idempotent-Replayed'], 'true')
+
+    def test_each_new_key_purges_a_batch_of_expired_ones(self):
+        self.expired_keys('old-1', 'old-2', 'old-3')
+
+        self.post('new-1', count='1')
+        self.assertEqual(IdempotencyKey.query.count(), 2)
+        self.post('new-2', count='1', start='2035-06-01 20:00:00')
+        self.assertEqual(sorted(k.key for k in IdempotencyKey.query), ['new-1', 'new-2'])
@@ -0,0 +1,146 @@
+import socket
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+from image_cache import ImageFetchError
+from models import Venue
+from tests.support import AppTestCase
+
+PNG = b'\x89PNG\r\n\x1a\n' + b'\0' * 64
+
+
+class Origin(BaseHTTPRequestHandler):
+    # stand-in for the remote hosts image_link points at
+    requests = Counter()
+    hosts = []
+
+    def do_GET(self):
+        self.requests[self.path] += 1
+        self.hosts.append(self.headers['Host'])
+        if self.path.startswith('/slow'):
+            time.sleep(0.2)
+        if self.path.startswith('/broken'):
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/png')
+        self.send_header('Content-Length', str(len(PNG)))
+        self.end_headers()
+        self.wfile.write(PNG)
+
+    def log_message(self, *args):
+        pass
+
+
+class ImageProxyTest(AppTestCase):
+    config = {'IMAGE_ALLOW_PRIVATE_HOSTS': True}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin = ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+        threading.Thread(target=cls.origin.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+
+    def setUp(self):
+        super().setUp()
+        Origin.requests.clear()
+        Origin.hosts.clear()
+
+    def venue_with_image(self, path):
+        venue = Venue(name='The Musical Hop', image_link=f'http://127.0.0.1:{self.origin.server_port}{path}')
+        self.db.session.add(venue)
+        self.db.session.commit()
+        return f'/img/venue/{venue.id}'
+
+    def test_miss_fetches_the_origin_once_then_hits(self):
+        url = self.venue_with_image('/hop.png')
+        hits = self.app.extensions['image_cache'].stats()['hits']
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first.data, PNG)
+        self.assertEqual(first.mimetype, 'image/png')
+        self.assertIn('max-age', first.headers['Cache-Control'])
+        self.assertEqual(second.data, PNG)
+        self.assertEqual(second.headers['ETag'], first.headers['ETag'])
+        self.assertEqual(Origin.requests['/hop.png'], 1)
+        self.assertEqual(self.app.extensions['image_cache'].stats()['hits'], hits + 1)
+
+    def test_conditional_request_is_answered_without_a_body(self):
+        url = self.venue_with_image('/hop.png')
+        etag = self.client.get(url).headers['ETag']
+
+        response = self.client.get(url, headers={'If-None-Match': etag})
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.data, b'')
+        self.assertEqual(Origin.requests['/hop.png'], 1)
+
+    def test_origin_error_is_a_502_and_not_retried_at_once(self):
+        url = self.venue_with_image('/broken.png')
+
+        first = self.client.get(url)
+        second = self.client.get(url)
+
+        self.assertEqual(first.status_code, 502)
+        self.assertEqual(second.status_code, 502)
+        self.assertIn('max-age', first.headers['Cache-Control'])
+        self.assertEqual(Origin.requests['/broken.png'], 1)
+
+    def test_concurrent_misses_share_one_fetch(self):
+        link = f'http://127.0.0.1:{self.origin.server_port}/slow.png'
+        cache = self.app.extensions['image_cache']
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.get(link).etag)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(results), 8)
+        self.assertEqual(len(set(results)), 1)
+        self.assertEqual(Origin.requests['/slow.png'], 1)
+
+    def resolver(self, address):
+        answers = []
+
+        def getaddrinfo(host, port, *args, **kwargs):
+            answers.append((host, port))
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, '', (address, self.origin.server_port))]
+        patcher = mock.patch('image_cache.socket.getaddrinfo', getaddrinfo)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return answers
+
+    def test_connects_to_the_resolved_address_with_the_original_host(self):
+        answers = self.resolver('127.0.0.1')
+        cache = self.app.extensions['image_cache']
+
+        # images.example does not resolve here, so urllib must not look it up
+        cache.get(f'http://images.example:{self.origin.server_port}/hop.png')
+
+        self.assertEqual(answers, [('images.example', self.origin.server_port)])
+        self.assertEqual(Origin.hosts, [f'images.example:{self.origin.server_port}'])
+
+    def test_non_public_answer_is_refused_without_connecting(self):
+        answers = self.resolver('127.0.0.1')
+        cache = self.app.extensions['image_cache']
+        cache.allow_private_hosts = False
+        self.addCleanup(setattr, cache, 'allow_private_hosts', True)
+
+        with self.assertRaisesRegex(ImageFetchError, 'non-public address 127.0.0.1'):
+            cache.get('http://images.example/hop.png')
+        with self.assertRaisesRegex(ImageFetchError, 'non-public address 127.0.0.1'):
+            cache.get('https://images.example/hop.png')
+
+        self.assertEqual(answers, [('images.example', 80), ('images.example', 443)])
+        self.assertEqual(Origin.requests, Counter())
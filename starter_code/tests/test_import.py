@@ -0,0 +1,48 @@
+import os
+
+from models import Venue
+from tests.support import AppTestCase
+
+
+class ImportVenuesTest(AppTestCase):
+
+    def test_imported_rows_start_at_version_1(self):
+        path = os.path.join(self.tmp.name, 'venues.csv')
+        with open(path, 'w') as fp:
+            fp.write('name,city,state,address,genres,facebook_link,seeking_talent\n'
+                     'The Musical Hop,San Francisco,CA,1015 Folsom Street,"Jazz,Reggae",'
+                     'https://www.facebook.com/TheMusicalHop,yes\n')
+
+        result = self.app.test_cli_runner().invoke(args=['import', 'venues', path])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        venue = Venue.query.one()
+        self.assertEqual(venue.version, 1)
+        self.assertEqual(venue.name, 'The Musical Hop')
+        self.assertEqual(venue.genres, '{Jazz,Reggae}')
+        self.assertTrue(venue.seeking_talent)
+
+    def test_a_row_the_database_rejects_is_skipped_and_its_batch_kept(self):
+        # stands in for a constraint the forms cannot check, such as an
+        # unknown artist_id on postgres
+        self.db.session.execute(self.db.text('CREATE UNIQUE INDEX ux_venue_name ON "Venue" (name)'))
+        self.db.session.commit()
+        path = os.path.join(self.tmp.name, 'venues.csv')
+        with open(path, 'w') as fp:
+            fp.write('name,city,state,address,genres,facebook_link\n'
+                     'The Musical Hop,San Francisco,CA,1015 Folsom Street,Jazz,https://www.facebook.com/hop\n'
+                     'The Musical Hop,San Francisco,CA,1015 Folsom Street,Jazz,https://www.facebook.com/hop\n'
+                     'Park Square Live Music & Coffee,San Francisco,CA,34 Whiskey Moore Ave,Folk,'
+                     'https://www.facebook.com/psl\n'
+                     'The Dueling Pianos Bar,New York,NY,335 Delancey Street,Classical,'
+                     'https://www.facebook.com/dpb\n')
+
+        result = self.app.test_cli_runner(mix_stderr=False).invoke(
+            args=['import', 'venues', path, '--batch-size', '2'])
+
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertIn('row 1: skipped', result.stderr)
+        self.assertIn('UNIQUE constraint failed', result.stderr)
+        self.assertIn('done: 3 written, 1 skipped, 4 rows read', result.output)
+        self.assertEqual([v.name for v in Venue.query.order_by(Venue.id)],
+                         ['The Musical Hop', 'Park Square Live Music & Coffee', 'The Dueling Pianos Bar'])
@@ -0,0 +1,104 @@
+import json
+import logging
+import os
+import unittest
+from unittest import mock
+
+from extensions import log_pipeline
+from log_pipeline import SamplingFilter
+from tests.support import AppTestCase
+
+
+class SamplingFilterTest(unittest.TestCase):
+
+    def records(self, sampling, level, count, lineno=10):
+        return [sampling.filter(logging.makeLogRecord({
+            'name': 'app', 'levelno': level, 'pathname': 'views/venues.py', 'lineno': lineno,
+        })) for _ in range(count)]
+
+    def test_a_call_site_gets_its_burst_per_window(self):
+        sampling = SamplingFilter(burst=2, window=60)
+        with mock.patch('log_pipeline.time.monotonic', return_value=100):
+            self.assertEqual(self.records(sampling, logging.WARNING, 5), [True, True, False, False, False])
+            # another call site has a budget of its own
+            self.assertEqual(self.records(sampling, logging.WARNING, 1, lineno=20), [True])
+        self.assertEqual(sampling.suppressed, 3)
+
+        record = logging.makeLogRecord({'name': 'app', 'levelno': logging.WARNING,
+                                        'pathname': 'views/venues.py', 'lineno': 10})
+        with mock.patch('log_pipeline.time.monotonic', return_value=160):
+            self.assertTrue(sampling.filter(record))
+        self.assertEqual(record.suppressed, 3)
+
+    def test_errors_and_exempt_loggers_are_never_sampled(self):
+        sampling = SamplingFilter(burst=1, window=60, exempt=('app.access',))
+        self.assertEqual(self.records(sampling, logging.ERROR, 3), [True] * 3)
+        self.assertEqual(self.records(sampling, logging.CRITICAL, 3), [True] * 3)
+        access = logging.makeLogRecord({'name': 'app.access', 'levelno': logging.INFO})
+        self.assertEqual([sampling.filter(access) for _ in range(3)], [True] * 3)
+        self.assertEqual(sampling.suppressed, 0)
+
+        sampling = SamplingFilter(burst=1, window=60, max_level=logging.ERROR)
+        self.assertEqual(self.records(sampling, logging.ERROR, 2), [True, False])
+
+
+class LogPipelineSetupTest(AppTestCase):
+
+    def app_logging_to(self, filename, **config):
+        return self.new_app(LOG_FILE=os.path.join(self.tmp.name, filename), **config)
+
+    def entries(self, filename):
+        path = os.path.join(self.tmp.name, filename)
+        if not os.path.exists(path):
+            return []
+        with open(path) as fp:
+            return [json.loads(line) for line in fp]
+
+    def lines(self, filename):
+        return [entry['message'] for entry in self.entries(filename)]
+
+    def test_another_app_takes_over_the_log(self):
+        first = self.app_logging_to('first.log')
+        first.logger.warning('before the second app')
+        second = self.app_logging_to('second.log')
+        self.addCleanup(lambda: second.logger.removeHandler(log_pipeline.handler))
+        self.addCleanup(log_pipeline.stop)
+
+        second.logger.warning('written once')
+        log_pipeline.stop()
+
+        self.assertEqual(self.lines('second.log'), ['written once'])
+        self.assertEqual(self.lines('first.log'), ['before the second app'])
+        self.assertEqual(second.logger.handlers.count(log_pipeline.handler), 1)
+
+    def test_records_carry_the_request_as_json_fields(self):
+        app = self.app_logging_to('app.log', LOG_SAMPLE_BURST=2)
+        self.addCleanup(lambda: app.logger.removeHandler(log_pipeline.handler))
+        self.addCleanup(log_pipeline.stop)
+
+        @app.route('/log-test/<int:n>')
+        def log_test(n):
+            for _ in range(n):
+                app.logger.warning('venue %s not found', 7, extra={'venue_id': 7})
+            app.logger.error('could not reach the image origin')
+            return ''
+
+        client = app.test_client()
+        response = client.get('/log-test/4', headers={'X-Request-ID': 'req-1'})
+        generated = client.get('/log-test/0').headers['X-Request-ID']
+        log_pipeline.stop()
+
+        self.assertEqual(response.headers['X-Request-ID'], 'req-1')
+        entries = self.entries('app.log')
+        self.assertEqual([(e['level'], e['request_id']) for e in entries], [
+            ('WARNING', 'req-1'), ('WARNING', 'req-1'), ('ERROR', 'req-1'), ('ERROR', generated)])
+        first = entries[0]
+        self.assertEqual(first['message'], 'venue 7 not found')
+        self.assertEqual(first['logger'], app.logger.name)
+        self.assertEqual((first['method'], first['path'], first['route']), ('GET', '/log-test/4', '/log-test/<int:n>'))
+        self.assertEqual(first['venue_id'], 7)
+        self.assertEqual(first['pid'], os.getpid())
+        self.assertIn('elapsed_ms', first)
+        self.assertIn('time', first)
+        self.assertTrue(first['where'].startswith('test_log_pipeline:'))
+        self.assertEqual(log_pipeline.stats()['suppressed'], 2)
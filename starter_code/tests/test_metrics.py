@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+
+from extensions import metrics
+from metrics import _Values
+from tests.support import AppTestCase
+
+SELECTS = ('fyyur_db_statement_duration_seconds_count', (('kind', 'SELECT'),))
+
+
+def scrape(client):
+    samples = {}
+    for line in client.get('/metrics').get_data(as_text=True).splitlines():
+        if line and not line.startswith('#'):
+            name, value = line.rsplit(' ', 1)
+            samples[name] = float(value)
+    return samples
+
+
+class MetricsSetupTest(AppTestCase):
+
+    def selects(self):
+        return metrics._file().read().get(SELECTS, 0)
+
+    def test_another_app_does_not_count_statements_twice(self):
+        collectors = list(metrics.collectors)
+        self.new_app()
+
+        before = self.selects()
+        self.db.session.execute(self.db.text('SELECT 1'))
+        self.assertEqual(self.selects() - before, 1)
+        self.assertEqual(metrics.collectors, collectors)
+
+
+class MetricsTest(AppTestCase):
+
+    def test_requests_are_counted_by_route_and_status(self):
+        served = 'fyyur_http_requests_total{route="/venues/<int:venue_id>",method="GET",status="404"}'
+        timed = 'fyyur_http_request_duration_seconds_bucket{route="/venues/<int:venue_id>",method="GET",le="+Inf"}'
+        before = scrape(self.client)
+
+        self.client.get('/venues/1')
+        self.client.get('/venues/2')
+        after = scrape(self.client)
+
+        self.assertEqual(after[served] - before.get(served, 0), 2)
+        self.assertEqual(after[timed] - before.get(timed, 0), 2)
+        self.assertEqual(after[timed], after[timed.replace('_bucket', '_count').replace(',le="+Inf"', '')])
+        self.assertIn('fyyur_db_pool_checkouts_total', after)
+
+
+class MetricsDirectoryTest(AppTestCase):
+
+    def test_a_reaped_worker_keeps_its_counters_but_not_its_gauges(self):
+        directory = os.path.join(self.tmp.name, 'metrics')
+        self.new_app(METRICS_DIR=directory)
+        worker = subprocess.Popen([sys.executable, '-c', ''])
+        worker.wait()
+        served = ('fyyur_http_requests_total', (('route', '/venues'), ('method', 'GET'), ('status', '200')))
+        memory = ('fyyur_process_resident_memory_bytes', ())
+        values = _Values(os.path.join(directory, f'{worker.pid}.db'))
+        values.add(served, 3)
+        values.set(memory, 1024)
+        values.close()
+
+        self.assertEqual(metrics.aggregate().get(served), 3)
+        self.assertNotIn((memory[0], (('pid', str(worker.pid)),)), metrics.aggregate())
+
+        metrics.retire(worker.pid)
+        self.assertFalse(os.path.exists(os.path.join(directory, f'{worker.pid}.db')))
+        self.assertEqual(metrics.aggregate().get(served), 3)
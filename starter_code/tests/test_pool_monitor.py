@@ -0,0 +1,54 @@
+import os
+
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+from extensions import pool_monitor
+from pool_monitor import InstrumentedQueuePool
+from tests.support import AppTestCase
+
+
+class PoolMonitorSetupTest(AppTestCase):
+
+    def test_another_app_does_not_count_checkouts_twice(self):
+        self.new_app()
+        engine = create_engine('sqlite:///' + os.path.join(self.tmp.name, 'pool.db'), poolclass=QueuePool)
+        self.addCleanup(engine.dispose)
+
+        before = pool_monitor.stats()
+        with engine.connect():
+            pass
+        after = pool_monitor.stats()
+        self.assertEqual(after['checkouts'] - before['checkouts'], 1)
+        self.assertEqual(after['connects'] - before['connects'], 1)
+
+
+class PoolMonitorTest(AppTestCase):
+
+    def engine(self):
+        engine = create_engine('sqlite:///' + os.path.join(self.tmp.name, 'pool.db'), poolclass=InstrumentedQueuePool,
+                               pool_size=1, max_overflow=0, pool_timeout=0.05)
+        self.addCleanup(engine.dispose)
+        return engine
+
+    def test_a_full_pool_is_reported_and_its_timeouts_counted(self):
+        engine = self.engine()
+        pool_monitor._last_warning = 0.0
+        before = pool_monitor.stats()
+
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            held = engine.connect()
+        self.addCleanup(held.close)
+        with self.assertRaises(PoolTimeoutError):
+            engine.connect()
+        stats = pool_monitor.stats()
+
+        self.assertIn('db pool saturated', logs.output[0])
+        self.assertEqual((stats['size'], stats['checked_out'], stats['idle'], stats['saturation']), (1, 1, 0, 1.0))
+        self.assertEqual(stats['waits'] - before['waits'], 2)
+        self.assertEqual(stats['timeouts'] - before['timeouts'], 1)
+        self.assertGreaterEqual(stats['max_wait_seconds'], 0.05)
+
+        held.close()
+        self.assertEqual(pool_monitor.stats()['idle'], 1)
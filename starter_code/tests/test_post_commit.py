@@ -0,0 +1,137 @@
+import threading
+from http.server import ThreadingHTTPServer
+
+from extensions import post_commit
+from models import Artist, Venue
+from tests.support import AppTestCase
+from tests.test_image_cache import Origin
+
+
+class PostCommitTest(AppTestCase):
+
+    def hook(self, func, inline=False):
+        name = f'test.{self.id()}.{len(post_commit.hooks)}'
+        post_commit.hook(name, inline=inline)(func)
+        self.addCleanup(post_commit.hooks.pop, name)
+        return name
+
+    def commit(self, name, **kwargs):
+        post_commit.enqueue(name, **kwargs)
+        self.db.session.commit()
+
+    def test_runs_on_the_pool_after_the_commit(self):
+        threads = []
+        name = self.hook(lambda value: threads.append((value, threading.current_thread().name)))
+        post_commit.enqueue(name, value=1)
+        self.assertTrue(post_commit.drain(1))
+        self.assertEqual(threads, [])
+
+        self.db.session.commit()
+        self.assertTrue(post_commit.drain(1))
+        self.assertEqual(len(threads), 1)
+        self.assertEqual(threads[0][0], 1)
+        self.assertTrue(threads[0][1].startswith('post-commit'))
+
+    def test_rollback_drops_the_queued_work(self):
+        calls = []
+        name = self.hook(lambda: calls.append(1))
+        post_commit.enqueue(name)
+        self.db.session.rollback()
+        self.db.session.commit()
+        self.assertTrue(post_commit.drain(1))
+        self.assertEqual(calls, [])
+
+    def test_commit_does_not_wait_for_the_side_effect(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        name = self.hook(lambda: release.wait(5))
+
+        self.commit(name)
+        self.assertEqual(post_commit.stats()['queue_depth'], 1)
+        self.assertFalse(post_commit.drain(0.05))
+        release.set()
+        self.assertTrue(post_commit.drain(1))
+        self.assertEqual(post_commit.stats()['queue_depth'], 0)
+
+    def test_a_full_queue_runs_the_side_effect_on_the_committing_thread(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        slots, post_commit._slots = post_commit._slots, threading.BoundedSemaphore(1)
+        self.addCleanup(setattr, post_commit, '_slots', slots)
+        blocked = self.hook(lambda: release.wait(5))
+        calls = []
+        counted = self.hook(lambda: calls.append(1))
+        inline = post_commit.stats()['inline']
+
+        self.commit(blocked)
+        self.commit(counted)
+        # the second commit waited for its side effect instead of queueing it
+        self.assertEqual(calls, [1])
+        self.assertEqual(post_commit.stats()['inline'], inline + 1)
+        release.set()
+        self.assertTrue(post_commit.drain(1))
+
+    def test_failures_are_logged_and_counted(self):
+        def broken():
+            raise RuntimeError('search index unavailable')
+        name = self.hook(broken)
+        failed = post_commit.stats()['failed']
+
+        with self.assertLogs(self.app.logger, 'ERROR') as logs:
+            self.commit(name)
+            self.assertTrue(post_commit.drain(1))
+        self.assertIn('post-commit hook broken failed', logs.output[0])
+        self.assertEqual(post_commit.stats()['failed'], failed + 1)
+
+    def test_inline_hooks_run_before_commit_returns(self):
+        calls = []
+        name = self.hook(lambda: calls.append(threading.current_thread()), inline=True)
+        self.commit(name)
+        self.assertEqual(calls, [threading.current_thread()])
+
+    def test_hooks_run_once_with_several_apps(self):
+        self.new_app()
+        calls = []
+        name = self.hook(lambda: calls.append(1), inline=True)
+        self.commit(name)
+        self.assertEqual(calls, [1])
+
+
+class ImagePrefetchTest(AppTestCase):
+    config = {'IMAGE_ALLOW_PRIVATE_HOSTS': True, 'IMAGE_PREFETCH': True}
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin = ThreadingHTTPServer(('127.0.0.1', 0), Origin)
+        threading.Thread(target=cls.origin.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+        cls.origin.server_close()
+
+    def setUp(self):
+        super().setUp()
+        Origin.requests.clear()
+
+    def test_new_venue_image_is_fetched_after_the_commit(self):
+        # as create_venue_submission lists it (its genres list only binds on
+        # Postgres)
+        venue = Venue(name='The Musical Hop', image_link=f'http://127.0.0.1:{self.origin.server_port}/hop.png')
+        self.db.session.add(venue)
+        self.db.session.flush()
+        post_commit.enqueue('venue.changed', venue_id=venue.id)
+        self.db.session.commit()
+        self.assertTrue(post_commit.drain(5))
+        self.assertEqual(Origin.requests['/hop.png'], 1)
+
+        self.assertEqual(self.client.get('/img/venue/1').status_code, 200)
+        self.assertEqual(Origin.requests['/hop.png'], 1)
+
+    def test_edited_artist_image_is_fetched_after_the_commit(self):
+        self.db.session.add(Artist(name='Guns N Petals'))
+        self.db.session.commit()
+        link = f'http://127.0.0.1:{self.origin.server_port}/petals.png'
+        self.client.post('/artists/1/edit', data={'name': 'Guns N Petals', 'image_link': link})
+        self.assertTrue(post_commit.drain(5))
+        self.assertEqual(Origin.requests['/petals.png'], 1)
@@ -0,0 +1,63 @@
+from models import Artist
+from query_audit import QueryAuditError, query_budget
+from tests.support import AppTestCase
+
+
+class QueryAuditSetupTest(AppTestCase):
+    config = {'QUERY_AUDIT': True, 'QUERY_AUDIT_ACTION': 'raise'}
+
+    def test_another_app_does_not_count_statements_twice(self):
+        self.new_app(**self.config)
+        self.db.session.add(Artist(name='Guns N Petals'))
+        self.db.session.commit()
+
+        response = self.client.get('/artists/1/edit')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.headers['X-Query-Count'], '1')
+
+    def test_apps_with_the_audit_off_are_left_alone(self):
+        other = self.new_app(QUERY_REPEAT_LIMIT=0, QUERY_AUDIT_ACTION='raise')
+        with other.test_request_context():
+            self.db.session.execute(self.db.text('SELECT 1'))
+
+
+class QueryAuditTest(AppTestCase):
+    config = {'QUERY_AUDIT': True, 'QUERY_REPEAT_LIMIT': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all(Artist(name=f'Artist {i}') for i in range(4))
+        self.db.session.commit()
+
+        @self.app.route('/audit-test/names')
+        def names():
+            # one lookup per artist, the N+1 shape the audit is for
+            return ','.join(self.db.session.execute(self.db.text('SELECT name FROM "Artist" WHERE id = :id'),
+                                                    {'id': i}).scalar() for i in range(1, 5))
+
+        @self.app.route('/audit-test/budget')
+        @query_budget(1)
+        def budget():
+            self.db.session.execute(self.db.text('SELECT name FROM "Artist"'))
+            self.db.session.execute(self.db.text('SELECT name FROM "Venue"'))
+            return ''
+
+    def test_a_repeated_statement_is_reported_once_with_its_call_site(self):
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            response = self.client.get('/audit-test/names')
+
+        self.assertEqual(response.headers['X-Query-Count'], '4')
+        self.assertEqual(len(logs.records), 1)
+        record = logs.records[0]
+        self.assertIn('statement ran more than 2 times in one request', record.getMessage())
+        self.assertEqual(record.fingerprint, 'SELECT name FROM "Artist" WHERE id = ?')
+        self.assertTrue(record.call_site.startswith('tests/test_query_audit.py:'), record.call_site)
+
+    def test_a_view_over_its_budget_is_reported(self):
+        with self.assertLogs(self.app.logger, 'WARNING') as logs:
+            self.client.get('/audit-test/budget')
+        self.assertEqual((logs.records[0].statements, logs.records[0].budget), (2, 1))
+
+        self.app.config['QUERY_AUDIT_ACTION'] = 'raise'
+        with self.assertRaisesRegex(QueryAuditError, 'over its budget of 1'):
+            self.client.get('/audit-test/budget')
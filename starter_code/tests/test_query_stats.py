@@ -0,0 +1,45 @@
+import threading
+import unittest
+
+from flask import Flask
+
+from query_stats import QueryStats
+
+
+class QueryStatsShardsTest(unittest.TestCase):
+
+    def setUp(self):
+        app = Flask(__name__)
+        app.config.update(QUERY_STATS_ENABLED=False, QUERY_STATS_MAX_FINGERPRINTS=3, QUERY_STATS_LOG_INTERVAL=0)
+        self.stats = QueryStats(app)
+
+    def run_threads(self, count, statement):
+        for _ in range(count):
+            thread = threading.Thread(target=self.stats.record, args=(statement, 0.001))
+            thread.start()
+            thread.join()
+
+    def test_finished_threads_are_folded_in(self):
+        self.run_threads(50, 'SELECT 1')
+        self.stats.record('SELECT 1', 0.001)
+
+        self.assertEqual(len(self.stats._shards), 1)
+        self.assertEqual(self.stats.snapshot()['SELECT ?'][0], 51)
+        # and once more, after the fold
+        self.assertEqual(self.stats.report()['statements'], 51)
+
+    def test_folded_shards_keep_the_fingerprint_limit(self):
+        for n in range(5):
+            self.run_threads(1, f'SELECT * FROM t{n}')
+
+        snapshot = self.stats.snapshot()
+        self.assertEqual(len(snapshot), 4)
+        self.assertEqual(snapshot['<other>'][0], 2)
+        self.assertEqual(len(self.stats._shards), 0)
+
+    def test_reset_drops_folded_shards(self):
+        self.run_threads(3, 'SELECT 1')
+        self.stats.snapshot()
+        self.stats.reset()
+
+        self.assertEqual(self.stats.snapshot(), {})
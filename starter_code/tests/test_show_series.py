@@ -0,0 +1,69 @@
+from datetime import date, datetime
+from unittest import mock
+
+from models import Artist, Show, Venue
+from tests.support import AppTestCase
+from views.shows import expand_occurrences, series_conflicts
+
+
+class ShowSeriesTest(AppTestCase):
+    config = {'SHOW_SERIES_MAX_OCCURRENCES': 5}
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all([Artist(name='Guns N Petals'), Venue(name='The Musical Hop')])
+        self.db.session.commit()
+
+    def post(self, **fields):
+        data = {'artist_id': '1', 'venue_id': '1', 'start_time': '2035-01-31 20:00:00', 'frequency': 'weekly'}
+        data.update(fields)
+        return self.client.post('/shows/series/create', data=data)
+
+    def test_expansion_ends_after_count_or_on_end_date(self):
+        start = datetime(2035, 1, 31, 20)
+        self.assertEqual(expand_occurrences(start, 'weekly', count=3),
+                         [datetime(2035, 1, 31, 20), datetime(2035, 2, 7, 20), datetime(2035, 2, 14, 20)])
+        # monthly offsets are taken from the first show, so March is back on the 31st
+        self.assertEqual(expand_occurrences(start, 'monthly', count=3),
+                         [datetime(2035, 1, 31, 20), datetime(2035, 2, 28, 20), datetime(2035, 3, 31, 20)])
+        self.assertEqual(len(expand_occurrences(start, 'weekly', count=5, end_date=date(2035, 2, 10))), 2)
+        with self.assertRaises(ValueError):
+            expand_occurrences(start, 'weekly', end_date=date(2035, 12, 31))
+
+    def test_a_series_over_the_limit_is_rejected_not_cut_short(self):
+        too_many = self.post(count='6')
+        too_long = self.post(end_date='2035-03-07')
+
+        self.assertIn(b'Number must be at most 5', too_many.data)
+        self.assertIn(b'A series can have at most 5 shows', too_long.data)
+        self.assertEqual(Show.query.count(), 0)
+
+        self.post(end_date='2035-02-28')
+        self.assertEqual(Show.query.count(), 5)
+
+    def test_clashes_are_any_show_on_the_same_day(self):
+        self.db.session.add_all([
+            Venue(name='Park Square Live Music & Coffee'),
+            Show(artist_id=1, venue_id=2, start_time=datetime(2035, 2, 7, 12)),
+            Show(artist_id=1, venue_id=2, start_time=datetime(2035, 2, 8, 20)),
+        ])
+        self.db.session.commit()
+        occurrences = expand_occurrences(datetime(2035, 1, 31, 20), 'weekly', count=3)
+
+        conflicts = series_conflicts(1, 1, occurrences)
+
+        self.assertEqual([c.start_time for c in conflicts], [datetime(2035, 2, 7, 12)])
+        response = self.post(count='3')
+        self.assertIn(b'clashes with existing shows on 2035-02-07', response.data)
+        self.assertEqual(Show.query.count(), 2)
+
+    def test_every_show_is_booked_or_none(self):
+        with mock.patch('views.shows.record_outcome', side_effect=RuntimeError('lost the connection')), \
+                self.assertLogs(self.app.logger, 'ERROR'):
+            response = self.post(count='4')
+        self.assertIn(b'Show series could not be listed.', response.data)
+        self.assertEqual(Show.query.count(), 0)
+
+        response = self.post(count='4')
+        self.assertIn(b'Show series of 4 shows was successfully listed!', response.data)
+        self.assertEqual([s.start_time.day for s in Show.query.order_by(Show.start_time)], [31, 7, 14, 21])
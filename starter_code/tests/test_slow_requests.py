@@ -0,0 +1,74 @@
+from datetime import datetime
+from unittest import mock
+
+from models import Artist, Show, Venue
+from tests.support import AppTestCase
+
+
+class SlowRequestSetupTest(AppTestCase):
+    # every request counts as slow
+    config = {'SLOW_REQUEST_MS': 0.001}
+
+    def test_another_app_does_not_trace_statements_twice(self):
+        self.new_app(**self.config)
+        self.db.session.add(Artist(name='Guns N Petals'))
+        self.db.session.commit()
+
+        with self.assertLogs(self.app.logger.getChild('slow'), 'WARNING') as logs:
+            self.client.get('/artists/1/edit')
+        record = logs.records[0]
+        self.assertEqual(record.sql_count, 1)
+        self.assertEqual(len(record.statements), 1)
+
+
+class SlowRequestRecordTest(AppTestCase):
+    config = {'SLOW_REQUEST_MS': 0.001, 'SLOW_REQUEST_LOG_LIMIT': 2}
+
+    def setUp(self):
+        super().setUp()
+        self.db.session.add_all([Artist(name='Guns N Petals'), Venue(name='The Musical Hop')])
+        self.db.session.add_all(Show(artist_id=1, venue_id=1, start_time=datetime(2035, 5, day, 20)) for day in (1, 2, 3))
+        self.db.session.commit()
+        self.slow = self.app.logger.getChild('slow')
+        # a window of our own, whatever earlier tests logged
+        clock = mock.patch('slow_requests.time.monotonic', return_value=10 ** 9)
+        self.clock = clock.start()
+        self.addCleanup(clock.stop)
+        slow_requests = self.app.extensions['slow_requests']
+        slow_requests._window_started = slow_requests._suppressed = 0
+
+    def test_template_and_format_datetime_time_is_recorded(self):
+        with self.assertLogs(self.slow, 'WARNING') as logs:
+            self.client.get('/shows')
+        timings = logs.records[0].timings
+
+        self.assertEqual(timings['render_template']['calls'], 1)
+        # each show's time is formatted by show_listing and by the |datetime filter
+        self.assertEqual(timings['format_datetime']['calls'], 6)
+        self.assertGreater(timings['render_template']['ms'], 0)
+
+    def test_every_statement_is_listed_with_its_time_and_rows(self):
+        with self.assertLogs(self.slow, 'WARNING') as logs:
+            self.client.post('/artists/1/edit', data={'name': 'Guns N Roses', 'version': '1'})
+        record = logs.records[0]
+        update = [s for s in record.statements if s['sql'].startswith('UPDATE')]
+
+        self.assertEqual(record.sql_count, len(record.statements))
+        self.assertEqual(len(update), 1)
+        self.assertEqual(update[0]['rows'], 1)
+        self.assertGreaterEqual(update[0]['ms'], 0)
+        self.assertAlmostEqual(record.sql_ms, sum(s['ms'] for s in record.statements), delta=0.1)
+        self.assertEqual(record.view_args, {'artist_id': 1})
+
+    def test_records_past_the_limit_are_counted_until_the_next_window(self):
+        with self.assertLogs(self.slow, 'WARNING') as logs:
+            for _ in range(5):
+                self.client.get('/artists/1/edit')
+        self.assertEqual(len(logs.records), 2)
+        self.assertEqual([r.slow_suppressed for r in logs.records], [None, None])
+
+        self.clock.return_value += 60
+        with self.assertLogs(self.slow, 'WARNING') as logs:
+            self.client.get('/artists/1/edit')
+            self.client.get('/artists/1/edit')
+        self.assertEqual([r.slow_suppressed for r in logs.records], [3, None])
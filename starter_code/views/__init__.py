@@ -0,0 +1,10 @@
+# Controllers, one blueprint per area of the site. Endpoints are named
+# '<blueprint>.<view>', e.g. url_for('venues.show_venue', venue_id=1).
+
+from views import admin, api, artists, images, main, metrics, shows, venues
+
+BLUEPRINTS = (main.bp, venues.bp, artists.bp, shows.bp, images.bp, api.bp, admin.bp, metrics.bp)
+
+def register_blueprints(app):
+  for blueprint in BLUEPRINTS:
+    app.register_blueprint(blueprint)
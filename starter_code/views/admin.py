@@ -0,0 +1,80 @@
+#----------------------------------------------------------------------------#
+# Admin.
+#----------------------------------------------------------------------------#
+
+from functools import wraps
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request, send_file
+
+from extensions import data_cache, pool_monitor, post_commit, query_stats, request_profiler
+from query_stats import SORT_KEYS as QUERY_STATS_SORT_KEYS
+from request_profiler import SORT_KEYS as PROFILE_SORT_KEYS
+from views.common import json_response
+
+bp = Blueprint('admin', __name__, url_prefix='/admin')
+
+def admin_required(f):
+  # the admin pages exist only when ADMIN_TOKEN is configured, and answer
+  # only requests carrying it
+  @wraps(f)
+  def decorated(*args, **kwargs):
+    token = current_app.config.get('ADMIN_TOKEN')
+    if not token or not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+      abort(404)
+    return f(*args, **kwargs)
+  return decorated
+
+@bp.route('/pool')
+@admin_required
+def admin_pool():
+  return json_response(pool_monitor.stats())
+
+@bp.route('/post-commit')
+@admin_required
+def admin_post_commit():
+  # queue depth, outcomes and wait/run latency of the post-commit side
+  # effects, with the hit counts of the data cache their hooks invalidate
+  return json_response(dict(post_commit.stats(), data_cache=data_cache.stats()))
+
+@bp.route('/query-stats')
+@admin_required
+def admin_query_stats():
+  # most expensive statement fingerprints first; ?sort= any of
+  # QUERY_STATS_SORT_KEYS, ?limit= how many
+  sort = request.args.get('sort', 'total_ms')
+  if sort not in QUERY_STATS_SORT_KEYS:
+    abort(400)
+  return json_response(query_stats.report(limit=request.args.get('limit', 50, type=int), sort=sort))
+
+@bp.route('/query-stats', methods=['DELETE'])
+@admin_required
+def reset_query_stats():
+  # starts a fresh measurement, e.g. before a load test
+  query_stats.reset()
+  return json_response({"success": True})
+
+@bp.route('/profiles')
+@admin_required
+def admin_profiles():
+  # requests profiled with an X-Profile: 1 header, newest first
+  return json_response({"profiles": request_profiler.list()})
+
+@bp.route('/profiles/<profile_id>')
+@admin_required
+def admin_profile(profile_id):
+  # the .prof file for pstats/snakeviz, or with ?format=text the top
+  # functions by ?sort= (cumulative, tottime or ncalls)
+  if request.args.get('format') == 'text':
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in PROFILE_SORT_KEYS:
+      abort(400)
+    report = request_profiler.report(profile_id, sort=sort, limit=request.args.get('limit', 60, type=int))
+    if report is None:
+      abort(404)
+    return Response(report, mimetype='text/plain')
+  path = request_profiler.path(profile_id)
+  if path is None:
+    abort(404)
+  return send_file(path, mimetype='application/octet-stream', as_attachment=True,
+    download_name=profile_id + '.prof')
@@ -0,0 +1,90 @@
+#----------------------------------------------------------------------------#
+# API.
+#
+# Built on Core selects: only the columns named in ?fields= are fetched and
+# rows go straight to JSON without instantiating any model.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, abort, current_app, request
+from sqlalchemy import select
+
+from bulk_import import parse_genres
+from extensions import db
+from models import Artist, Show, Venue
+from query_audit import query_budget
+from views.common import json_response
+
+bp = Blueprint('api', __name__, url_prefix='/api')
+
+# internal columns that are not part of the API (version backs the edit
+# forms' optimistic locking)
+API_HIDDEN_COLUMNS = ('version',)
+
+def _public_columns(table):
+  return {c.name: c for c in table.c if c.name not in API_HIDDEN_COLUMNS}
+
+def _api_columns(resource):
+  if resource == 'venues':
+    return _public_columns(Venue.__table__)
+  if resource == 'artists':
+    return _public_columns(Artist.__table__)
+  if resource == 'shows':
+    columns = _public_columns(Show.__table__)
+    columns['artist_name'] = Artist.__table__.c.name.label('artist_name')
+    columns['venue_name'] = Venue.__table__.c.name.label('venue_name')
+    return columns
+  abort(404)
+
+def _api_select(resource):
+  columns = _api_columns(resource)
+  fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()]
+  if not fields:
+    fields = [name for name in columns if name not in ('artist_name', 'venue_name')]
+  if any(f not in columns for f in fields):
+    abort(400)
+  if 'id' not in fields:
+    fields.insert(0, 'id')
+
+  stmt = select(*[columns[f] for f in fields])
+  if resource == 'shows':
+    shows = Show.__table__
+    source = shows
+    if 'artist_name' in fields:
+      source = source.join(Artist.__table__, shows.c.artist_id == Artist.__table__.c.id)
+    if 'venue_name' in fields:
+      source = source.join(Venue.__table__, shows.c.venue_id == Venue.__table__.c.id)
+    stmt = stmt.select_from(source)
+  return stmt, fields, columns['id']
+
+def _api_row(fields, row):
+  data = dict(zip(fields, row))
+  if 'genres' in data:
+    # stored as a postgres array literal, e.g. {Jazz,"Rock n Roll"}
+    data['genres'] = parse_genres(data['genres'])
+  return data
+
+@bp.route('/<resource>')
+@query_budget(1)
+def api_list(resource):
+  # keyset pagination: ?after=<last id seen>&limit=<n>, ordered by id
+  stmt, fields, id_column = _api_select(resource)
+  limit = max(1, min(request.args.get('limit', current_app.config['API_PAGE_SIZE'], type=int),
+                     current_app.config['API_MAX_PAGE_SIZE']))
+  after = request.args.get('after', type=int)
+  if after is not None:
+    stmt = stmt.where(id_column > after)
+  rows = db.session.execute(stmt.order_by(id_column).limit(limit + 1)).all()
+  data = [_api_row(fields, row) for row in rows[:limit]]
+  return json_response({
+    "data": data,
+    "next_after": data[-1]['id'] if len(rows) > limit else None
+  })
+
+@bp.route('/<resource>/<int:item_id>')
+@query_budget(1)
+def api_detail(resource, item_id):
+  stmt, fields, id_column = _api_select(resource)
+  row = db.session.execute(stmt.where(id_column == item_id)).first()
+  if row is None:
+    return json_response({"error": "not found"}, 404)
+  return json_response(_api_row(fields, row))
@@ -0,0 +1,277 @@
+#----------------------------------------------------------------------------#
+# Artists.
+#----------------------------------------------------------------------------#
+
+from datetime import date, datetime, timedelta
+
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy import select
+
+from bulk_import import parse_genres
+from extensions import data_cache, db, post_commit
+from forms import ArtistForm
+from models import Artist, Show, Venue
+from query_audit import query_budget
+from views.common import (ARTIST_EDIT_FIELDS, DeleteIncomplete, changed_fields, delete_with_shows,
+  enqueue_related, fetch_all, fetch_all_concurrently, idempotency_key, json_response, partial_update,
+  outcome_response, populate_edit_form, record_outcome, replay_response, replayed_outcome, submitted_version,
+  with_upcoming_show_counts)
+
+bp = Blueprint('artists', __name__)
+
+#  Artists
+#  ----------------------------------------------------------------
+
+@bp.route('/artists')
+@query_budget(1)
+def artists():
+  # TODO: replace with real data returned from querying the database
+  data = data_cache.get_or_set('artists',
+    lambda: [{"id":artist.id,"name":artist.name} for artist in Artist.query.all()])
+  return render_template('pages/artists.html', artists=data)
+
+@bp.route('/artists/search', methods=['POST'])
+@query_budget(1)
+def search_artists():
+  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for "A" should return "Guns N Petals", "Matt Quevado", and "The Wild Sax Band".
+  # search for "band" should return "The Wild Sax Band".
+  search_term = request.form.get('search_term', "").strip()
+  artist_list = with_upcoming_show_counts(Artist, Show.artist_id, Artist.id, Artist.name) \
+    .filter(Artist.name.ilike('%'+ search_term + '%')).all()
+  count = len(artist_list)
+  search_result = [{
+    "id":artist.id,
+    'name':artist.name,
+    "num_upcoming_shows": artist.num_upcoming_shows
+  } for artist in artist_list]
+
+  response = {
+    "count":count,
+    "data":search_result
+  }
+  return render_template('pages/search_artists.html', results=response, search_term=request.form.get('search_term', ''))
+
+@bp.route('/artists/available')
+@query_budget(2)
+def available_artists():
+  # lists artists seeking a venue that have no show booked in [start, end).
+  # ?date=YYYY-MM-DD checks a single day, ?start=&end= a range; city, state
+  # and genre narrow the result down further.
+  import dateutil.parser
+  try:
+    start = dateutil.parser.parse(request.args.get('start') or request.args.get('date') or str(date.today()))
+    end = dateutil.parser.parse(request.args['end']) if request.args.get('end') else start + timedelta(days=1)
+  except (ValueError, OverflowError):
+    abort(400)
+  if end <= start:
+    abort(400)
+  city = request.args.get('city', '').strip()
+  state = request.args.get('state', '').strip()
+  genre = request.args.get('genre', '').strip()
+  page = request.args.get('page', 1, type=int)
+
+  # correlated NOT EXISTS so the database runs a single anti-join instead of
+  # us loading every artist's shows
+  booked = db.session.query(Show.id).filter(
+    Show.artist_id == Artist.id,
+    Show.start_time >= start,
+    Show.start_time < end)
+  query = Artist.query.with_entities(Artist.id, Artist.name, Artist.city, Artist.state) \
+    .filter(Artist.seeking_venue.is_(True), ~booked.exists())
+  if state:
+    query = query.filter(Artist.state == state)
+  if city:
+    query = query.filter(Artist.city.ilike(city))
+  if genre:
+    query = query.filter(Artist.genres.ilike('%' + genre + '%'))
+
+  pagination = query.order_by(Artist.name, Artist.id) \
+    .paginate(page=page, per_page=current_app.config['AVAILABILITY_PER_PAGE'], error_out=False)
+  data = [{"id": row.id, "name": row.name, "city": row.city, "state": row.state} for row in pagination.items]
+
+  return render_template('pages/available_artists.html', artists=data, pagination=pagination,
+    start=start, end=end, city=city, state=state, genre=genre)
+
+def artist_detail_queries(artist_id, now):
+  # the independent reads behind an artist page
+  artists, shows, venues = Artist.__table__, Show.__table__, Venue.__table__
+  tiles = select(shows.c.venue_id, venues.c.name.label('venue_name'),
+                 venues.c.image_link.label('venue_image_link'), shows.c.start_time) \
+    .select_from(shows.join(venues, shows.c.venue_id == venues.c.id)) \
+    .where(shows.c.artist_id == artist_id)
+  return {
+    "artist": select(artists).where(artists.c.id == artist_id),
+    "upcoming_shows": tiles.where(shows.c.start_time > now).order_by(shows.c.start_time),
+    "past_shows": tiles.where(shows.c.start_time < now).order_by(shows.c.start_time.desc()),
+  }
+
+def artist_data(results):
+  if not results['artist']:
+    abort(404)
+  artist = results['artist'][0]
+  data = {
+    "id": artist.id,
+    "name": artist.name,
+    "genres": parse_genres(artist.genres),
+    "city": artist.city,
+    "state": artist.state,
+    "phone": artist.phone,
+    "website": artist.website_link,
+    "facebook_link": artist.facebook_link,
+    "seeking_venue": artist.seeking_venue,
+    "seeking_description": artist.seeking_description,
+    "image_link": artist.image_link,
+    "past_shows": [dict(row._mapping, start_time=str(row.start_time)) for row in results['past_shows']],
+    "upcoming_shows": [dict(row._mapping, start_time=str(row.start_time)) for row in results['upcoming_shows']],
+    "past_shows_count": len(results['past_shows']),
+    "upcoming_shows_count": len(results['upcoming_shows']),
+  }
+  return data
+
+@query_budget(3)
+def show_artist(artist_id):
+  # shows the artist page with the given artist_id
+  data = data_cache.get_or_set(f'artist:{artist_id}',
+    lambda: artist_data(fetch_all(artist_detail_queries(artist_id, datetime.now()))))
+  return render_template('pages/show_artist.html', artist=data)
+
+@query_budget(3)
+async def show_artist_async(artist_id):
+  key = f'artist:{artist_id}'
+  data = data_cache.get(key)
+  if data is None:
+    stamp = data_cache.stamp(key)
+    data = artist_data(await fetch_all_concurrently(artist_detail_queries(artist_id, datetime.now())))
+    data_cache.set(key, data, stamp)
+  return render_template('pages/show_artist.html', artist=data)
+
+@bp.record
+def register_show_artist(state):
+  state.add_url_rule('/artists/<int:artist_id>', 'show_artist',
+    show_artist_async if state.app.config['ASYNC_DETAIL_VIEWS'] else show_artist)
+
+@bp.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+  def changed(venue_ids):
+    post_commit.enqueue('artist.changed', artist_id=artist_id)
+    post_commit.enqueue('show.changed', show_id=None, artist_id=artist_id, venue_id=None)
+    for venue_id in venue_ids:
+      post_commit.enqueue('venue.changed', venue_id=venue_id)
+  try:
+    if delete_with_shows(Artist, Show.__table__.c.artist_id, artist_id, changed) is None:
+      return json_response({"success": False, "error": "not found"}, 404)
+    flash('Artist was successfully deleted!')
+  except DeleteIncomplete as e:
+    current_app.logger.exception('artist %s was only partly deleted', artist_id)
+    return json_response({"success": False, "incomplete": True, "shows_deleted": e.shows_deleted,
+      "error": f"Artist could not be deleted, but {e.shows_deleted} of its shows were. Delete it again to finish."}, 500)
+  except Exception:
+    current_app.logger.exception('artist %s could not be deleted', artist_id)
+    db.session.rollback()
+    return json_response({"success": False, "error": "Artist could not be deleted."}, 500)
+  finally:
+    db.session.close()
+  return json_response({"success": True, "redirect": url_for('main.index')})
+
+#  Update Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['GET'])
+@query_budget(1)
+def edit_artist(artist_id):
+  artist = Artist.query.get_or_404(artist_id)
+  form = ArtistForm()
+  populate_edit_form(form, artist, ARTIST_EDIT_FIELDS)
+  return render_template('forms/edit_artist.html', form=form, artist=artist)
+
+@bp.route('/artists/<int:artist_id>/edit', methods=['POST'])
+def edit_artist_submission(artist_id):
+  form = ArtistForm()
+  values = changed_fields(form, ARTIST_EDIT_FIELDS)
+  if not values:
+    flash('Nothing to update, the artist was left unchanged.')
+    return redirect(url_for('artists.show_artist', artist_id=artist_id))
+  updated = None
+  try:
+    updated = partial_update(Artist, artist_id, submitted_version(form), values)
+    if updated:
+      post_commit.enqueue('artist.changed', artist_id=artist_id)
+      enqueue_related(Show.__table__.c.artist_id, artist_id, values)
+      db.session.commit()
+      flash('The Artist ' + request.form.get('name', '') + ' has been successfully updated!')
+    else:
+      db.session.rollback()
+  except Exception:
+    current_app.logger.exception('artist %s could not be updated', artist_id)
+    db.session.rollback()
+    flash('An Erro occured during update')
+  if updated == 0:
+    # either the artist is gone or someone else saved in the meantime
+    exists = db.session.query(Artist.id).filter_by(id=artist_id).first() is not None
+    db.session.close()
+    if not exists:
+      abort(404)
+    flash('The artist was changed by someone else in the meantime, please review and submit again.')
+    return redirect(url_for('artists.edit_artist', artist_id=artist_id))
+  db.session.close()
+  return redirect(url_for('artists.show_artist', artist_id=artist_id))
+
+#  Create Artist
+#  ----------------------------------------------------------------
+
+@bp.route('/artists/create', methods=['GET'])
+@query_budget(0)
+def create_artist_form():
+  form = ArtistForm()
+  return render_template('forms/new_artist.html', form=form)
+
+@bp.route('/artists/create', methods=['POST'])
+def create_artist_submission():
+  # called upon submitting the new artist listing form
+  # TODO: insert form data as a new Venue record in the db, instead
+  # TODO: modify data to be the data object returned from db insertion
+  key = idempotency_key()
+  replay = replayed_outcome(key)
+  if replay:
+    return replay_response(replay)
+  outcome = None
+  try:
+    artist = Artist(name=request.form.get('name'),
+    city=request.form.get('city'),
+    state=request.form.get('state'),
+    phone=request.form.get('phone'),
+    genres=request.form.getlist('genres'),
+    facebook_link=request.form.get('facebook_link'),
+    image_link=request.form.get('image_link'),
+    website_link=request.form.get('website_link'),
+    seeking_venue= True if request.form.get('seeking_venue')=="Y" else False,
+    seeking_description=request.form.get('seeking_description'))
+    db.session.add(artist)
+    db.session.flush()
+    post_commit.enqueue('artist.changed', artist_id=artist.id)
+    message = 'Artist ' + request.form['name'] + ' was successfully listed!'
+    outcome = record_outcome(key, message, location=url_for('artists.show_artist', artist_id=artist.id))
+    db.session.commit()
+  # on successful db insert, flash success
+  except Exception:
+    current_app.logger.exception('artist could not be listed')
+    db.session.rollback()
+    replay = replayed_outcome(key)
+    if replay:
+      return replay_response(replay)
+    flash('An error occurred. Artist ' + request.form['name'] + ' could not be listed.')
+  # TODO: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  finally:
+    db.session.close()
+  if outcome:
+    return outcome_response(outcome)
+  return render_template('pages/home.html')
+
+  # on successful db insert, flash success
+  # flash('Artist ' + request.form['name'] + ' was successfully listed!')
+  # # TODO: on unsuccessful db insert, flash an error instead.
+  # # e.g., flash('An error occurred. Artist ' + data.name + ' could not be listed.')
+  # return render_template('pages/home.html')
@@ -0,0 +1,284 @@
+#----------------------------------------------------------------------------#
+# Helpers shared by the blueprints.
+#----------------------------------------------------------------------------#
+
+from collections import namedtuple
+from datetime import datetime, timedelta
+import json
+
+from flask import Response, current_app, flash, render_template, request
+from sqlalchemy import case, delete, func, select, tuple_
+
+from bulk_export import json_default
+from bulk_import import format_genres, parse_genres
+from extensions import data_cache, db, image_cache, post_commit
+from image_cache import ImageFetchError
+from models import Artist, IdempotencyKey, Show, Venue
+
+#  Idempotency
+#  ----------------------------------------------------------------
+
+def idempotency_key():
+  # API clients send an Idempotency-Key header, the HTML forms a hidden field
+  key = request.headers.get('Idempotency-Key') or request.form.get('idempotency_key')
+  return key.strip()[:64] if key and key.strip() else None
+
+def replayed_outcome(key):
+  # the stored outcome of an earlier submission with this key, if still fresh.
+  # An expired entry is removed in the caller's transaction so the key can be reused.
+  if key is None:
+    return None
+  entry = IdempotencyKey.query.get((key, request.endpoint))
+  if entry is None:
+    return None
+  if entry.created_at < datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL']):
+    db.session.delete(entry)
+    return None
+  return entry
+
+# what a create submission answered: the flashed message, the status and
+# the new item's URL, if it has a page
+Outcome = namedtuple('Outcome', 'message status location')
+
+def record_outcome(key, message, status=201, location=None):
+  # stored in the same transaction as the insert it describes, together with
+  # the response, so a replay answers exactly as the first submission did.
+  # Up to IDEMPOTENCY_PURGE_BATCH expired keys are deleted along with it, so
+  # the table stays small without the purge command
+  if key is not None:
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])
+    expired = select(IdempotencyKey.key, IdempotencyKey.endpoint) \
+      .where(IdempotencyKey.created_at < cutoff) \
+      .limit(current_app.config['IDEMPOTENCY_PURGE_BATCH'])
+    db.session.execute(delete(IdempotencyKey)
+      .where(tuple_(IdempotencyKey.key, IdempotencyKey.endpoint).in_(expired))
+      .execution_options(synchronize_session=False))
+    db.session.add(IdempotencyKey(key=key, endpoint=request.endpoint, message=message,
+      status=status, location=location))
+  return Outcome(message, status, location)
+
+def outcome_response(outcome, replayed=False, template='pages/home.html'):
+  # the response to a create submission, first time or replayed
+  flash(outcome.message)
+  headers = {'Location': outcome.location} if outcome.location else {}
+  if replayed:
+    headers['Idempotent-Replayed'] = 'true'
+  return render_template(template), outcome.status, headers
+
+def replay_response(entry, template='pages/home.html'):
+  return outcome_response(entry, replayed=True, template=template)
+
+#  Query fan-out
+#  ----------------------------------------------------------------
+
+def fetch_all(queries):
+  # runs named Core selects one after the other on the request's session
+  return {name: db.session.execute(stmt).all() for name, stmt in queries.items()}
+
+def _fetch_on_own_connection(engine, stmt):
+  with engine.connect() as connection:
+    return connection.execute(stmt).all()
+
+async def fetch_all_concurrently(queries):
+  # runs named Core selects at the same time, each on its own pooled
+  # connection, so the wait is roughly that of the slowest one
+  import asyncio
+  loop = asyncio.get_running_loop()
+  # the worker threads have no app context, so they get the engine itself
+  engine = db.engine
+  executor = current_app.extensions['detail_executor']
+  results = await asyncio.gather(*(
+    loop.run_in_executor(executor, _fetch_on_own_connection, engine, stmt)
+    for stmt in queries.values()))
+  return dict(zip(queries, results))
+
+#  Listings
+#  ----------------------------------------------------------------
+
+def with_upcoming_show_counts(model, show_column, *columns):
+  # the given columns of every venue/artist plus its number of upcoming
+  # shows as num_upcoming_shows, in one grouped query rather than one
+  # shows query per row; LEFT JOIN, so those without shows count 0
+  upcoming = func.sum(case((Show.start_time > datetime.now(), 1), else_=0))
+  return db.session.query(*columns, func.coalesce(upcoming, 0).label('num_upcoming_shows')) \
+    .outerjoin(Show, show_column == model.id) \
+    .group_by(model.id).order_by(model.id)
+
+#  Cached data
+#  ----------------------------------------------------------------
+
+# What each write makes stale in the data cache: the listings, and the venue
+# and artist pages, which also show the names and images of the other side
+# of their shows. The hooks run inline on the committing thread, so the page
+# a write redirects to is already rebuilt.
+
+@post_commit.hook('venue.changed', inline=True)
+def invalidate_venue(venue_id):
+  data_cache.invalidate('venues', 'shows', f'venue:{venue_id}')
+
+@post_commit.hook('artist.changed', inline=True)
+def invalidate_artist(artist_id):
+  data_cache.invalidate('artists', 'shows', f'artist:{artist_id}')
+
+@post_commit.hook('show.changed', inline=True)
+def invalidate_show(show_id, artist_id, venue_id):
+  # upcoming show counts are on the venues listing and both pages
+  keys = ['shows', 'venues']
+  if artist_id is not None:
+    keys.append(f'artist:{artist_id}')
+  if venue_id is not None:
+    keys.append(f'venue:{venue_id}')
+  data_cache.invalidate(*keys)
+
+#  Image prefetch
+#  ----------------------------------------------------------------
+
+# A new or edited venue/artist has its image fetched into the image proxy's
+# cache on the post-commit pool, off the request thread, so the first page
+# showing it does not wait on a slow origin. A cached image is only a hit.
+# IMAGE_PREFETCH=False leaves the fetch to the first page view.
+
+def prefetch_image(table, item_id):
+  if not current_app.config['IMAGE_PREFETCH']:
+    return
+  link = db.session.execute(select(table.c.image_link).where(table.c.id == item_id)).scalar()
+  if not link:
+    return
+  try:
+    image_cache.get(link)
+  except ImageFetchError as e:
+    current_app.logger.warning('image prefetch: %s', e)
+
+@post_commit.hook('venue.changed')
+def prefetch_venue_image(venue_id):
+  prefetch_image(Venue.__table__, venue_id)
+
+@post_commit.hook('artist.changed')
+def prefetch_artist_image(artist_id):
+  prefetch_image(Artist.__table__, artist_id)
+
+def related_ids(show_column, other_column, item_id):
+  # the artists a venue has shows with, or the venues of an artist
+  return [row[0] for row in db.session.execute(
+    select(other_column).where(show_column == item_id).distinct())]
+
+def enqueue_related(show_column, item_id, values):
+  # a new name or image of a venue/artist also shows on the pages of the
+  # other side of its shows
+  if 'name' not in values and 'image_link' not in values:
+    return
+  shows = Show.__table__
+  if show_column is shows.c.venue_id:
+    for artist_id in related_ids(show_column, shows.c.artist_id, item_id):
+      post_commit.enqueue('artist.changed', artist_id=artist_id)
+  else:
+    for venue_id in related_ids(show_column, shows.c.venue_id, item_id):
+      post_commit.enqueue('venue.changed', venue_id=venue_id)
+
+#  Deletes
+#  ----------------------------------------------------------------
+
+class DeleteIncomplete(Exception):
+  # a delete failed after some chunks of shows were committed; the row and
+  # its remaining shows are still there and deleting again finishes the job
+  def __init__(self, shows_deleted):
+    super().__init__(f'{shows_deleted} shows were deleted before the failure')
+    self.shows_deleted = shows_deleted
+
+def delete_with_shows(model, show_column, item_id, changed):
+  # deletes a venue or artist together with its shows using set-based
+  # DELETEs and commits; nothing is loaded into the session. changed(ids) is
+  # called before every commit with the ids on the other side of the shows
+  # (artists of a venue, venues of an artist) to queue the cache
+  # invalidations. Returns those ids, or None when the row does not exist.
+  if db.session.query(model.id).filter(model.id == item_id).first() is None:
+    return None
+  shows = Show.__table__
+  other_column = shows.c.artist_id if show_column is shows.c.venue_id else shows.c.venue_id
+  related = related_ids(show_column, other_column, item_id)
+
+  # large show lists go in chunks, each its own short transaction, so no
+  # single statement keeps thousands of rows locked. The last, partial chunk
+  # and whatever was booked in the meantime go in one transaction with the
+  # row itself, so only a failure between full chunks leaves shows deleted
+  # and the row in place (DeleteIncomplete).
+  chunk = current_app.config['DELETE_CHUNK_SIZE']
+  committed = 0
+  table = model.__table__
+  try:
+    while True:
+      batch = select(shows.c.id).where(show_column == item_id).limit(chunk)
+      deleted = db.session.execute(shows.delete().where(shows.c.id.in_(batch))).rowcount
+      if deleted < chunk:
+        break
+      changed(related)
+      db.session.commit()
+      committed += deleted
+    db.session.execute(shows.delete().where(show_column == item_id))
+    if not db.session.execute(table.delete().where(table.c.id == item_id)).rowcount:
+      db.session.rollback()
+      return None
+    changed(related)
+    db.session.commit()
+  except Exception as e:
+    db.session.rollback()
+    if committed:
+      raise DeleteIncomplete(committed) from e
+    raise
+  return related
+
+#  Update
+#  ----------------------------------------------------------------
+
+VENUE_EDIT_FIELDS = ('name', 'genres', 'address', 'city', 'state', 'phone', 'website_link',
+  'facebook_link', 'seeking_talent', 'seeking_description', 'image_link')
+ARTIST_EDIT_FIELDS = ('name', 'genres', 'city', 'state', 'phone', 'website_link',
+  'facebook_link', 'seeking_venue', 'seeking_description', 'image_link')
+
+def populate_edit_form(form, entity, fields):
+  # fills the edit form from the row and records what it showed, so the
+  # submission can tell which fields the user actually changed
+  form.process(obj=entity)
+  form.genres.data = parse_genres(entity.genres)
+  form.version.data = entity.version
+  form.original.data = json.dumps({name: '' if form[name].data is None else form[name].data for name in fields})
+
+def changed_fields(form, fields):
+  # with the snapshot from the edit page only differing fields are written;
+  # clients posting without one update exactly the fields they send
+  try:
+    original = json.loads(form.original.data) if form.original.data else None
+  except ValueError:
+    original = None
+  values = {}
+  for name in fields:
+    value = '' if form[name].data is None else form[name].data
+    if original is None and name not in request.form:
+      continue
+    if original is not None and original.get(name) == value:
+      continue
+    values[name] = value
+  if 'genres' in values:
+    values['genres'] = format_genres(values['genres'])
+  return values
+
+def partial_update(model, item_id, version, values):
+  # a single UPDATE ... WHERE id = :id [AND version = :version] that bumps
+  # the version; returns the number of rows it matched
+  table = model.__table__
+  stmt = table.update().where(table.c.id == item_id)
+  if version is not None:
+    stmt = stmt.where(table.c.version == version)
+  return db.session.execute(stmt.values(version=table.c.version + 1, **values)).rowcount
+
+def submitted_version(form):
+  try:
+    return int(form.version.data)
+  except (TypeError, ValueError):
+    return None
+
+#  Responses
+#  ----------------------------------------------------------------
+
+def json_response(payload, status=200):
+  return Response(json.dumps(payload, default=json_default), status=status, mimetype='application/json')
@@ -0,0 +1,45 @@
+#----------------------------------------------------------------------------#
+# Images.
+#
+# Venue and artist images are served from a local cache instead of being
+# hotlinked. The URL carries a hash of image_link, so it changes whenever
+# the link is edited and the response can be cached for a long time.
+#----------------------------------------------------------------------------#
+
+import hashlib
+
+from flask import Blueprint, Response, abort, current_app, request, send_file, url_for
+from sqlalchemy import select
+
+from extensions import db, image_cache
+from image_cache import ImageFetchError
+from models import Artist, Venue
+
+bp = Blueprint('images', __name__)
+
+@bp.app_template_global()
+def image_url(kind, item_id, link, width=None):
+  if not link:
+    return link
+  digest = hashlib.sha256(link.encode('utf-8')).hexdigest()[:8]
+  return url_for('images.image', kind=kind, item_id=item_id, w=width, h=digest)
+
+@bp.route('/img/<any(venue, artist):kind>/<int:item_id>')
+def image(kind, item_id):
+  table = Venue.__table__ if kind == 'venue' else Artist.__table__
+  link = db.session.execute(select(table.c.image_link).where(table.c.id == item_id)).scalar()
+  width = request.args.get('w', type=int)
+  if not link or (width is not None and width not in current_app.config['IMAGE_WIDTHS']):
+    abort(404)
+  try:
+    cached = image_cache.get(link, width)
+  except ImageFetchError as e:
+    current_app.logger.warning('image proxy: %s', e)
+    return Response(status=502, headers={'Cache-Control': f"public, max-age={current_app.config['IMAGE_FAILURE_TTL']}"})
+  response = send_file(cached.path, mimetype=cached.content_type, etag=cached.etag,
+                       conditional=True, max_age=current_app.config['IMAGE_MAX_AGE'])
+  response.cache_control.public = True
+  # the bytes come from a third party: never let them run as a page here
+  response.headers['Content-Security-Policy'] = "default-src 'none'; style-src 'unsafe-inline'; sandbox"
+  response.headers['X-Content-Type-Options'] = 'nosniff'
+  return response
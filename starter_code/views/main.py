@@ -0,0 +1,22 @@
+#----------------------------------------------------------------------------#
+# Home page and error pages.
+#----------------------------------------------------------------------------#
+
+from flask import Blueprint, render_template
+
+from query_audit import query_budget
+
+bp = Blueprint('main', __name__)
+
+@bp.route('/')
+@query_budget(0)
+def index():
+  return render_template('pages/home.html')
+
+@bp.app_errorhandler(404)
+def not_found_error(error):
+    return render_template('errors/404.html'), 404
+
+@bp.app_errorhandler(500)
+def server_error(error):
+    return render_template('errors/500.html'), 500
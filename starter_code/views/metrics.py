@@ -0,0 +1,22 @@
+#----------------------------------------------------------------------------#
+# Prometheus metrics.
+#----------------------------------------------------------------------------#
+
+import hmac
+
+from flask import Blueprint, Response, abort, current_app, request
+
+from extensions import metrics
+
+bp = Blueprint('metrics', __name__)
+
+@bp.route('/metrics')
+def metrics_page():
+  # text exposition format, summed over every worker process; with
+  # METRICS_TOKEN set the scraper has to send it as a bearer token
+  if not current_app.config['METRICS_ENABLED']:
+    abort(404)
+  token = current_app.config.get('METRICS_TOKEN')
+  if token and not hmac.compare_digest(request.headers.get('Authorization', ''), 'Bearer ' + token):
+    abort(401)
+  return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
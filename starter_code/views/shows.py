@@ -0,0 +1,211 @@
+#----------------------------------------------------------------------------#
+# Shows.
+#----------------------------------------------------------------------------#
+
+from datetime import datetime, timedelta
+
+from flask import Blueprint, Response, abort, current_app, flash, render_template, request, stream_with_context
+from sqlalchemy import func, or_
+
+from bulk_export import FORMATS as EXPORT_FORMATS, MIMETYPES as EXPORT_MIMETYPES, gzip_chunks, iter_export
+from extensions import data_cache, db, post_commit
+from filters import format_datetime
+from forms import ShowForm, ShowSeriesForm
+from models import Artist, Show, Venue
+from query_audit import query_budget
+from views.common import idempotency_key, outcome_response, record_outcome, replay_response, replayed_outcome
+
+bp = Blueprint('shows', __name__)
+
+#  Shows
+#  ----------------------------------------------------------------
+
+@bp.route('/shows')
+@query_budget(1)
+def shows():
+  # displays list of shows at /shows
+  return render_template('pages/shows.html', shows=data_cache.get_or_set('shows', show_listing))
+
+def show_listing():
+  # TODO: replace with real venues data.
+  # one joined query instead of a venue and two artist lookups per show
+  shows_list = db.session.query(Show.venue_id, Venue.name.label('venue_name'),
+      Show.artist_id, Artist.name.label('artist_name'), Artist.image_link.label('artist_image_link'),
+      Show.start_time) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .order_by(Show.id).all()
+  return [dict(show._mapping, start_time=format_datetime(str(show.start_time))) for show in shows_list]
+
+def export_shows_query(since=None):
+  # one joined row per show; yield_per streams it through a server-side cursor
+  # instead of buffering the whole result set
+  query = db.session.query(
+      Show.id, Show.start_time,
+      Show.artist_id, Artist.name.label('artist_name'),
+      Show.venue_id, Venue.name.label('venue_name')) \
+    .join(Artist, Show.artist_id == Artist.id) \
+    .join(Venue, Show.venue_id == Venue.id) \
+    .order_by(Show.id)
+  if since:
+    query = query.filter(Show.start_time >= since)
+  return query.yield_per(current_app.config['EXPORT_BATCH_SIZE'])
+
+@bp.route('/shows/export')
+def export_shows():
+  # ?format=csv|ndjson, ?since=<date> and ?gzip=1 for a compressed download
+  import dateutil.parser
+  fmt = request.args.get('format', 'csv')
+  if fmt not in EXPORT_FORMATS:
+    abort(400)
+  try:
+    since = dateutil.parser.parse(request.args['since']) if request.args.get('since') else None
+  except (ValueError, OverflowError):
+    abort(400)
+  query = export_shows_query(since)
+  columns = [c['name'] for c in query.column_descriptions]
+  chunks = iter_export(fmt, columns, query)
+  filename = 'shows.' + fmt
+  mimetype = EXPORT_MIMETYPES[fmt]
+  if request.args.get('gzip'):
+    chunks = gzip_chunks(chunks)
+    filename += '.gz'
+    mimetype = 'application/gzip'
+  return Response(stream_with_context(chunks), mimetype=mimetype,
+    headers={'Content-Disposition': f'attachment; filename={filename}'})
+
+@bp.route('/shows/create')
+@query_budget(0)
+def create_shows():
+  # renders form. do not touch.
+  form = ShowForm()
+  return render_template('forms/new_show.html', form=form)
+
+@bp.route('/shows/create', methods=['POST'])
+def create_show_submission():
+  # called to create new shows in the db, upon submitting new show listing form
+  # TODO: insert form data as a new Show record in the db, instead
+  key = idempotency_key()
+  replay = replayed_outcome(key)
+  if replay:
+    return replay_response(replay)
+  outcome = None
+  try:
+    show = Show(artist_id = request.form.get('artist_id'),
+    venue_id = request.form.get('venue_id'),
+    start_time = request.form.get('start_time'))
+    db.session.add(show)
+    db.session.flush()
+    post_commit.enqueue('show.changed', show_id=show.id, artist_id=show.artist_id, venue_id=show.venue_id)
+    outcome = record_outcome(key, 'Show was successfully listed!')
+    db.session.commit()
+  except Exception:
+    current_app.logger.exception('show could not be listed')
+    db.session.rollback()
+    replay = replayed_outcome(key)
+    if replay:
+      return replay_response(replay)
+    flash('An error occurred. Show could not be listed.')
+  finally:
+    db.session.close()
+  if outcome:
+    return outcome_response(outcome)
+  # on successful db insert, flash success
+  # flash('Show was successfully listed!')
+  # TODO: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Show could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  return render_template('pages/home.html')
+
+#  Show series
+#  ----------------------------------------------------------------
+
+def expand_occurrences(start, frequency, count=None, end_date=None):
+  # every start time of a weekly/monthly series, ending after count shows or
+  # on end_date, whichever comes first. ShowSeriesForm keeps both within
+  # SHOW_SERIES_MAX_OCCURRENCES; a longer series is an error, not cut short
+  from dateutil.relativedelta import relativedelta
+  limit = current_app.config['SHOW_SERIES_MAX_OCCURRENCES']
+  step = relativedelta(weeks=1) if frequency == 'weekly' else relativedelta(months=1)
+  occurrences = []
+  for i in range(count or limit + 1):
+    # offsets are taken from the first show so monthly series keep their day
+    occurrence = start + step * i
+    if end_date and occurrence.date() > end_date:
+      break
+    occurrences.append(occurrence)
+  if len(occurrences) > limit:
+    raise ValueError(f'a show series is limited to {limit} shows')
+  return occurrences
+
+def series_conflicts(artist_id, venue_id, occurrences):
+  # one set-based query for every occurrence: any show of this artist or at
+  # this venue on the same day counts as a clash
+  days = sorted({o.date() for o in occurrences})
+  return Show.query.with_entities(Show.artist_id, Show.venue_id, Show.start_time) \
+    .filter(or_(Show.artist_id == artist_id, Show.venue_id == venue_id),
+            Show.start_time >= datetime.combine(days[0], datetime.min.time()),
+            Show.start_time < datetime.combine(days[-1] + timedelta(days=1), datetime.min.time()),
+            func.date(Show.start_time).in_(days)) \
+    .order_by(Show.start_time).all()
+
+@bp.route('/shows/series/create', methods=['GET'])
+@query_budget(0)
+def create_show_series_form():
+  form = ShowSeriesForm()
+  return render_template('forms/new_show_series.html', form=form)
+
+@bp.route('/shows/series/create', methods=['POST'])
+def create_show_series_submission():
+  # expands a residency into its individual shows and books all of them in a
+  # single multi-row INSERT and commit, or none of them
+  form = ShowSeriesForm()
+  key = idempotency_key()
+  replay = replayed_outcome(key)
+  if replay:
+    return replay_response(replay)
+  if not form.validate():
+    flash('An error occurred. Show series could not be listed: ' + str(form.errors))
+    return render_template('forms/new_show_series.html', form=form)
+  if not form.count.data and not form.end_date.data:
+    flash('Please give either a number of shows or an end date for the series.')
+    return render_template('forms/new_show_series.html', form=form)
+  try:
+    artist_id = int(form.artist_id.data)
+    venue_id = int(form.venue_id.data)
+  except ValueError:
+    flash('Artist ID and Venue ID must be numbers.')
+    return render_template('forms/new_show_series.html', form=form)
+
+  occurrences = expand_occurrences(form.start_time.data, form.frequency.data,
+    form.count.data, form.end_date.data)
+  if not occurrences:
+    flash('The series has no shows before its end date.')
+    return render_template('forms/new_show_series.html', form=form)
+
+  outcome = None
+  try:
+    conflicts = series_conflicts(artist_id, venue_id, occurrences)
+    if conflicts:
+      flash('Show series could not be listed, it clashes with existing shows on ' +
+        ', '.join(sorted({str(c.start_time.date()) for c in conflicts})))
+      return render_template('forms/new_show_series.html', form=form)
+    db.session.execute(Show.__table__.insert().values([
+      {"artist_id": artist_id, "venue_id": venue_id, "start_time": occurrence}
+      for occurrence in occurrences]))
+    post_commit.enqueue('show.changed', show_id=None, artist_id=artist_id, venue_id=venue_id)
+    message = f'Show series of {len(occurrences)} shows was successfully listed!'
+    outcome = record_outcome(key, message)
+    db.session.commit()
+  except Exception:
+    current_app.logger.exception('show series could not be listed')
+    db.session.rollback()
+    replay = replayed_outcome(key)
+    if replay:
+      return replay_response(replay)
+    flash('An error occurred. Show series could not be listed.')
+  finally:
+    db.session.close()
+  if outcome:
+    return outcome_response(outcome)
+  return render_template('pages/home.html')
@@ -0,0 +1,252 @@
+#----------------------------------------------------------------------------#
+# Venues.
+#----------------------------------------------------------------------------#
+
+from collections import defaultdict
+from datetime import datetime
+
+from flask import Blueprint, abort, current_app, flash, redirect, render_template, request, url_for
+from sqlalchemy import select
+
+from bulk_import import parse_genres
+from extensions import data_cache, db, post_commit
+from forms import VenueForm
+from models import Artist, Show, Venue
+from query_audit import query_budget
+from views.common import (VENUE_EDIT_FIELDS, DeleteIncomplete, changed_fields, delete_with_shows,
+  enqueue_related, fetch_all, fetch_all_concurrently, idempotency_key, json_response, partial_update,
+  outcome_response, populate_edit_form, record_outcome, replay_response, replayed_outcome, submitted_version,
+  with_upcoming_show_counts)
+
+bp = Blueprint('venues', __name__)
+
+#  Venues
+#  ----------------------------------------------------------------
+
+@bp.route('/venues')
+@query_budget(1)
+def venues():
+  return render_template('pages/venues.html', areas=data_cache.get_or_set('venues', venue_areas))
+
+def venue_areas():
+  # TODO: replace with real venues data.
+  #       num_upcoming_shows should be aggregated based on number of upcoming shows per venue.
+  venue_list = with_upcoming_show_counts(Venue, Show.venue_id, Venue.id, Venue.name, Venue.city, Venue.state).all()
+  data = []
+  ans_dict = defaultdict(list) # a dictionary with default value as empty list
+
+  for venue in venue_list:
+    ans_dict[(venue.city,venue.state)].append({"id":venue.id,"name":venue.name,"num_upcoming_shows": venue.num_upcoming_shows})
+
+  for val in ans_dict:
+    data.append({
+      "city":val[0],
+      "state":val[1],
+      "venues": ans_dict[val]
+    })
+
+  return data
+
+@bp.route('/venues/search', methods=['POST'])
+@query_budget(1)
+def search_venues():
+  # TODO: implement search on artists with partial string search. Ensure it is case-insensitive.
+  # seach for Hop should return "The Musical Hop".
+  # search for "Music" should return "The Musical Hop" and "Park Square Live Music & Coffee"
+
+  search_term = request.form.get('search_term', "").strip()
+  venue_list = with_upcoming_show_counts(Venue, Show.venue_id, Venue.id, Venue.name) \
+    .filter(Venue.name.ilike('%'+ search_term + '%')).all() # filtering all the venues where the search_term is present
+  count = len(venue_list)
+  search_result = [{
+    "id":venue.id,
+    'name':venue.name,
+    "num_upcoming_shows": venue.num_upcoming_shows
+  } for venue in venue_list]
+
+  response = {
+    "count":count,
+    "data":search_result
+  }
+
+  return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
+
+def venue_detail_queries(venue_id, now):
+  # the independent reads behind a venue page
+  venues, shows, artists = Venue.__table__, Show.__table__, Artist.__table__
+  tiles = select(shows.c.artist_id, artists.c.name.label('artist_name'),
+                 artists.c.image_link.label('artist_image_link'), shows.c.start_time) \
+    .select_from(shows.join(artists, shows.c.artist_id == artists.c.id)) \
+    .where(shows.c.venue_id == venue_id)
+  return {
+    "venue": select(venues).where(venues.c.id == venue_id),
+    "upcoming_shows": tiles.where(shows.c.start_time > now).order_by(shows.c.start_time),
+    "past_shows": tiles.where(shows.c.start_time < now).order_by(shows.c.start_time.desc()),
+  }
+
+def venue_data(results):
+  if not results['venue']:
+    abort(404)
+  venue = results['venue'][0]
+  data = {
+    "id": venue.id,
+    "name": venue.name,
+    "genres": parse_genres(venue.genres),
+    "address": venue.address,
+    "city": venue.city,
+    "state": venue.state,
+    "phone": venue.phone,
+    "website": venue.website_link,
+    "facebook_link": venue.facebook_link,
+    "seeking_talent": venue.seeking_talent,
+    "seeking_description": venue.seeking_description,
+    "image_link": venue.image_link,
+    "past_shows": [dict(row._mapping, start_time=str(row.start_time)) for row in results['past_shows']],
+    "upcoming_shows": [dict(row._mapping, start_time=str(row.start_time)) for row in results['upcoming_shows']],
+    "past_shows_count": len(results['past_shows']),
+    "upcoming_shows_count": len(results['upcoming_shows']),
+  }
+  return data
+
+@query_budget(3)
+def show_venue(venue_id):
+  # shows the venue page with the given venue_id
+  data = data_cache.get_or_set(f'venue:{venue_id}',
+    lambda: venue_data(fetch_all(venue_detail_queries(venue_id, datetime.now()))))
+  return render_template('pages/show_venue.html', venue=data)
+
+@query_budget(3)
+async def show_venue_async(venue_id):
+  key = f'venue:{venue_id}'
+  data = data_cache.get(key)
+  if data is None:
+    stamp = data_cache.stamp(key)
+    data = venue_data(await fetch_all_concurrently(venue_detail_queries(venue_id, datetime.now())))
+    data_cache.set(key, data, stamp)
+  return render_template('pages/show_venue.html', venue=data)
+
+@bp.record
+def register_show_venue(state):
+  state.add_url_rule('/venues/<int:venue_id>', 'show_venue',
+    show_venue_async if state.app.config['ASYNC_DETAIL_VIEWS'] else show_venue)
+
+#  Create Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/create', methods=['GET'])
+@query_budget(0)
+def create_venue_form():
+  form = VenueForm()
+  return render_template('forms/new_venue.html', form=form)
+
+@bp.route('/venues/create', methods=['POST'])
+def create_venue_submission():
+  # TODO: insert form data as a new Venue record in the db, instead
+  # TODO: modify data to be the data object returned from db insertion
+  key = idempotency_key()
+  replay = replayed_outcome(key)
+  if replay:
+    return replay_response(replay)
+  outcome = None
+  try:
+    venue = Venue(name=request.form.get('name'),
+    city=request.form.get('city'),
+    state=request.form.get('state'),
+    address=request.form.get('address'),
+    phone=request.form.get('phone'),
+    genres=request.form.getlist('genres'),
+    image_link=request.form.get('image_link'),
+    facebook_link=request.form.get('facebook_link'),
+    website_link=request.form.get('website_link'),
+    seeking_talent= True if request.form.get('seeking_talent')=="Y" else False,
+    seeking_description=request.form.get('seeking_description'))
+    db.session.add(venue)
+    db.session.flush()
+    post_commit.enqueue('venue.changed', venue_id=venue.id)
+    message = 'Venue ' + request.form['name'] + ' was successfully listed!'
+    outcome = record_outcome(key, message, location=url_for('venues.show_venue', venue_id=venue.id))
+    db.session.commit()
+  # on successful db insert, flash success
+  except Exception:
+    current_app.logger.exception('venue could not be listed')
+    db.session.rollback()
+    # a concurrent retry with the same key may have won the race
+    replay = replayed_outcome(key)
+    if replay:
+      return replay_response(replay)
+    flash('An error occurred. Venue ' + request.form['name'] + ' could not be listed.')
+  # TODO: on unsuccessful db insert, flash an error instead.
+  # e.g., flash('An error occurred. Venue ' + data.name + ' could not be listed.')
+  # see: http://flask.pocoo.org/docs/1.0/patterns/flashing/
+  finally:
+    db.session.close()
+  if outcome:
+    return outcome_response(outcome)
+  return render_template('pages/home.html')
+
+@bp.route('/venues/<int:venue_id>', methods=['DELETE'])
+def delete_venue(venue_id):
+  # BONUS CHALLENGE: Implement a button to delete a Venue on a Venue Page, have it so that
+  # clicking that button delete it from the db then redirect the user to the homepage
+  def changed(artist_ids):
+    post_commit.enqueue('venue.changed', venue_id=venue_id)
+    post_commit.enqueue('show.changed', show_id=None, artist_id=None, venue_id=venue_id)
+    for artist_id in artist_ids:
+      post_commit.enqueue('artist.changed', artist_id=artist_id)
+  try:
+    if delete_with_shows(Venue, Show.__table__.c.venue_id, venue_id, changed) is None:
+      return json_response({"success": False, "error": "not found"}, 404)
+    flash('Venue was successfully deleted!')
+  except DeleteIncomplete as e:
+    current_app.logger.exception('venue %s was only partly deleted', venue_id)
+    return json_response({"success": False, "incomplete": True, "shows_deleted": e.shows_deleted,
+      "error": f"Venue could not be deleted, but {e.shows_deleted} of its shows were. Delete it again to finish."}, 500)
+  except Exception:
+    current_app.logger.exception('venue %s could not be deleted', venue_id)
+    db.session.rollback()
+    return json_response({"success": False, "error": "Venue could not be deleted."}, 500)
+  finally:
+    db.session.close()
+  return json_response({"success": True, "redirect": url_for('main.index')})
+
+#  Update Venue
+#  ----------------------------------------------------------------
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['GET'])
+@query_budget(1)
+def edit_venue(venue_id):
+  venue = Venue.query.get_or_404(venue_id)
+  form = VenueForm()
+  populate_edit_form(form, venue, VENUE_EDIT_FIELDS)
+  return render_template('forms/edit_venue.html', form=form, venue=venue)
+
+@bp.route('/venues/<int:venue_id>/edit', methods=['POST'])
+def edit_venue_submission(venue_id):
+  form = VenueForm()
+  values = changed_fields(form, VENUE_EDIT_FIELDS)
+  if not values:
+    flash('Nothing to update, the venue was left unchanged.')
+    return redirect(url_for('venues.show_venue', venue_id=venue_id))
+  updated = None
+  try:
+    updated = partial_update(Venue, venue_id, submitted_version(form), values)
+    if updated:
+      post_commit.enqueue('venue.changed', venue_id=venue_id)
+      enqueue_related(Show.__table__.c.venue_id, venue_id, values)
+      db.session.commit()
+      flash('The Venue '+ request.form.get('name', '') + ' has been successfully updated!')
+    else:
+      db.session.rollback()
+  except Exception:
+    current_app.logger.exception('venue %s could not be updated', venue_id)
+    db.session.rollback()
+    flash("An Error occured while editing venue")
+  if updated == 0:
+    exists = db.session.query(Venue.id).filter_by(id=venue_id).first() is not None
+    db.session.close()
+    if not exists:
+      abort(404)
+    flash('The venue was changed by someone else in the meantime, please review and submit again.')
+    return redirect(url_for('venues.edit_venue', venue_id=venue_id))
+  db.session.close()
+  return redirect(url_for('venues.show_venue', venue_id=venue_id))
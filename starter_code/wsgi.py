@@ -0,0 +1,34 @@
+#----------------------------------------------------------------------------#
+# Production entry point.
+#
+#   SECRET_KEY=... gunicorn -c gunicorn.conf.py
+#
+# gunicorn.conf.py preloads this module in the master process, so the app,
+# its templates and locale data are loaded once and shared copy-on-write by
+# every forked worker.
+#----------------------------------------------------------------------------#
+
+import os
+
+if not (os.environ.get('SECRET_KEY') or os.environ.get('SECRET_KEY_FILE')):
+    raise RuntimeError('Set SECRET_KEY or SECRET_KEY_FILE: every worker must share the same key.')
+os.environ.setdefault('FLASK_DEBUG', '0')
+
+from sqlalchemy.orm import configure_mappers
+
+from app import create_app
+from extensions import template_cache
+from filters import format_datetime
+
+app = create_app()
+
+def warm_up():
+    # do the lazy one-off work up front, before the workers are forked;
+    # templates come from the bytecode cache when `flask compile-templates`
+    # has been run
+    configure_mappers()
+    template_cache.compile_all()
+    # also imports dateutil and babel.dates and loads the locale data
+    format_datetime('2021-01-01 20:00:00', 'full')
+
+warm_up()